@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from bson import ObjectId
 from flask import current_app
+from shared.ids import canonical_id, lookup_by_ref
 
 class WouldYouRather:
     def __init__(self, option_a, option_b, votes_a=0, votes_b=0):
@@ -24,11 +25,11 @@ class WhatsOnMind:
         db = current_app.config["DB"]
         
         post_doc = {
-            "user_id": user_id,
+            "user_id": canonical_id(user_id),
             "username": username,
             "content": content,
             "created_at": datetime.utcnow(),
-            "created_by": user_id
+            "created_by": canonical_id(user_id)
         }
         
         # Insert into whats_on_mind collection
@@ -36,33 +37,22 @@ class WhatsOnMind:
         
         # Return the created post with its ID
         post_doc["_id"] = str(result.inserted_id)
+        post_doc["user_id"] = str(post_doc["user_id"])
+        post_doc["created_by"] = str(post_doc["created_by"])
         return post_doc
     
     @staticmethod
     def get_all_posts(limit=50, skip=0):
-        """Get all posts with user profile data using aggregation (MODIFIED with cleanup)"""
+        """Get all posts with user profile data using aggregation"""
         db = current_app.config["DB"]
         
-        # Clean up old posts before fetching (similar to waypoints)
-        cleanup_count = WhatsOnMind.cleanup_old_posts(hours_old=24)
-        if cleanup_count > 0:
-            print(f"Cleaned up {cleanup_count} old posts before fetching")
+        # Old posts are deleted by the maintenance scheduler; hide any that
+        # have aged out since its last sweep
+        cutoff_time = datetime.utcnow() - timedelta(hours=24)
         
         pipeline = [
-            # Convert string user_id to ObjectId for lookup
-            {
-                "$addFields": {
-                    "user_object_id": {"$toObjectId": "$created_by"}
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "users",
-                    "localField": "user_object_id",
-                    "foreignField": "_id",
-                    "as": "user_info"
-                }
-            },
+            {"$match": {"created_at": {"$gte": cutoff_time}}},
+            lookup_by_ref("users", "created_by", "user_info"),
             {
                 "$unwind": {
                     "path": "$user_info",
@@ -95,19 +85,7 @@ class WhatsOnMind:
         try:
             pipeline = [
                 {"$match": {"_id": ObjectId(post_id)}},
-                {
-                    "$addFields": {
-                        "user_object_id": {"$toObjectId": "$created_by"}
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "user_object_id",
-                        "foreignField": "_id",
-                        "as": "user_info"
-                    }
-                },
+                lookup_by_ref("users", "created_by", "user_info"),
                 {
                     "$unwind": {
                         "path": "$user_info",
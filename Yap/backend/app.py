@@ -2,7 +2,7 @@ from flask import Flask, request, jsonify, send_from_directory
 from flask_socketio import SocketIO
 from flask_cors import CORS
 from dotenv import load_dotenv
-from pymongo import MongoClient, GEOSPHERE
+from pymongo import MongoClient, GEOSPHERE, TEXT
 from auth.routes import auth_bp
 from registration.routes import registration_bp
 from users.routes import users_bp
@@ -16,6 +16,8 @@ from feedback.routes import feedback_bp
 from activities.routes import activities_bp
 from waypoint.routes import waypoint_bp
 from eventthreads.routes import eventthreads_bp
+from maintenance.routes import maintenance_bp
+from maintenance.jobs import init_maintenance_scheduler
 import os
 import sys
 import logging
@@ -224,6 +226,27 @@ def setup_waypoint_indexes():
         ])
         print("  ✅ Expiration index created")
         
+        # Index for finding the waypoint linked to an event
+        db.waypoint.create_index([("event_id", 1)])
+        print("  ✅ Event waypoints index created")
+        
+        # Index for loading a map tile by its lat/lng bounds
+        db.waypoint.create_index([
+            ("latitude", 1),
+            ("longitude", 1),
+            ("active", 1)
+        ])
+        print("  ✅ Tile bounds index created")
+        
+        # One row per (waypoint, user, join/like/bookmark)
+        db.waypoint_interactions.create_index(
+            [("waypoint_id", 1), ("user_id", 1), ("type", 1)],
+            unique=True
+        )
+        db.waypoint_interactions.create_index([("user_id", 1), ("type", 1)])
+        db.waypoint_interactions.create_index([("expires_at", 1)], expireAfterSeconds=0)
+        print("  ✅ Waypoint interaction indexes created")
+        
         # TTL index for automatic cleanup of expired waypoints
         db.waypoint.create_index(
             [("expires_at", 1)], 
@@ -239,6 +262,88 @@ def setup_waypoint_indexes():
 # Setup waypoint indexes
 setup_waypoint_indexes()
 
+# ===== EVENT FEED INDEXES SETUP =====
+def setup_event_indexes():
+    """Set up MongoDB indexes for the event feed"""
+    try:
+        # Feed reads sort upcoming_events_view by event time
+        db.upcoming_events_view.create_index([("event_datetime", 1)])
+        db.upcoming_events_view.create_index([("view_refreshed_at", 1)])
+        print("  ✅ Upcoming events view indexes created")
+        
+        # Attendee lists and "events I'm attending", keyset-paginated on (created_at, _id)
+        db.attendances.create_index([("event_id", 1), ("created_at", -1), ("_id", -1)])
+        db.attendances.create_index([("user_id", 1), ("created_at", -1), ("_id", -1)])
+        # Single-user attendance checks (thread access, attend toggling)
+        db.attendances.create_index([("event_id", 1), ("user_id", 1)])
+        print("  ✅ Attendance indexes created")
+        
+        # One cancellation job per event; the maintenance sweep looks up stalled jobs
+        db.event_cancellations.create_index([("event_id", 1)], unique=True)
+        db.event_cancellations.create_index([("status", 1), ("lease_expires_at", 1)])
+        print("  ✅ Event cancellation indexes created")
+    except Exception as e:
+        print(f"❌ Error setting up event indexes: {e}")
+
+setup_event_indexes()
+
+def setup_event_thread_indexes():
+    """Set up MongoDB indexes for event thread pages"""
+    try:
+        # Top-level posts of a thread, and the replies embedded under each one
+        db.event_threads.create_index([("event_id", 1), ("reply_to", 1), ("is_deleted", 1), ("created_at", -1)])
+        db.event_threads.create_index([("reply_to", 1), ("is_deleted", 1), ("created_at", 1)])
+        # Per-viewer like flags
+        db.thread_likes.create_index([("post_id", 1), ("user_id", 1)])
+        print("  ✅ Event thread indexes created")
+    except Exception as e:
+        print(f"❌ Error setting up event thread indexes: {e}")
+
+setup_event_thread_indexes()
+
+def setup_message_indexes():
+    """Set up MongoDB indexes for messages"""
+    try:
+        # Catching a conversation up from a seq (sync, poll and stream), and
+        # unread counts past each participant's read watermark
+        db.messages.create_index([("conversation_id", 1), ("seq", 1)])
+        # Conversation pages, newest first
+        db.messages.create_index([("conversation_id", 1), ("created_at", -1)])
+        # Message search
+        db.messages.create_index([("content", TEXT)], default_language="english")
+        # A user's conversations (lists, unread counts, sync and search scoping)
+        db.conversations.create_index([("participants", 1)])
+        print("  ✅ Message indexes created")
+    except Exception as e:
+        print(f"❌ Error setting up message indexes: {e}")
+
+setup_message_indexes()
+
+def setup_post_indexes():
+    """Set up MongoDB indexes for posts"""
+    try:
+        # Post search
+        db.posts.create_index([("content", TEXT)], default_language="english")
+        print("  ✅ Post indexes created")
+    except Exception as e:
+        print(f"❌ Error setting up post indexes: {e}")
+
+setup_post_indexes()
+
+def setup_user_indexes():
+    """Set up MongoDB indexes for user search"""
+    try:
+        # Prefix search on the username and each word of the full name, read
+        # in followers order; username_lower finds exact matches
+        db.users.create_index([("username_prefixes", 1), ("followers_count", -1), ("username_lower", 1)])
+        db.users.create_index([("name_prefixes", 1), ("followers_count", -1), ("username_lower", 1)])
+        db.users.create_index([("username_lower", 1)])
+        print("  ✅ User indexes created")
+    except Exception as e:
+        print(f"❌ Error setting up user indexes: {e}")
+
+setup_user_indexes()
+
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix="/auth")
 app.register_blueprint(registration_bp, url_prefix="/users")
@@ -253,6 +358,10 @@ app.register_blueprint(feedback_bp, url_prefix="/api")
 app.register_blueprint(activities_bp, url_prefix='/api/activities')  
 app.register_blueprint(waypoint_bp, url_prefix='/waypoint')
 app.register_blueprint(eventthreads_bp, url_prefix='/eventthreads')
+app.register_blueprint(maintenance_bp, url_prefix='/maintenance')
+
+# Start background maintenance sweeps (shared sweeps run on the elected worker only)
+init_maintenance_scheduler(app, socketio)
 
 # ===== SOCKETIO EVENT HANDLERS =====
 
@@ -277,7 +386,11 @@ def handle_disconnect():
     logger.info(f"Socket {request.sid} disconnecting")
     try:
         from messages.socket_handlers import handle_disconnect
+        from waypoint.socket_handlers import handle_waypoint_disconnect
+        from eventthreads.socket_handlers import handle_event_thread_disconnect
         handle_disconnect()
+        handle_waypoint_disconnect()
+        handle_event_thread_disconnect()
     except ImportError as e:
         logger.error(f"Could not import socket handlers: {e}")
 
@@ -307,7 +420,25 @@ def handle_send_message(data):
     logger.info(f"Socket {request.sid} sending message to conversation {data.get('conversation_id')}")
     try:
         from messages.socket_handlers import handle_send_message
-        handle_send_message(socketio, data)
+        return handle_send_message(socketio, data)
+    except ImportError as e:
+        logger.error(f"Could not import socket handlers: {e}")
+
+@socketio.on('sync_since')
+def handle_sync_since(data):
+    """Send the messages a reconnecting client missed"""
+    try:
+        from messages.socket_handlers import handle_sync_since
+        return handle_sync_since(data)
+    except ImportError as e:
+        logger.error(f"Could not import socket handlers: {e}")
+
+@socketio.on('message_ack')
+def handle_message_ack(data):
+    """Record which messages a client has received"""
+    try:
+        from messages.socket_handlers import handle_message_ack
+        handle_message_ack(data)
     except ImportError as e:
         logger.error(f"Could not import socket handlers: {e}")
 
@@ -329,6 +460,42 @@ def handle_typing_stop(data):
     except ImportError as e:
         logger.error(f"Could not import socket handlers: {e}")
 
+@socketio.on('subscribe_waypoint_tiles')
+def handle_subscribe_waypoint_tiles(data):
+    """Subscribe to live waypoint updates for a set of map tiles"""
+    try:
+        from waypoint.socket_handlers import handle_subscribe_waypoint_tiles
+        handle_subscribe_waypoint_tiles(data)
+    except ImportError as e:
+        logger.error(f"Could not import waypoint socket handlers: {e}")
+
+@socketio.on('unsubscribe_waypoint_tiles')
+def handle_unsubscribe_waypoint_tiles(data=None):
+    """Stop live waypoint updates"""
+    try:
+        from waypoint.socket_handlers import handle_unsubscribe_waypoint_tiles
+        handle_unsubscribe_waypoint_tiles()
+    except ImportError as e:
+        logger.error(f"Could not import waypoint socket handlers: {e}")
+
+@socketio.on('join_event_thread')
+def handle_join_event_thread(data):
+    """Subscribe to live updates for an event thread"""
+    try:
+        from eventthreads.socket_handlers import handle_join_event_thread
+        handle_join_event_thread(data)
+    except ImportError as e:
+        logger.error(f"Could not import event thread socket handlers: {e}")
+
+@socketio.on('leave_event_thread')
+def handle_leave_event_thread(data):
+    """Stop live updates for an event thread"""
+    try:
+        from eventthreads.socket_handlers import handle_leave_event_thread
+        handle_leave_event_thread(data)
+    except ImportError as e:
+        logger.error(f"Could not import event thread socket handlers: {e}")
+
 # Add error handler for socket events
 @socketio.on_error_default
 def default_error_handler(e):
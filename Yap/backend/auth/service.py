@@ -9,6 +9,10 @@ from functools import wraps
 load_dotenv()
 JWT_SECRET = os.getenv("JWT_SECRET")
 
+# Tokens for the conversation event stream, which EventSource opens without headers
+STREAM_TOKEN_AUDIENCE = "conversation-stream"
+STREAM_TOKEN_TTL = timedelta(minutes=1)
+
 
 def generate_token(user: dict) -> str:
     payload = {
@@ -52,6 +56,18 @@ def get_current_user_from_token(token: str) -> dict:
     user["_id"] = str(user["_id"])
     return user
 
+def get_optional_user_id():
+    """Get the caller's user id from a Bearer token, or None for anonymous requests"""
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return None
+    
+    payload = verify_token(auth_header.split(" ")[1])
+    if "error" in payload:
+        return None
+    
+    return payload.get("user_id")
+
 def token_required(f):
     """Decorator to require valid JWT token for route access"""
     @wraps(f)
@@ -79,4 +95,30 @@ def token_required(f):
         # Pass current_user to the protected route
         return f(current_user, *args, **kwargs)
     
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+def generate_stream_token(user_id: str, conversation_id: str) -> str:
+    """Short-lived token that opens one conversation's event stream
+
+    EventSource can't set an Authorization header, so the stream accepts
+    this in its query string instead. It carries an audience, which
+    verify_token rejects, so it can't be used as a login token.
+    """
+    payload = {
+        "user_id": user_id,
+        "conversation_id": conversation_id,
+        "aud": STREAM_TOKEN_AUDIENCE,
+        "exp": datetime.utcnow() + STREAM_TOKEN_TTL
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+
+def verify_stream_token(token: str, conversation_id: str):
+    """Get the user id from a stream token for conversation_id, or None"""
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"], audience=STREAM_TOKEN_AUDIENCE)
+    except jwt.InvalidTokenError:
+        return None
+    
+    if payload.get("conversation_id") != conversation_id:
+        return None
+    return payload.get("user_id")
@@ -1,5 +1,6 @@
 from datetime import datetime
 from bson import ObjectId
+from shared.ids import canonical_id, ref_match
 from flask import current_app
 
 class Comment:
@@ -11,7 +12,7 @@ class Comment:
         # created the comment format
         comment_doc = {
             "post_id": post_id,
-            "user_id": user_id,
+            "user_id": canonical_id(user_id),
             "username": username,
             "content": content,
             "created_at": datetime.utcnow(),
@@ -29,6 +30,7 @@ class Comment:
         
         # return the created comment with its ID
         comment_doc["_id"] = str(result.inserted_id)
+        comment_doc["user_id"] = str(comment_doc["user_id"])
         return comment_doc
     
     @staticmethod
@@ -45,7 +47,7 @@ class Comment:
                 "$project": {
                     "_id": {"$toString": "$_id"},
                     "post_id": 1,
-                    "user_id": 1,
+                    "user_id": {"$toString": "$user_id"},
                     "username": 1,
                     "content": 1,
                     "created_at": 1,
@@ -66,7 +68,7 @@ class Comment:
             # Find the comment first
             comment = db.comments.find_one({
                 "_id": ObjectId(comment_id),
-                "user_id": user_id  # only the owner can delete
+                "user_id": ref_match(user_id)  # only the owner can delete
             })
             
             if not comment:
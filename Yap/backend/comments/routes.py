@@ -3,6 +3,7 @@ from comments.models import Comment
 from posts.models import Post
 from auth.service import token_required
 from bson import ObjectId
+from shared.ids import canonical_id, lookup_by_ref
 
 comments_bp = Blueprint('comments', __name__)
 
@@ -61,17 +62,8 @@ def get_post_comments(post_id):
         
         # Get post with profile picture
         post_pipeline = [
-            {"$match": {"_id": ObjectId(post_id)}},
-            {
-                "$lookup": {
-                    "from": "users",
-                    "let": {"user_id": {"$toObjectId": "$user_id"}},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                    ],
-                    "as": "user_info"
-                }
-            },
+            {"$match": {"_id": canonical_id(post_id)}},
+            lookup_by_ref("users", "user_id", "user_info"),
             {
                 "$unwind": {
                     "path": "$user_info",
@@ -81,7 +73,7 @@ def get_post_comments(post_id):
             {
                 "$project": {
                     "_id": {"$toString": "$_id"},
-                    "user_id": 1,
+                    "user_id": {"$toString": "$user_id"},
                     "username": {"$ifNull": ["$user_info.username", "$username"]},
                     "content": 1,
                     "created_at": 1,
@@ -104,17 +96,7 @@ def get_post_comments(post_id):
             {"$sort": {"created_at": 1}},
             {"$skip": skip},
             {"$limit": limit},
-            # Convert user_id string to ObjectId for lookup
-            {
-                "$lookup": {
-                    "from": "users",
-                    "let": {"user_id": {"$toObjectId": "$user_id"}},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                    ],
-                    "as": "user_info"
-                }
-            },
+            lookup_by_ref("users", "user_id", "user_info"),
             {
                 "$unwind": {
                     "path": "$user_info",
@@ -125,7 +107,7 @@ def get_post_comments(post_id):
                 "$project": {
                     "_id": {"$toString": "$_id"},
                     "post_id": 1,
-                    "user_id": 1,
+                    "user_id": {"$toString": "$user_id"},
                     "username": {"$ifNull": ["$user_info.username", "$username"]},
                     "content": 1,
                     "created_at": 1,
@@ -0,0 +1,330 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from shared.ids import canonical_id, ref_match
+from events.models import Event
+from eventthreads.models import delete_s3_objects
+from eventthreads.stats import ThreadStats
+from waypoint.models import Waypoint
+from events.friends_cache import friends_attending_cache
+
+CANCELLATION_BATCH_SIZE = 1000  # Documents deleted per round trip
+CANCELLATION_LEASE = timedelta(minutes=5)  # A worker that stops renewing this long is presumed dead
+CANCELLATION_MAX_ATTEMPTS = 5
+
+# Stages run in this order; each one is safe to re-run after a crash
+CANCELLATION_STAGES = ["thread_posts", "attendances", "event_likes", "waypoints", "event_image", "event"]
+
+
+class EventCancellation:
+    """Background cleanup of a cancelled event and everything hanging off it.
+
+    Cancelling marks the event inactive straight away (so it leaves the feed
+    and stops accepting attendees and thread posts) and records a job in
+    event_cancellations. The job then deletes thread posts and their likes
+    and images, attendances, likes, the waypoint, the event image and finally
+    the event itself, in batches, recording progress as it goes. If the
+    worker dies part way, the maintenance scheduler picks the job back up
+    from the stage it was on once its lease expires.
+    """
+
+    @staticmethod
+    def start(event, user_id):
+        """Mark an event cancelled and start its cleanup job, returns the job"""
+        db = current_app.config["DB"]
+        event_id = str(event["_id"])
+        now = datetime.utcnow()
+
+        try:
+            # Cancelling twice reports the job already underway, or retries a failed one
+            existing = db.event_cancellations.find_one({"event_id": event_id})
+            if existing:
+                if existing["status"] == "failed":
+                    existing = db.event_cancellations.find_one_and_update(
+                        {"_id": existing["_id"], "status": "failed"},
+                        {"$set": {"status": "pending", "attempts": 0, "updated_at": now}},
+                        return_document=ReturnDocument.AFTER
+                    ) or existing
+                    EventCancellation._run_in_background(existing["_id"])
+                return EventCancellation._serialize(existing)
+
+            db.events.update_one(
+                {"_id": canonical_id(event_id)},
+                {"$set": {"is_active": False, "cancelled_at": now}}
+            )
+            Event.sync_upcoming_events_view(event_id)
+            friends_attending_cache.invalidate_event(event_id)
+
+            job = {
+                "event_id": event_id,
+                "user_id": user_id,
+                "event_image": event.get("image"),
+                "status": "pending",
+                "stage": CANCELLATION_STAGES[0],
+                "counts": {},
+                "attempts": 0,
+                "last_error": None,
+                "lease_expires_at": None,
+                "created_at": now,
+                "updated_at": now
+            }
+            try:
+                job["_id"] = db.event_cancellations.insert_one(job).inserted_id
+            except DuplicateKeyError:
+                # A concurrent cancel got its job in first
+                existing = db.event_cancellations.find_one({"event_id": event_id})
+                return EventCancellation._serialize(existing)
+
+            EventCancellation._run_in_background(job["_id"])
+            return EventCancellation._serialize(job)
+
+        except Exception as e:
+            print(f"Error starting cancellation for event {event_id}: {e}")
+            return {"error": str(e)}
+
+    @staticmethod
+    def get_status(event_id):
+        """Get the cancellation job for an event, or None"""
+        db = current_app.config["DB"]
+
+        job = db.event_cancellations.find_one({"event_id": event_id})
+        return EventCancellation._serialize(job) if job else None
+
+    @staticmethod
+    def resume_stalled():
+        """Run jobs whose worker died or failed part way, returns how many finished"""
+        db = current_app.config["DB"]
+
+        stalled = db.event_cancellations.find(
+            {
+                "status": {"$in": ["pending", "running"]},
+                "$or": [
+                    {"lease_expires_at": None},
+                    {"lease_expires_at": {"$lt": datetime.utcnow()}}
+                ]
+            },
+            {"_id": 1}
+        )
+
+        completed = 0
+        for job in list(stalled):
+            if EventCancellation.run(job["_id"]) == "completed":
+                completed += 1
+        return completed
+
+    @staticmethod
+    def run(job_id):
+        """Claim a job and run its remaining stages, returns the final status"""
+        db = current_app.config["DB"]
+
+        job = EventCancellation._claim(job_id)
+        if not job:
+            return None
+
+        stage = job["stage"]
+        try:
+            start_index = CANCELLATION_STAGES.index(stage)
+            for stage in CANCELLATION_STAGES[start_index:]:
+                db.event_cancellations.update_one(
+                    {"_id": job_id},
+                    {"$set": {"stage": stage, "updated_at": datetime.utcnow()}}
+                )
+                getattr(EventCancellation, f"_delete_{stage}")(job)
+
+            db.event_cancellations.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {
+                        "status": "completed",
+                        "completed_at": datetime.utcnow(),
+                        "updated_at": datetime.utcnow(),
+                        "lease_expires_at": None,
+                        "last_error": None
+                    }
+                }
+            )
+            print(f"Cancellation of event {job['event_id']} completed")
+            return "completed"
+
+        except Exception as e:
+            # Hand the job back; the maintenance sweep retries it from this stage
+            status = "failed" if job["attempts"] >= CANCELLATION_MAX_ATTEMPTS else "pending"
+            db.event_cancellations.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {
+                        "status": status,
+                        "last_error": str(e),
+                        "lease_expires_at": None,
+                        "updated_at": datetime.utcnow()
+                    }
+                }
+            )
+            print(f"Error cancelling event {job['event_id']} at stage {stage}: {e}")
+            return status
+
+    @staticmethod
+    def _run_in_background(job_id):
+        """Run a job on a SocketIO background task, or inline when there is no SocketIO"""
+        app = current_app._get_current_object()
+        socketio = current_app.extensions.get('socketio')
+
+        def task():
+            with app.app_context():
+                EventCancellation.run(job_id)
+
+        if socketio:
+            socketio.start_background_task(task)
+        else:
+            task()
+
+    @staticmethod
+    def _claim(job_id):
+        """Take the job's lease so only one worker runs it at a time"""
+        db = current_app.config["DB"]
+        now = datetime.utcnow()
+
+        return db.event_cancellations.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": {"$in": ["pending", "running"]},
+                "$or": [
+                    {"lease_expires_at": None},
+                    {"lease_expires_at": {"$lt": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "lease_expires_at": now + CANCELLATION_LEASE,
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def _record_progress(job, counts):
+        """Add to the job's deleted counts and renew its lease"""
+        db = current_app.config["DB"]
+        now = datetime.utcnow()
+
+        db.event_cancellations.update_one(
+            {"_id": job["_id"]},
+            {
+                "$inc": {f"counts.{name}": count for name, count in counts.items()},
+                "$set": {"updated_at": now, "lease_expires_at": now + CANCELLATION_LEASE}
+            }
+        )
+
+    @staticmethod
+    def _delete_in_batches(job, collection, query, counter):
+        """Delete everything matching query, CANCELLATION_BATCH_SIZE documents at a time"""
+        while True:
+            batch_ids = [
+                doc["_id"] for doc in
+                collection.find(query, {"_id": 1}).limit(CANCELLATION_BATCH_SIZE)
+            ]
+            if not batch_ids:
+                return
+
+            deleted = collection.delete_many({"_id": {"$in": batch_ids}}).deleted_count
+            EventCancellation._record_progress(job, {counter: deleted})
+
+    @staticmethod
+    def _delete_thread_posts(job):
+        """Delete thread posts with their likes and private images, a batch at a time"""
+        db = current_app.config["DB"]
+        private_bucket = current_app.config.get("S3_CONFIG", {}).get("private_bucket")
+
+        while True:
+            posts = list(
+                db.event_threads.find({"event_id": job["event_id"]}, {"_id": 1, "s3_keys": 1})
+                .limit(CANCELLATION_BATCH_SIZE)
+            )
+            if not posts:
+                ThreadStats.delete(job["event_id"])
+                return
+
+            post_ids = [post["_id"] for post in posts]
+            s3_keys = [key for post in posts for key in post.get("s3_keys", [])]
+
+            # Images and likes go before the posts so a retry can still find them.
+            # Deleting an already-deleted key succeeds, so the retry redoes the batch
+            images_deleted = delete_s3_objects(s3_keys, private_bucket)
+            if private_bucket and images_deleted < len(s3_keys):
+                raise RuntimeError(
+                    f"Deleted {images_deleted} of {len(s3_keys)} thread images, will retry"
+                )
+            likes_deleted = db.thread_likes.delete_many(
+                {"post_id": {"$in": [str(post_id) for post_id in post_ids]}}
+            ).deleted_count
+            posts_deleted = db.event_threads.delete_many({"_id": {"$in": post_ids}}).deleted_count
+
+            EventCancellation._record_progress(job, {
+                "thread_posts": posts_deleted,
+                "thread_likes": likes_deleted,
+                "thread_images": images_deleted
+            })
+
+    @staticmethod
+    def _delete_attendances(job):
+        db = current_app.config["DB"]
+        EventCancellation._delete_in_batches(
+            job, db.attendances, {"event_id": job["event_id"]}, "attendances"
+        )
+        friends_attending_cache.invalidate_event(job["event_id"])
+
+    @staticmethod
+    def _delete_event_likes(job):
+        db = current_app.config["DB"]
+        EventCancellation._delete_in_batches(
+            job, db.likes, {"post_id": ref_match(job["event_id"]), "type": "event"}, "event_likes"
+        )
+
+    @staticmethod
+    def _delete_waypoints(job):
+        deleted = Waypoint.delete_event_waypoints(job["event_id"])
+        EventCancellation._record_progress(job, {"waypoints": deleted})
+
+    @staticmethod
+    def _delete_event_image(job):
+        """Delete the event's cover image from the public bucket"""
+        image = job.get("event_image")
+        public_bucket = current_app.config.get("S3_CONFIG", {}).get("public_bucket")
+
+        if not image or not public_bucket or not image.startswith(f"https://{public_bucket}.s3."):
+            return
+
+        # URL format: https://bucket.s3.region.amazonaws.com/event_images/filename.jpg
+        s3_key = '/'.join(image.split('/')[-2:])
+        deleted = delete_s3_objects([s3_key], public_bucket)
+        EventCancellation._record_progress(job, {"event_image": deleted})
+
+    @staticmethod
+    def _delete_event(job):
+        db = current_app.config["DB"]
+
+        deleted = db.events.delete_one({"_id": canonical_id(job["event_id"])}).deleted_count
+
+        EventCancellation._record_progress(job, {"event": deleted})
+        Event.sync_upcoming_events_view(job["event_id"])
+
+    @staticmethod
+    def _serialize(job):
+        return {
+            "_id": str(job["_id"]),
+            "event_id": job["event_id"],
+            "user_id": job["user_id"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "stages": CANCELLATION_STAGES,
+            "counts": job.get("counts", {}),
+            "attempts": job.get("attempts", 0),
+            "last_error": job.get("last_error"),
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "completed_at": job.get("completed_at")
+        }
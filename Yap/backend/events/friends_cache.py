@@ -0,0 +1,85 @@
+from flask import current_app
+from shared.ids import ref_match
+from shared.set_cache import SetCache
+
+
+def _load_following(user_id):
+    db = current_app.config["DB"]
+    return (
+        str(doc["following_id"])
+        for doc in db.follows.find({"follower_id": ref_match(user_id)}, {"following_id": 1, "_id": 0})
+    )
+
+
+def _load_attendees(event_id):
+    db = current_app.config["DB"]
+    return (doc["user_id"] for doc in db.attendances.find({"event_id": event_id}, {"user_id": 1, "_id": 0}))
+
+
+class FriendsAttendingCache:
+    """In-memory following sets per user and attendee sets per event.
+
+    "Friends attending" on the event details page is the intersection of the
+    viewer's following set with the event's attendee set, so once both are
+    warm it needs no database round trip. Warm attendee sets also let event
+    thread access (HTTP and socket) skip the attendances lookup for members.
+    Follow/unfollow drops the follower's set, attend/unattend add or remove
+    the user from the event's set and cancellation drops it; the TTL bounds
+    staleness from writes made by other processes.
+    """
+
+    def __init__(self, ttl_seconds=120, max_users=5000, max_events=2000):
+        self.following = SetCache(_load_following, ttl_seconds, max_users)
+        self.attendees = SetCache(_load_attendees, ttl_seconds, max_events)
+
+    def get_following(self, user_id):
+        return self.following.get(user_id)
+
+    def get_attendees(self, event_id):
+        return self.attendees.get(event_id)
+
+    def get_friends_attending(self, user_id, event_id):
+        """IDs of users that user_id follows who are attending event_id"""
+        following = self.get_following(user_id)
+        if not following:
+            return set()
+        return following & self.get_attendees(event_id)
+
+    def is_attending(self, event_id, user_id):
+        """Whether user_id is attending event_id
+
+        A hit in a warm attendee set answers straight away. Anything else is
+        checked against attendances for just this user, so a miss never
+        loads the whole event and someone who attended through another
+        worker isn't refused until the set expires.
+        """
+        attendees = self.attendees.peek(event_id)
+        if attendees is not None and user_id in attendees:
+            return True
+
+        db = current_app.config["DB"]
+        attending = db.attendances.find_one({"event_id": event_id, "user_id": user_id}, {"_id": 1}) is not None
+        if attending and attendees is not None:
+            self.add_attendee(event_id, user_id)
+        return attending
+
+    def add_attendee(self, event_id, user_id):
+        self.attendees.add(event_id, user_id)
+
+    def remove_attendee(self, event_id, user_id):
+        self.attendees.discard(event_id, user_id)
+
+    def invalidate_user(self, user_id):
+        self.following.invalidate(user_id)
+
+    def invalidate_event(self, event_id):
+        self.attendees.invalidate(event_id)
+
+    def get_stats(self):
+        return {
+            "following": self.following.get_stats(),
+            "attendees": self.attendees.get_stats()
+        }
+
+
+friends_attending_cache = FriendsAttendingCache()
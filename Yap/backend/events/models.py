@@ -1,6 +1,32 @@
 from datetime import datetime, timezone
 from bson import ObjectId
+from shared.ids import canonical_id, to_object_ids, ref_match, lookup_by_ref
 from flask import current_app
+from waypoint.models import Waypoint
+from events.friends_cache import friends_attending_cache
+
+def _encode_keyset_cursor(doc):
+    """Encode a (created_at, _id) position as an opaque pagination cursor"""
+    return f"{doc['created_at'].isoformat()}_{doc['_id']}"
+
+def _keyset_match(cursor):
+    """Match documents strictly after a cursor in (created_at desc, _id desc) order"""
+    if not cursor:
+        return {}
+    
+    try:
+        created_at_str, object_id_str = cursor.rsplit("_", 1)
+        created_at = datetime.fromisoformat(created_at_str)
+        object_id = ObjectId(object_id_str)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": object_id}}
+        ]
+    }
 
 class Event:
     @staticmethod
@@ -22,7 +48,7 @@ class Event:
         
         # Create the event document
         event_doc = {
-            "user_id": user_id,
+            "user_id": canonical_id(user_id),
             "username": username,
             "title": title,
             "description": description,
@@ -45,137 +71,144 @@ class Event:
         
         # Return the created event with its ID
         event_doc["_id"] = str(result.inserted_id)
+        event_doc["user_id"] = str(event_doc["user_id"])
+        
+        Event.sync_upcoming_events_view(event_doc["_id"])
         return event_doc
     
     @staticmethod
-    def get_all_events(limit=50, skip=0, include_past=False):
-        """Get all events with pagination and profile pictures"""
+    def _feed_stages():
+        """Pipeline stages that shape an event for the feed (creator profile joined in)"""
+        return [
+            lookup_by_ref("users", "user_id", "user_info"),
+            {
+                "$addFields": {
+                    "user_info": {"$arrayElemAt": ["$user_info", 0]}
+                }
+            },
+            {
+                "$project": {
+                    "user_id": {"$toString": "$user_id"},
+                    "username": {"$ifNull": ["$user_info.username", "$username"]},
+                    "title": 1,
+                    "description": 1,
+                    "event_datetime": 1,
+                    "location": 1,
+                    "location_title": 1,
+                    "latitude": 1,
+                    "longitude": 1,
+                    "image": 1,
+                    "max_attendees": 1,
+                    "created_at": 1,
+                    "attendees_count": {"$ifNull": ["$attendees_count", 0]},
+                    "likes_count": {"$ifNull": ["$likes_count", 0]},
+                    "comments_count": {"$ifNull": ["$comments_count", 0]},
+                    "is_active": 1,
+                    "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]}
+                }
+            }
+        ]
+    
+    @staticmethod
+    def refresh_upcoming_events_view(event_id=None):
+        """Rebuild upcoming_events_view, or just one event's entry if event_id is given
+        
+        The view holds every active, upcoming event already joined with its
+        creator's profile, so the feed is a plain indexed find. Entries are
+        written with $merge; anything not rewritten by this refresh (past,
+        cancelled or deleted events) is removed afterwards. Returns the
+        number of entries removed.
+        """
         db = current_app.config["DB"]
+        refreshed_at = datetime.utcnow()
         
-        # Base match condition
-        match_condition = {"is_active": True}
+        match_condition = {"is_active": True, "event_datetime": {"$gte": refreshed_at}}
+        stale_condition = {"view_refreshed_at": {"$lt": refreshed_at}}
         
-        # Filter out past events if not requested
-        if not include_past:
-            match_condition["event_datetime"] = {"$gte": datetime.utcnow()}
+        if event_id is not None:
+            event_key = canonical_id(event_id)
+            match_condition["_id"] = event_key
+            stale_condition["_id"] = event_key
+        
+        pipeline = [
+            {"$match": match_condition},
+            *Event._feed_stages(),
+            {"$addFields": {"view_refreshed_at": {"$literal": refreshed_at}}},
+            {
+                "$merge": {
+                    "into": "upcoming_events_view",
+                    "on": "_id",
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert"
+                }
+            }
+        ]
         
+        db.events.aggregate(pipeline)
+        return db.upcoming_events_view.delete_many(stale_condition).deleted_count
+    
+    @staticmethod
+    def sync_upcoming_events_view(event_id):
+        """Refresh one event's feed entry after it changes, without failing the caller"""
         try:
-            # First try the aggregation pipeline approach
+            Event.refresh_upcoming_events_view(event_id)
+        except Exception as e:
+            print(f"Error refreshing feed entry for event {event_id}: {e}")
+    
+    @staticmethod
+    def remove_past_events_from_view():
+        """Drop events that have started from upcoming_events_view"""
+        db = current_app.config["DB"]
+        
+        result = db.upcoming_events_view.delete_many({"event_datetime": {"$lt": datetime.utcnow()}})
+        return result.deleted_count
+    
+    @staticmethod
+    def get_all_events(limit=50, skip=0, include_past=False):
+        """Get all events with pagination and profile pictures
+        
+        Upcoming events are read straight from upcoming_events_view. Past
+        events aren't in the view, so include_past runs the feed aggregation
+        over the events collection instead. The same aggregation covers an
+        empty view, which happens before its first build (the scheduler
+        builds it, and may be disabled).
+        """
+        db = current_app.config["DB"]
+        
+        def aggregate_events(match_condition):
             pipeline = [
                 {"$match": match_condition},
-                {
-                    "$addFields": {
-                        "user_object_id": {
-                            "$cond": {
-                                "if": {"$type": ["$user_id", "objectId"]},
-                                "then": "$user_id",
-                                "else": {"$toObjectId": "$user_id"}
-                            }
-                        }
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "user_object_id",
-                        "foreignField": "_id",
-                        "as": "user_info"
-                    }
-                },
-                {
-                    "$addFields": {
-                        "user_info": {"$arrayElemAt": ["$user_info", 0]}
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": {"$toString": "$_id"},
-                        "user_id": {"$toString": "$user_id"},
-                        "username": {"$ifNull": ["$user_info.username", "$username"]},
-                        "title": 1,
-                        "description": 1,
-                        "event_datetime": 1,
-                        "location": 1,
-                        "location_title": 1,
-                        "latitude": 1,
-                        "longitude": 1,
-                        "max_attendees": 1,
-                        "created_at": 1,
-                        "attendees_count": {"$ifNull": ["$attendees_count", 0]},
-                        "likes_count": {"$ifNull": ["$likes_count", 0]},
-                        "comments_count": {"$ifNull": ["$comments_count", 0]},
-                        "is_active": 1,
-                        "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]}
-                    }
-                },
                 {"$sort": {"event_datetime": 1}},  # Sort by event date (upcoming first)
                 {"$skip": skip},
-                {"$limit": limit}
+                {"$limit": limit},
+                *Event._feed_stages()
             ]
+            return list(db.events.aggregate(pipeline))
+        
+        try:
+            if include_past:
+                events = aggregate_events({"is_active": True})
+            else:
+                now = datetime.utcnow()
+                # Filter on time too, in case the view hasn't been swept yet
+                cursor = db.upcoming_events_view.find(
+                    {"event_datetime": {"$gte": now}},
+                    {"view_refreshed_at": 0}
+                ).sort("event_datetime", 1).skip(skip).limit(limit)
+                events = list(cursor)
+                
+                if not events and db.upcoming_events_view.find_one({}, {"_id": 1}) is None:
+                    events = aggregate_events({"is_active": True, "event_datetime": {"$gte": now}})
             
-            events = list(db.events.aggregate(pipeline))
-            
-            # If aggregation returns no results, fall back to simple find
-            if not events:
-                print("Aggregation returned no results, trying simple find...")
-                cursor = db.events.find(match_condition).sort("event_datetime", 1).skip(skip).limit(limit)
-                events = []
-                for event in cursor:
-                    event["_id"] = str(event["_id"])
-                    event["user_id"] = str(event["user_id"]) if event.get("user_id") else None
-                    event["attendees_count"] = event.get("attendees_count", 0)
-                    event["likes_count"] = event.get("likes_count", 0)
-                    event["comments_count"] = event.get("comments_count", 0)
-                    
-                    # Fetch profile picture from users collection
-                    try:
-                        user = db.users.find_one({"_id": ObjectId(event["user_id"])})
-                        if user:
-                            event["profile_picture"] = user.get("profile_picture")
-                            event["username"] = user.get("username", event.get("username"))
-                        else:
-                            event["profile_picture"] = None
-                    except Exception as user_error:
-                        print(f"Error fetching user info for event {event['_id']}: {user_error}")
-                        event["profile_picture"] = None
-                    
-                    events.append(event)
+            for event in events:
+                event["_id"] = str(event["_id"])
             
             print(f"Found {len(events)} events")
             return events
             
         except Exception as e:
-            print(f"Error in aggregation pipeline: {e}")
-            # Fallback to simple query
-            try:
-                cursor = db.events.find(match_condition).sort("event_datetime", 1).skip(skip).limit(limit)
-                events = []
-                for event in cursor:
-                    event["_id"] = str(event["_id"])
-                    event["user_id"] = str(event["user_id"]) if event.get("user_id") else None
-                    event["attendees_count"] = event.get("attendees_count", 0)
-                    event["likes_count"] = event.get("likes_count", 0)
-                    event["comments_count"] = event.get("comments_count", 0)
-                    
-                    # Fetch profile picture from users collection
-                    try:
-                        user = db.users.find_one({"_id": ObjectId(event["user_id"])})
-                        if user:
-                            event["profile_picture"] = user.get("profile_picture")
-                            event["username"] = user.get("username", event.get("username"))
-                        else:
-                            event["profile_picture"] = None
-                    except Exception as user_error:
-                        print(f"Error fetching user info for event {event['_id']}: {user_error}")
-                        event["profile_picture"] = None
-                    
-                    events.append(event)
-                
-                print(f"Fallback query found {len(events)} events")
-                return events
-            except Exception as fallback_error:
-                print(f"Fallback query also failed: {fallback_error}")
-                return []
+            print(f"Error getting events feed: {e}")
+            return []
     
     @staticmethod
     def get_user_events(user_id, limit=50, skip=0, include_past=False):
@@ -183,7 +216,7 @@ class Event:
         db = current_app.config["DB"]
         
         # Base match condition
-        match_condition = {"user_id": user_id, "is_active": True}
+        match_condition = {"user_id": ref_match(user_id), "is_active": True}
         
         # Filter out past events if not requested
         if not include_past:
@@ -211,26 +244,7 @@ class Event:
         db = current_app.config["DB"]
         
         try:
-            print(f"Looking for event with ID: {event_id}")
-            
-            event = None
-            
-            # First try with ObjectId
-            try:
-                event = db.events.find_one({"_id": ObjectId(event_id)})
-                if event:
-                    print(f"Found event with ObjectId")
-            except Exception as e:
-                print(f"ObjectId lookup failed: {e}")
-            
-            # If not found with ObjectId, try with string ID
-            if not event:
-                try:
-                    event = db.events.find_one({"_id": event_id})
-                    if event:
-                        print(f"Found event with string ID")
-                except Exception as e:
-                    print(f"String ID lookup failed: {e}")
+            event = db.events.find_one({"_id": canonical_id(event_id)})
             
             if event:
                 # Convert IDs to strings and ensure required fields exist
@@ -240,7 +254,6 @@ class Event:
                 event["likes_count"] = event.get("likes_count", 0)
                 event["comments_count"] = event.get("comments_count", 0)
                 
-                print(f"Successfully found event: {event['title']}")
                 return event
             else:
                 print(f"Event not found: {event_id}")
@@ -262,8 +275,8 @@ class Event:
             
             # Check if user already liked this event
             existing_like = db.likes.find_one({
-                "post_id": event_id,  # Using post_id field for consistency
-                "user_id": user_id,
+                "post_id": ref_match(event_id),  # Using post_id field for consistency
+                "user_id": ref_match(user_id),
                 "type": "event"
             })
             
@@ -274,41 +287,31 @@ class Event:
                 db.likes.delete_one({"_id": existing_like["_id"]})
                 
                 # Update event like count
-                try:
-                    db.events.update_one(
-                        {"_id": ObjectId(event_id)},
-                        {"$inc": {"likes_count": -1}}
-                    )
-                except:
-                    db.events.update_one(
-                        {"_id": event_id},
-                        {"$inc": {"likes_count": -1}}
-                    )
-                    
+                db.events.update_one(
+                    {"_id": canonical_id(event_id)},
+                    {"$inc": {"likes_count": -1}}
+                )
+                
+                Event.sync_upcoming_events_view(event_id)
                 print("Event unliked successfully")
                 return {"liked": False, "message": "Event unliked"}
             else:
                 # Like - add like and increment count
                 like_doc = {
-                    "post_id": event_id,  # Using post_id field for consistency
-                    "user_id": user_id,
+                    "post_id": canonical_id(event_id),  # Using post_id field for consistency
+                    "user_id": canonical_id(user_id),
                     "type": "event",
                     "created_at": datetime.utcnow()
                 }
                 db.likes.insert_one(like_doc)
                 
                 # Update event like count
-                try:
-                    db.events.update_one(
-                        {"_id": ObjectId(event_id)},
-                        {"$inc": {"likes_count": 1}}
-                    )
-                except:
-                    db.events.update_one(
-                        {"_id": event_id},
-                        {"$inc": {"likes_count": 1}}
-                    )
-                    
+                db.events.update_one(
+                    {"_id": canonical_id(event_id)},
+                    {"$inc": {"likes_count": 1}}
+                )
+                
+                Event.sync_upcoming_events_view(event_id)
                 print("Event liked successfully")
                 return {"liked": True, "message": "Event liked"}
                 
@@ -324,8 +327,8 @@ class Event:
         db = current_app.config["DB"]
         
         like = db.likes.find_one({
-            "post_id": event_id,  # Using post_id field for consistency
-            "user_id": user_id,
+            "post_id": ref_match(event_id),  # Using post_id field for consistency
+            "user_id": ref_match(user_id),
             "type": "event"
         })
         
@@ -361,19 +364,15 @@ class Event:
             if existing_attendance:
                 # Unattend - remove attendance and decrement count
                 db.attendances.delete_one({"_id": existing_attendance["_id"]})
+                friends_attending_cache.remove_attendee(event_id, user_id)
                 
                 # Update event attendance count
-                try:
-                    db.events.update_one(
-                        {"_id": ObjectId(event_id)},
-                        {"$inc": {"attendees_count": -1}}
-                    )
-                except:
-                    db.events.update_one(
-                        {"_id": event_id},
-                        {"$inc": {"attendees_count": -1}}
-                    )
-                    
+                db.events.update_one(
+                    {"_id": canonical_id(event_id)},
+                    {"$inc": {"attendees_count": -1}}
+                )
+                
+                Event.sync_upcoming_events_view(event_id)
                 print("Event unattended successfully")
                 return {"attending": False, "message": "No longer attending event"}
             else:
@@ -388,19 +387,15 @@ class Event:
                     "created_at": datetime.utcnow()
                 }
                 db.attendances.insert_one(attendance_doc)
+                friends_attending_cache.add_attendee(event_id, user_id)
                 
                 # Update event attendance count
-                try:
-                    db.events.update_one(
-                        {"_id": ObjectId(event_id)},
-                        {"$inc": {"attendees_count": 1}}
-                    )
-                except:
-                    db.events.update_one(
-                        {"_id": event_id},
-                        {"$inc": {"attendees_count": 1}}
-                    )
-                    
+                db.events.update_one(
+                    {"_id": canonical_id(event_id)},
+                    {"$inc": {"attendees_count": 1}}
+                )
+                
+                Event.sync_upcoming_events_view(event_id)
                 print("Event attended successfully")
                 return {"attending": True, "message": "Now attending event"}
                 
@@ -441,61 +436,115 @@ class Event:
         return attendance is not None
     
     @staticmethod
-    def get_event_attendees(event_id, limit=50, skip=0):
-        """Get list of users attending an event"""
+    def get_event_attendees(event_id, limit=50, skip=0, cursor=None):
+        """Get list of users attending an event, newest first
+        
+        Users are hydrated with a single $in query. Pass the returned
+        next_cursor back as cursor for keyset pagination; skip is only
+        used when no cursor is given.
+        """
         db = current_app.config["DB"]
+        keyset = _keyset_match(cursor)  # Raises ValueError for a malformed cursor
         
         try:
-            cursor = db.attendances.find({"event_id": event_id}).sort("created_at", -1).skip(skip).limit(limit)
+            query = {"event_id": event_id, **keyset}
+            attendances = list(
+                db.attendances.find(query, {"user_id": 1, "created_at": 1})
+                .sort([("created_at", -1), ("_id", -1)])
+                .skip(0 if cursor else skip)
+                .limit(limit)
+            )
+            
+            user_object_ids = to_object_ids(attendance["user_id"] for attendance in attendances)
+            
+            users = {
+                str(user["_id"]): user
+                for user in db.users.find(
+                    {"_id": {"$in": user_object_ids}},
+                    {"username": 1, "profile_picture": 1}
+                )
+            }
+            
             attendees = []
+            for attendance in attendances:
+                user = users.get(attendance["user_id"])
+                if user:
+                    attendees.append({
+                        "_id": str(user["_id"]),
+                        "username": user.get("username", "Unknown"),
+                        "profile_picture": user.get("profile_picture"),
+                        "joined_at": attendance["created_at"]
+                    })
             
-            for attendance in cursor:
-                # Get user info
-                try:
-                    user = db.users.find_one({"_id": ObjectId(attendance["user_id"])})
-                    if user:
-                        attendees.append({
-                            "_id": str(user["_id"]),
-                            "username": user.get("username", "Unknown"),
-                            "profile_picture": user.get("profile_picture"),
-                            "joined_at": attendance["created_at"]
-                        })
-                except:
-                    continue
-            
-            return attendees
+            return {
+                "attendees": attendees,
+                "next_cursor": _encode_keyset_cursor(attendances[-1]) if len(attendances) == limit else None
+            }
             
         except Exception as e:
             print(f"Error getting event attendees: {e}")
-            return []
+            return {"attendees": [], "next_cursor": None}
     
     @staticmethod
-    def get_user_attending_events(user_id, limit=50, skip=0, include_past=False):
-        """Get events that a user is attending"""
+    def get_user_attending_events(user_id, limit=50, skip=0, include_past=False, cursor=None):
+        """Get events that a user is attending, most recently joined first
+        
+        One aggregation joins attendances to their events, dropping cancelled
+        (and, unless include_past, past) events before paginating so pages
+        are always full. Supports the same keyset cursor as get_event_attendees.
+        """
         db = current_app.config["DB"]
+        keyset = _keyset_match(cursor)  # Raises ValueError for a malformed cursor
         
         try:
-            # Get user's attendances
-            cursor = db.attendances.find({"user_id": user_id}).sort("created_at", -1).skip(skip).limit(limit)
-            attending_events = []
+            event_match = {
+                "$expr": {"$eq": ["$_id", "$$event_object_id"]},
+                "is_active": True
+            }
+            if not include_past:
+                event_match["event_datetime"] = {"$gt": datetime.utcnow()}
             
-            for attendance in cursor:
-                # Get event details
-                event = Event.get_event_by_id(attendance["event_id"])
-                if event and event.get("is_active", True):
-                    # Filter past events if not requested
-                    if not include_past and event.get("event_datetime"):
-                        if event["event_datetime"] <= datetime.utcnow():
-                            continue
-                    
-                    event["joined_at"] = attendance["created_at"]
-                    attending_events.append(event)
+            pipeline = [
+                {"$match": {"user_id": user_id, **keyset}},
+                {"$sort": {"created_at": -1, "_id": -1}},
+                {
+                    "$lookup": {
+                        "from": "events",
+                        "let": {
+                            "event_object_id": {
+                                "$convert": {"input": "$event_id", "to": "objectId", "onError": "$event_id"}
+                            }
+                        },
+                        "pipeline": [{"$match": event_match}],
+                        "as": "event"
+                    }
+                },
+                {"$unwind": "$event"},
+                {"$skip": 0 if cursor else skip},
+                {"$limit": limit}
+            ]
+            
+            attendances = list(db.attendances.aggregate(pipeline))
+            
+            attending_events = []
+            for attendance in attendances:
+                event = attendance["event"]
+                event["_id"] = str(event["_id"])
+                event["user_id"] = str(event["user_id"]) if event.get("user_id") else None
+                event["attendees_count"] = event.get("attendees_count", 0)
+                event["likes_count"] = event.get("likes_count", 0)
+                event["comments_count"] = event.get("comments_count", 0)
+                event["joined_at"] = attendance["created_at"]
+                attending_events.append(event)
             
-            return attending_events
+            return {
+                "events": attending_events,
+                "next_cursor": _encode_keyset_cursor(attendances[-1]) if len(attendances) == limit else None
+            }
             
         except Exception as e:
             print(f"Error getting user attending events: {e}")
-            return []
+            return {"events": [], "next_cursor": None}
     
     @staticmethod
     def update_event(event_id, user_id, **kwargs):
@@ -539,87 +588,19 @@ class Event:
                 return {"error": "No valid fields to update"}
             
             # Update the event
-            try:
-                db.events.update_one(
-                    {"_id": ObjectId(event_id)},
-                    {"$set": update_doc}
-                )
-            except:
-                db.events.update_one(
-                    {"_id": event_id},
-                    {"$set": update_doc}
-                )
+            db.events.update_one(
+                {"_id": canonical_id(event_id)},
+                {"$set": update_doc}
+            )
+            
+            Event.sync_upcoming_events_view(event_id)
+            
+            # Keep the linked map waypoint expiring relative to the new time
+            if "event_datetime" in update_doc:
+                Waypoint.update_event_waypoint_expiry(event_id, update_doc["event_datetime"])
             
             return {"message": "Event updated successfully"}
             
         except Exception as e:
             print(f"Error updating event: {e}")
             return {"error": str(e)}
-    
-    @staticmethod
-    def cancel_event(event_id, user_id):
-        """Cancel an event and completely remove it from database along with thread posts"""
-        db = current_app.config["DB"]
-        
-        try:
-            # Check if event exists and user is the creator
-            event = Event.get_event_by_id(event_id)
-            if not event:
-                return {"error": "Event not found"}
-            
-            if event["user_id"] != user_id:
-                return {"error": "You can only cancel your own events"}
-            
-            # Get all post IDs for this event before deletion
-            post_ids = []
-            posts_cursor = db.event_threads.find({"event_id": event_id}, {"_id": 1})
-            for post in posts_cursor:
-                post_ids.append(str(post["_id"]))
-            
-            # Delete all thread likes for these posts first
-            likes_deleted = 0
-            if post_ids:
-                likes_result = db.thread_likes.delete_many({"post_id": {"$in": post_ids}})
-                likes_deleted = likes_result.deleted_count
-                print(f"Deleted {likes_deleted} thread likes for event {event_id}")
-            
-            # Delete all thread posts for this event
-            posts_result = db.event_threads.delete_many({"event_id": event_id})
-            posts_deleted = posts_result.deleted_count
-            print(f"Deleted {posts_deleted} thread posts for event {event_id}")
-            
-            # Delete all attendances for this event
-            attendances_result = db.attendances.delete_many({"event_id": event_id})
-            attendances_deleted = attendances_result.deleted_count
-            print(f"Deleted {attendances_deleted} attendances for event {event_id}")
-            
-            # Delete all event likes
-            event_likes_result = db.likes.delete_many({"post_id": event_id, "type": "event"})
-            event_likes_deleted = event_likes_result.deleted_count
-            print(f"Deleted {event_likes_deleted} event likes for event {event_id}")
-            
-            # Finally, DELETE the event itself from the database
-            try:
-                event_result = db.events.delete_one({"_id": ObjectId(event_id)})
-            except:
-                event_result = db.events.delete_one({"_id": event_id})
-            
-            event_deleted = event_result.deleted_count
-            print(f"Deleted event {event_id} from database")
-            
-            return {
-                "message": "Event and all associated data permanently deleted from database",
-                "deleted_counts": {
-                    "event": event_deleted,
-                    "posts": posts_deleted,
-                    "thread_likes": likes_deleted,
-                    "attendances": attendances_deleted,
-                    "event_likes": event_likes_deleted
-                }
-            }
-            
-        except Exception as e:
-            print(f"Error deleting event: {e}")
-            import traceback
-            traceback.print_exc()
-            return {"error": str(e)}
\ No newline at end of file
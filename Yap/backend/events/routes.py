@@ -3,10 +3,14 @@ from werkzeug.utils import secure_filename
 import os
 import uuid
 from events.models import Event
+from events.cancellation import EventCancellation
+from events.friends_cache import friends_attending_cache
 from eventthreads.models import EventThread
+from eventthreads.socket_handlers import remove_from_event_thread
 from auth.service import token_required
-from datetime import datetime, timedelta
-from waypoint.models import Waypoint
+from datetime import datetime
+from waypoint.models import Waypoint, EVENT_WAYPOINT_GRACE_PERIOD
+from shared.ids import to_object_ids
 import boto3
 from botocore.exceptions import ClientError
 
@@ -84,10 +88,9 @@ def create_event_with_waypoint(current_user):
         waypoint_created = False
         if data.get('latitude') and data.get('longitude'):
             try:
-                # Calculate waypoint expiration (2 hours after event ends)
-                expires_at = event_datetime + timedelta(hours=2)
+                # Waypoint expires 2 hours after the event starts (removed by the TTL index)
+                expires_at = event_datetime + EVENT_WAYPOINT_GRACE_PERIOD
                 
-                # Create enhanced waypoint description with structured format for easy parsing
                 waypoint_description = f"Event on {data['event_date']} at {data['event_time']}\n\n{data['description']}"
                 
                 # Create waypoint with event prefix
@@ -99,7 +102,8 @@ def create_event_with_waypoint(current_user):
                     waypoint_type='event',
                     latitude=float(data['latitude']),
                     longitude=float(data['longitude']),
-                    expires_at=expires_at  # Waypoint will auto-expire 2 hours after event
+                    expires_at=expires_at,
+                    event_id=event_doc["_id"]
                 )
                 
                 waypoint_created = True
@@ -137,28 +141,12 @@ def get_events_feed():
         
         print(f"Retrieved {len(events)} events from database")
         
-        # Debug: Check database directly
-        db = current_app.config["DB"]
-        total_events_in_db = db.events.count_documents({})
-        active_events_in_db = db.events.count_documents({"is_active": True})
-        future_events_in_db = db.events.count_documents({
-            "is_active": True,
-            "event_datetime": {"$gte": datetime.utcnow()}
-        }) if not include_past else active_events_in_db
-        
-        print(f"Database stats: total={total_events_in_db}, active={active_events_in_db}, future={future_events_in_db}")
-        
         return jsonify({
             "events": events,
             "page": page,
             "limit": limit,
             "total_events": len(events),
-            "include_past": include_past,
-            "debug_info": {
-                "total_in_db": total_events_in_db,
-                "active_in_db": active_events_in_db,
-                "future_in_db": future_events_in_db
-            }
+            "include_past": include_past
         }), 200
         
     except Exception as e:
@@ -307,6 +295,7 @@ def attend_event(current_user, event_id):
                 result["join_notification_created"] = False
                 
         elif result.get("attending") == False:  # User just left
+            remove_from_event_thread(event_id, current_user['_id'])
             try:
                 print(f"User {current_user['username']} left event {event_id}, creating leave notification...")
                 
@@ -354,15 +343,20 @@ def get_event_attendees(event_id):
         limit = int(request.args.get('limit', 50))
         skip = (page - 1) * limit
         
-        attendees = Event.get_event_attendees(event_id, limit=limit, skip=skip)
+        cursor = request.args.get('cursor')
+        
+        result = Event.get_event_attendees(event_id, limit=limit, skip=skip, cursor=cursor)
         
         return jsonify({
-            "attendees": attendees,
+            "attendees": result["attendees"],
             "page": page,
             "limit": limit,
-            "total_attendees": len(attendees)
+            "total_attendees": len(result["attendees"]),
+            "next_cursor": result["next_cursor"]
         }), 200
         
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         return jsonify({"error": "Failed to fetch attendees"}), 500
 
@@ -376,20 +370,24 @@ def get_my_attending_events(current_user):
         include_past = request.args.get('include_past', 'false').lower() == 'true'
         skip = (page - 1) * limit
         
-        attending_events = Event.get_user_attending_events(
+        result = Event.get_user_attending_events(
             current_user['_id'], 
             limit=limit, 
             skip=skip, 
-            include_past=include_past
+            include_past=include_past,
+            cursor=request.args.get('cursor')
         )
         
         return jsonify({
-            "events": attending_events,
+            "events": result["events"],
             "page": page,
             "limit": limit,
-            "include_past": include_past
+            "include_past": include_past,
+            "next_cursor": result["next_cursor"]
         }), 200
         
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         print(f"Error fetching attending events: {e}")
         return jsonify({"error": "Failed to fetch attending events"}), 500
@@ -409,15 +407,17 @@ def get_user_attending_events_route(user_id):
         if not target_user:
             return jsonify({"error": "User not found"}), 404
         
-        attending_events = Event.get_user_attending_events(
+        result = Event.get_user_attending_events(
             user_id, 
             limit=limit, 
             skip=skip, 
-            include_past=include_past
+            include_past=include_past,
+            cursor=request.args.get('cursor')
         )
         
         return jsonify({
-            "events": attending_events,
+            "events": result["events"],
+            "next_cursor": result["next_cursor"],
             "user": {
                 "_id": target_user["_id"],
                 "username": target_user["username"]
@@ -427,6 +427,8 @@ def get_user_attending_events_route(user_id):
             "include_past": include_past
         }), 200
         
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         return jsonify({"error": "Failed to fetch user attending events"}), 500
 
@@ -525,9 +527,9 @@ def update_event(current_user, event_id):
 @events_bp.route('/<event_id>/cancel', methods=['POST'])
 @token_required
 def cancel_event(current_user, event_id):
-    """Cancel an event and clean up S3 images"""
+    """Cancel an event; its data and S3 images are cleaned up in the background"""
     try:
-        # Get the event first to check ownership and get image URL
+        # Get the event first to check ownership
         event = Event.get_event_by_id(event_id)
         if not event:
             return jsonify({"error": "Event not found"}), 404
@@ -536,42 +538,38 @@ def cancel_event(current_user, event_id):
         if event["user_id"] != current_user['_id']:
             return jsonify({"error": "You can only cancel your own events"}), 403
         
-        # Delete from database first
-        result = Event.cancel_event(event_id, current_user['_id'])
+        result = EventCancellation.start(event, current_user['_id'])
         
         if "error" in result:
             return jsonify({"error": result["error"]}), 400
         
-        # If database deletion successful, clean up S3 image
-        if result.get("message") and event.get("image"):
-            s3_config = current_app.config.get("S3_CONFIG", {})
-            public_bucket = s3_config.get('public_bucket')
-            
-            if public_bucket and event["image"].startswith(f"https://{public_bucket}.s3."):
-                try:
-                    s3_client = get_s3_client()
-                    
-                    # Extract S3 key from URL
-                    # URL format: https://bucket.s3.region.amazonaws.com/event_images/filename.jpg
-                    s3_key = '/'.join(event["image"].split('/')[-2:])  # event_images/filename.jpg
-                    
-                    try:
-                        s3_client.delete_object(Bucket=public_bucket, Key=s3_key)
-                        print(f"Deleted S3 object: {s3_key}")
-                    except ClientError as e:
-                        print(f"Error deleting S3 object {s3_key}: {e}")
-                        # Don't fail the entire operation if S3 cleanup fails
-                        
-                except Exception as e:
-                    print(f"Error during S3 cleanup: {e}")
-                    # Don't fail the operation since the event is already deleted from DB
-        
-        return jsonify(result), 200
+        return jsonify({
+            "message": "Event cancelled, associated data is being deleted",
+            "cancellation": result
+        }), 202
         
     except Exception as e:
         print(f"Error cancelling event: {e}")
         return jsonify({"error": "Failed to cancel event"}), 500
 
+@events_bp.route('/<event_id>/cancellation', methods=['GET'])
+@token_required
+def get_cancellation_status(current_user, event_id):
+    """Get the progress of an event's cancellation cleanup"""
+    try:
+        status = EventCancellation.get_status(event_id)
+        if not status:
+            return jsonify({"error": "Event has not been cancelled"}), 404
+        
+        if status["user_id"] != current_user['_id']:
+            return jsonify({"error": "You can only view your own event's cancellation"}), 403
+        
+        return jsonify(status), 200
+        
+    except Exception as e:
+        print(f"Error getting cancellation status: {e}")
+        return jsonify({"error": "Failed to get cancellation status"}), 500
+
 @events_bp.route('/<event_id>/details', methods=['GET'])
 @token_required
 def get_event_details(current_user, event_id):
@@ -590,50 +588,25 @@ def get_event_details(current_user, event_id):
         is_liked = Event.check_user_liked_event(event_id, current_user['_id'])
         
         # Get attending friends (users the current user follows who are attending)
+        # from the cached following/attendee sets, then load just their profiles
         db = current_app.config["DB"]
+        friend_ids = friends_attending_cache.get_friends_attending(current_user['_id'], event_id)
         
-        # Get current user's following list
-        following_pipeline = [
-            {"$match": {"follower_id": current_user['_id']}},
-            {"$project": {"following_id": 1}}
-        ]
-        following = list(db.follows.aggregate(following_pipeline))
-        following_ids = [f["following_id"] for f in following]
-        
-        # Get attendees who are in the following list
         attending_friends = []
-        if following_ids:
-            attending_friends_pipeline = [
-                {"$match": {"event_id": event_id, "user_id": {"$in": following_ids}}},
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "let": {"user_id": {"$toObjectId": "$user_id"}},
-                        "pipeline": [
-                            {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                        ],
-                        "as": "user_info"
-                    }
-                },
-                {"$unwind": "$user_info"},
-                {
-                    "$project": {
-                        "_id": "$user_info._id",
-                        "username": "$user_info.username",
-                        "full_name": "$user_info.full_name",
-                        "profile_picture": "$user_info.profile_picture"
-                    }
-                }
-            ]
-            
+        if friend_ids:
             try:
-                attending_friends = list(db.attendances.aggregate(attending_friends_pipeline))
+                attending_friends = list(db.users.find(
+                    {"_id": {"$in": to_object_ids(friend_ids)}},
+                    {"username": 1, "full_name": 1, "profile_picture": 1}
+                ))
+                for friend in attending_friends:
+                    friend["_id"] = str(friend["_id"])
             except Exception as e:
                 print(f"Error getting attending friends: {e}")
                 attending_friends = []
         
-        # Get total attendees count
-        total_attendees = db.attendances.count_documents({"event_id": event_id})
+        # Get total attendees count (kept on the event by attend/unattend)
+        total_attendees = event.get("attendees_count", 0)
         
         return jsonify({
             "event": event,
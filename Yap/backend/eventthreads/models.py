@@ -1,11 +1,28 @@
 from datetime import datetime
-from bson import ObjectId
 from flask import current_app
+from pymongo import ReturnDocument
+from shared.ids import canonical_id, lookup_by_ref
+from events.friends_cache import friends_attending_cache
+from eventthreads.stats import ThreadStats
+from eventthreads.socket_handlers import broadcast_thread_delta
 import os
 from werkzeug.utils import secure_filename
 import uuid
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+
+# Thread image upload tuning
+THREAD_IMAGE_UPLOAD_WORKERS = 4  # Matches the 4-images-per-post limit
+THREAD_IMAGE_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=5 * 1024 * 1024,  # Use multipart for files over 5MB
+    multipart_chunksize=5 * 1024 * 1024,
+    max_concurrency=4
+)
+S3_DELETE_BATCH_SIZE = 1000  # delete_objects accepts at most 1000 keys per call
+
+REPLY_PREVIEW_LIMIT = 10  # Replies embedded under each post on a thread page
 
 def get_s3_client():
     """Get S3 client with proper configuration"""
@@ -31,10 +48,10 @@ def get_s3_bucket_config():
             'private_bucket': os.getenv('AWS_S3_PRIVATE_BUCKET', 'yapptmu-private')
         }
 
-def generate_presigned_url(s3_key, bucket_name, expires_in_hours=2):
+def generate_presigned_url(s3_key, bucket_name, expires_in_hours=2, s3_client=None):
     """Generate a pre-signed URL for private S3 object"""
     try:
-        s3_client = get_s3_client()
+        s3_client = s3_client or get_s3_client()
         presigned_url = s3_client.generate_presigned_url(
             'get_object',
             Params={'Bucket': bucket_name, 'Key': s3_key},
@@ -45,6 +62,33 @@ def generate_presigned_url(s3_key, bucket_name, expires_in_hours=2):
         print(f"Error generating presigned URL for {s3_key}: {e}")
         return None
 
+def delete_s3_objects(s3_keys, bucket_name, s3_client=None):
+    """Delete S3 objects in batches of up to 1000 keys, returns number deleted"""
+    if not s3_keys or not bucket_name:
+        return 0
+    
+    s3_client = s3_client or get_s3_client()
+    deleted_count = 0
+    
+    for i in range(0, len(s3_keys), S3_DELETE_BATCH_SIZE):
+        batch = s3_keys[i:i + S3_DELETE_BATCH_SIZE]
+        try:
+            response = s3_client.delete_objects(
+                Bucket=bucket_name,
+                Delete={
+                    'Objects': [{'Key': key} for key in batch],
+                    'Quiet': True
+                }
+            )
+            errors = response.get('Errors', [])
+            for error in errors:
+                print(f"Error deleting S3 object {error.get('Key')}: {error.get('Message')}")
+            deleted_count += len(batch) - len(errors)
+        except ClientError as e:
+            print(f"Error deleting S3 batch of {len(batch)} objects: {e}")
+    
+    return deleted_count
+
 class EventThread:
     @staticmethod
     def create_join_notification(event_id, user_id, username):
@@ -54,10 +98,7 @@ class EventThread:
         print(f"Creating join notification: event_id={event_id}, user_id={user_id}, username={username}")
         
         # Verify event exists and is active
-        try:
-            event = db.events.find_one({"_id": ObjectId(event_id), "is_active": True})
-        except:
-            event = db.events.find_one({"_id": event_id, "is_active": True})
+        event = db.events.find_one({"_id": canonical_id(event_id), "is_active": True})
         
         if not event:
             print(f"Event {event_id} not found or not active")
@@ -81,7 +122,9 @@ class EventThread:
         
         try:
             result = db.event_threads.insert_one(join_notification)
+            ThreadStats.record_post(join_notification)
             join_notification["_id"] = str(result.inserted_id)
+            broadcast_thread_delta(event_id, "created", join_notification)
             return join_notification
         except Exception as e:
             print(f"ERROR inserting join notification: {e}")
@@ -110,15 +153,21 @@ class EventThread:
         
         try:
             result = db.event_threads.insert_one(leave_notification)
+            ThreadStats.record_post(leave_notification)
             leave_notification["_id"] = str(result.inserted_id)
+            broadcast_thread_delta(event_id, "created", leave_notification)
             return leave_notification
         except Exception as e:
             print(f"ERROR inserting leave notification: {e}")
             return None
 
     @staticmethod
-    def upload_thread_image_to_s3(file, event_id, user_id):
-        """Upload thread image to S3 private bucket"""
+    def upload_thread_image_to_s3(file, event_id, user_id, private_bucket=None, s3_client=None):
+        """Upload thread image to S3 private bucket
+        
+        private_bucket and s3_client can be passed in so this can run on a worker
+        thread outside the Flask app context.
+        """
         try:
             if not file or file.filename == '':
                 return None
@@ -143,15 +192,16 @@ class EventThread:
             unique_filename = f"thread_{event_id}_{user_id}_{uuid.uuid4().hex}.{file_extension}"
             
             # Get S3 configuration from app config (consistent with posts)
-            s3_config = current_app.config.get("S3_CONFIG", {})
-            private_bucket = s3_config.get('private_bucket')
+            if private_bucket is None:
+                s3_config = current_app.config.get("S3_CONFIG", {})
+                private_bucket = s3_config.get('private_bucket')
             
             if not private_bucket:
                 raise ValueError("S3 private bucket configuration not found")
             
             # Upload to S3 PRIVATE bucket
             try:
-                s3_client = get_s3_client()
+                s3_client = s3_client or get_s3_client()
                 s3_key = f"event_threads/{event_id}/{unique_filename}"
                 
                 s3_client.upload_fileobj(
@@ -168,7 +218,8 @@ class EventThread:
                             'upload_type': 'event_thread_image',
                             'upload_time': datetime.utcnow().isoformat()
                         }
-                    }
+                    },
+                    Config=THREAD_IMAGE_TRANSFER_CONFIG
                 )
                 
                 print(f"Successfully uploaded to S3: {s3_key}")
@@ -182,6 +233,53 @@ class EventThread:
             print(f"Error uploading thread image: {e}")
             raise e
 
+    @staticmethod
+    def upload_thread_images_to_s3(image_files, event_id, user_id):
+        """Upload several thread images concurrently, returns S3 keys in input order
+        
+        If any upload fails, the ones that succeeded are removed with a single
+        batched delete before the error is re-raised.
+        """
+        image_files = [f for f in image_files if f and f.filename]  # Skip empty files
+        if not image_files:
+            return []
+        
+        s3_config = current_app.config.get("S3_CONFIG", {})
+        private_bucket = s3_config.get('private_bucket')
+        
+        if not private_bucket:
+            raise ValueError("S3 private bucket configuration not found")
+        
+        # boto3 clients are thread-safe, so one client is shared by all workers
+        s3_client = get_s3_client()
+        max_workers = min(THREAD_IMAGE_UPLOAD_WORKERS, len(image_files))
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    EventThread.upload_thread_image_to_s3,
+                    image_file, event_id, user_id, private_bucket, s3_client
+                )
+                for image_file in image_files
+            ]
+        
+        uploaded_s3_keys = []
+        first_error = None
+        for future in futures:
+            try:
+                s3_key = future.result()
+                if s3_key:
+                    uploaded_s3_keys.append(s3_key)
+            except Exception as e:
+                first_error = first_error or e
+        
+        if first_error:
+            deleted = delete_s3_objects(uploaded_s3_keys, private_bucket, s3_client)
+            print(f"Cleaned up {deleted} S3 objects after upload error")
+            raise first_error
+        
+        return uploaded_s3_keys
+
     @staticmethod
     def create_thread_post(event_id, user_id, username, content, post_type='text', media_url=None, reply_to=None, image_files=None):
         """Create a new post in an event thread with S3 private images"""
@@ -190,20 +288,12 @@ class EventThread:
         print(f"Creating thread post: event_id={event_id}, user_id={user_id}, content='{content[:50] if content else 'No content'}...', post_type={post_type}")
         
         # Verify user is attending the event
-        attendance = db.attendances.find_one({
-            "event_id": event_id,
-            "user_id": user_id
-        })
-        
-        if not attendance:
+        if not friends_attending_cache.is_attending(event_id, user_id):
             print(f"User {user_id} is not attending event {event_id}")
             raise ValueError("You must be attending the event to post in its thread")
         
         # Verify event exists and is active
-        try:
-            event = db.events.find_one({"_id": ObjectId(event_id), "is_active": True})
-        except:
-            event = db.events.find_one({"_id": event_id, "is_active": True})
+        event = db.events.find_one({"_id": canonical_id(event_id), "is_active": True})
         
         if not event:
             print(f"Event {event_id} not found or not active")
@@ -217,11 +307,8 @@ class EventThread:
                 raise ValueError("Maximum 4 images allowed per post")
             
             try:
-                for image_file in image_files:
-                    if image_file and image_file.filename:  # Skip empty files
-                        s3_key = EventThread.upload_thread_image_to_s3(image_file, event_id, user_id)
-                        if s3_key:
-                            uploaded_s3_keys.append(s3_key)
+                # Uploads run in parallel and clean up after themselves on failure
+                uploaded_s3_keys = EventThread.upload_thread_images_to_s3(image_files, event_id, user_id)
                 
                 print(f"Successfully uploaded {len(uploaded_s3_keys)} images to S3: {uploaded_s3_keys}")
                 
@@ -230,19 +317,6 @@ class EventThread:
                         post_type = 'image'
                         
             except Exception as e:
-                # Clean up any uploaded S3 objects on error
-                s3_config = current_app.config.get("S3_CONFIG", {})
-                private_bucket = s3_config.get('private_bucket')
-                
-                if private_bucket:
-                    s3_client = get_s3_client()
-                    for s3_key in uploaded_s3_keys:
-                        try:
-                            s3_client.delete_object(Bucket=private_bucket, Key=s3_key)
-                            print(f"Cleaned up S3 object after error: {s3_key}")
-                        except Exception as cleanup_error:
-                            print(f"Error cleaning up S3 object {s3_key}: {cleanup_error}")
-                
                 print(f"Error uploading images: {e}")
                 raise ValueError(f"Failed to upload images: {str(e)}")
         
@@ -271,6 +345,7 @@ class EventThread:
         try:
             result = db.event_threads.insert_one(thread_post)
             print(f"Post inserted successfully with ID: {result.inserted_id}")
+            ThreadStats.record_post(thread_post)
                 
         except Exception as e:
             print(f"ERROR inserting post: {e}")
@@ -279,27 +354,16 @@ class EventThread:
             private_bucket = s3_config.get('private_bucket')
             
             if private_bucket:
-                s3_client = get_s3_client()
-                for s3_key in uploaded_s3_keys:
-                    try:
-                        s3_client.delete_object(Bucket=private_bucket, Key=s3_key)
-                        print(f"Cleaned up S3 object after DB error: {s3_key}")
-                    except Exception as cleanup_error:
-                        print(f"Error cleaning up S3 object: {cleanup_error}")
+                deleted = delete_s3_objects(uploaded_s3_keys, private_bucket)
+                print(f"Cleaned up {deleted} S3 objects after DB error")
             raise e
         
         # If this is a reply, increment the parent post's reply count
         if reply_to:
-            try:
-                db.event_threads.update_one(
-                    {"_id": ObjectId(reply_to)},
-                    {"$inc": {"replies_count": 1}}
-                )
-            except:
-                db.event_threads.update_one(
-                    {"_id": reply_to},
-                    {"$inc": {"replies_count": 1}}
-                )
+            db.event_threads.update_one(
+                {"_id": canonical_id(reply_to)},
+                {"$inc": {"replies_count": 1}}
+            )
         
         # Return the created post with its ID and secure URLs
         thread_post["_id"] = str(result.inserted_id)
@@ -321,103 +385,121 @@ class EventThread:
         else:
             thread_post["secure_image_urls"] = []
         
+        broadcast_thread_delta(event_id, "created", thread_post)
         return thread_post
 
+    @staticmethod
+    def _post_view_stages(user_id, extra_fields=None):
+        """Pipeline stages that join a thread post with its author and the viewer's like"""
+        projection = {
+            "_id": {"$toString": "$_id"},
+            "event_id": 1,
+            "user_id": {"$toString": "$user_id"},
+            "username": {"$ifNull": ["$user_info.username", "$username", "Unknown User"]},
+            "content": 1,
+            "post_type": {"$ifNull": ["$post_type", "text"]},
+            "reply_to": 1,
+            "s3_keys": {"$ifNull": ["$s3_keys", []]},
+            "created_at": 1,
+            "updated_at": {"$ifNull": ["$updated_at", "$created_at"]},
+            "likes_count": {"$ifNull": ["$likes_count", 0]},
+            "replies_count": {"$ifNull": ["$replies_count", 0]},
+            "is_liked_by_user": {"$gt": [{"$size": "$viewer_like"}, 0]},
+            "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]},
+            "user_full_name": {"$ifNull": ["$user_info.full_name", None]}
+        }
+        projection.update(extra_fields or {})
+        
+        return [
+            {
+                "$lookup": {
+                    "from": "thread_likes",
+                    "let": {"post_id": {"$toString": "$_id"}},
+                    "pipeline": [
+                        {"$match": {"user_id": user_id, "$expr": {"$eq": ["$post_id", "$$post_id"]}}},
+                        {"$limit": 1},
+                        {"$project": {"_id": 1}}
+                    ],
+                    "as": "viewer_like"
+                }
+            },
+            # Thread posts still store user_id as a string
+            lookup_by_ref("users", "user_id", "user_info", legacy_strings=True),
+            {
+                "$unwind": {
+                    "path": "$user_info",
+                    "preserveNullAndEmptyArrays": True
+                }
+            },
+            {"$project": projection}
+        ]
+    
+    @staticmethod
+    def _attach_secure_urls(posts, private_bucket, s3_client=None):
+        """Swap s3_keys for pre-signed URLs on posts and their replies (signing is local, no S3 round trip)"""
+        if private_bucket and s3_client is None:
+            s3_client = get_s3_client()
+        
+        for post in posts:
+            s3_keys = post.pop("s3_keys", [])
+            post["secure_image_urls"] = []
+            if private_bucket:
+                for s3_key in s3_keys:
+                    secure_url = generate_presigned_url(s3_key, private_bucket, expires_in_hours=2, s3_client=s3_client)
+                    if secure_url:
+                        post["secure_image_urls"].append(secure_url)
+            
+            if post.get("replies"):
+                EventThread._attach_secure_urls(post["replies"], private_bucket, s3_client)
+    
     @staticmethod
     def get_thread_posts_with_secure_urls(event_id, user_id, limit=50, skip=0, sort_by="created_at", sort_order=-1):
-        """Get posts from an event thread with secure pre-signed URLs"""
-        db = current_app.config["DB"]
+        """Get a page of thread posts with secure pre-signed URLs
         
-        print(f"Getting thread posts: event_id={event_id}, user_id={user_id}")
+        Posts, their first REPLY_PREVIEW_LIMIT replies, authors and the
+        viewer's like flags all come back from one aggregation, so a page
+        costs the same number of queries however many posts it holds.
+        """
+        db = current_app.config["DB"]
         
         # Verify user is attending the event
-        attendance = db.attendances.find_one({
-            "event_id": event_id,
-            "user_id": user_id
-        })
-        
-        if not attendance:
+        if not friends_attending_cache.is_attending(event_id, user_id):
             print(f"User {user_id} is not attending event {event_id}")
             return {"error": "You must be attending the event to view its thread"}
         
         try:
-            # Get all posts including join notifications
-            posts_cursor = db.event_threads.find({
-                "event_id": event_id,
-                "is_deleted": False,
-                "reply_to": None  # Only top-level posts
-            }).sort(sort_by, sort_order).skip(skip).limit(limit)
+            pipeline = [
+                {
+                    "$match": {
+                        "event_id": event_id,
+                        "is_deleted": False,
+                        "reply_to": None  # Only top-level posts
+                    }
+                },
+                {"$sort": {sort_by: sort_order, "_id": sort_order}},
+                {"$skip": skip},
+                {"$limit": limit},
+                {
+                    "$lookup": {
+                        "from": "event_threads",
+                        "let": {"post_id": {"$toString": "$_id"}},
+                        "pipeline": [
+                            {"$match": {"is_deleted": False, "$expr": {"$eq": ["$reply_to", "$$post_id"]}}},
+                            {"$sort": {"created_at": 1}},
+                            {"$limit": REPLY_PREVIEW_LIMIT},
+                            *EventThread._post_view_stages(user_id)
+                        ],
+                        "as": "replies"
+                    }
+                },
+                *EventThread._post_view_stages(user_id, extra_fields={"replies": 1})
+            ]
             
-            posts = []
-            s3_config = current_app.config.get("S3_CONFIG", {})
-            private_bucket = s3_config.get('private_bucket')
+            posts = list(db.event_threads.aggregate(pipeline))
             
-            for post in posts_cursor:
-                # Convert to expected format
-                formatted_post = {
-                    "_id": str(post["_id"]),
-                    "event_id": post["event_id"],
-                    "user_id": str(post["user_id"]) if post.get("user_id") else None,
-                    "username": post.get("username", "Unknown User"),
-                    "content": post["content"],
-                    "post_type": post.get("post_type", "text"),
-                    "created_at": post["created_at"],
-                    "updated_at": post.get("updated_at", post["created_at"]),
-                    "likes_count": post.get("likes_count", 0),
-                    "replies_count": post.get("replies_count", 0),
-                    "is_liked_by_user": False,
-                    "profile_picture": None,
-                    "user_full_name": None,
-                    "replies": [],
-                    "secure_image_urls": []  # Will contain pre-signed URLs
-                }
-                
-                # Generate secure URLs for images
-                if post.get("s3_keys") and private_bucket:
-                    for s3_key in post["s3_keys"]:
-                        secure_url = generate_presigned_url(s3_key, private_bucket, expires_in_hours=2)
-                        if secure_url:
-                            formatted_post["secure_image_urls"].append(secure_url)
-                
-                # For join notifications, don't check likes or allow replies
-                if post.get("post_type") not in ["join_notification", "leave_notification"]:
-                    # Check if user liked this post
-                    try:
-                        user_like = db.thread_likes.find_one({
-                            "post_id": formatted_post["_id"],
-                            "user_id": user_id
-                        })
-                        formatted_post["is_liked_by_user"] = user_like is not None
-                    except Exception as e:
-                        print(f"Error checking like status: {e}")
-                    
-                    # Get replies for this post (with secure URLs)
-                    try:
-                        replies = EventThread.get_post_replies_with_secure_urls(formatted_post["_id"], user_id, limit=10)
-                        formatted_post["replies"] = replies if isinstance(replies, list) else []
-                    except Exception as e:
-                        print(f"Error getting replies: {e}")
-                        formatted_post["replies"] = []
-                
-                # Get user info
-                try:
-                    from bson import ObjectId
-                    try:
-                        user_object_id = ObjectId(formatted_post["user_id"])
-                        user_info = db.users.find_one({"_id": user_object_id})
-                    except:
-                        user_info = db.users.find_one({"_id": formatted_post["user_id"]})
-                    
-                    if user_info:
-                        formatted_post["username"] = user_info.get("username", formatted_post["username"])
-                        formatted_post["profile_picture"] = user_info.get("profile_picture")
-                        formatted_post["user_full_name"] = user_info.get("full_name")
-                except Exception as e:
-                    print(f"Error getting user info: {e}")
-                
-                posts.append(formatted_post)
+            private_bucket = current_app.config.get("S3_CONFIG", {}).get('private_bucket')
+            EventThread._attach_secure_urls(posts, private_bucket)
             
-            print(f"Successfully retrieved {len(posts)} posts with secure URLs")
             return posts
             
         except Exception as e:
@@ -432,57 +514,18 @@ class EventThread:
         db = current_app.config["DB"]
         
         try:
-            replies_cursor = db.event_threads.find({
-                "reply_to": post_id,
-                "is_deleted": False
-            }).sort("created_at", 1).skip(skip).limit(limit)
+            pipeline = [
+                {"$match": {"reply_to": post_id, "is_deleted": False}},
+                {"$sort": {"created_at": 1}},
+                {"$skip": skip},
+                {"$limit": limit},
+                *EventThread._post_view_stages(user_id)
+            ]
             
-            replies = []
-            s3_config = current_app.config.get("S3_CONFIG", {})
-            private_bucket = s3_config.get('private_bucket')
+            replies = list(db.event_threads.aggregate(pipeline))
             
-            for reply in replies_cursor:
-                # Convert ObjectId to string
-                reply["_id"] = str(reply["_id"])
-                reply["user_id"] = str(reply["user_id"]) if reply.get("user_id") else None
-                
-                # Set default values
-                reply["likes_count"] = reply.get("likes_count", 0)
-                reply["is_liked_by_user"] = False
-                reply["profile_picture"] = None
-                reply["user_full_name"] = None
-                reply["secure_image_urls"] = []
-                
-                # Generate secure URLs for reply images
-                if reply.get("s3_keys") and private_bucket:
-                    for s3_key in reply["s3_keys"]:
-                        secure_url = generate_presigned_url(s3_key, private_bucket, expires_in_hours=2)
-                        if secure_url:
-                            reply["secure_image_urls"].append(secure_url)
-                
-                # Check if user liked this reply
-                try:
-                    user_like = db.thread_likes.find_one({
-                        "post_id": reply["_id"],
-                        "user_id": user_id
-                    })
-                    reply["is_liked_by_user"] = user_like is not None
-                except Exception as like_error:
-                    print(f"Error checking reply like status: {like_error}")
-                
-                # Get user info
-                try:
-                    if reply["user_id"]:
-                        from bson import ObjectId
-                        user_info = db.users.find_one({"_id": ObjectId(reply["user_id"])})
-                        if user_info:
-                            reply["profile_picture"] = user_info.get("profile_picture")
-                            reply["user_full_name"] = user_info.get("full_name")
-                            reply["username"] = user_info.get("username", reply.get("username"))
-                except Exception as user_error:
-                    print(f"Error getting reply user info: {user_error}")
-                
-                replies.append(reply)
+            private_bucket = current_app.config.get("S3_CONFIG", {}).get('private_bucket')
+            EventThread._attach_secure_urls(replies, private_bucket)
             
             return replies
             
@@ -497,10 +540,7 @@ class EventThread:
         
         try:
             # Check if this is a join notification (can't be liked)
-            try:
-                post = db.event_threads.find_one({"_id": ObjectId(post_id)})
-            except:
-                post = db.event_threads.find_one({"_id": post_id})
+            post = db.event_threads.find_one({"_id": canonical_id(post_id)})
             
             if not post:
                 return {"error": "Post not found"}
@@ -519,17 +559,15 @@ class EventThread:
                 db.thread_likes.delete_one({"_id": existing_like["_id"]})
                 
                 # Update post like count
-                try:
-                    db.event_threads.update_one(
-                        {"_id": ObjectId(post_id)},
-                        {"$inc": {"likes_count": -1}}
-                    )
-                except:
-                    db.event_threads.update_one(
-                        {"_id": post_id},
-                        {"$inc": {"likes_count": -1}}
-                    )
+                updated = db.event_threads.find_one_and_update(
+                    {"_id": canonical_id(post_id)},
+                    {"$inc": {"likes_count": -1}},
+                    projection={"likes_count": 1},
+                    return_document=ReturnDocument.AFTER
+                )
                 
+                if updated:
+                    broadcast_thread_delta(post["event_id"], "liked", updated)
                 return {"liked": False, "message": "Post unliked"}
             else:
                 # Like - add like and increment count
@@ -541,17 +579,15 @@ class EventThread:
                 db.thread_likes.insert_one(like_doc)
                 
                 # Update post like count
-                try:
-                    db.event_threads.update_one(
-                        {"_id": ObjectId(post_id)},
-                        {"$inc": {"likes_count": 1}}
-                    )
-                except:
-                    db.event_threads.update_one(
-                        {"_id": post_id},
-                        {"$inc": {"likes_count": 1}}
-                    )
+                updated = db.event_threads.find_one_and_update(
+                    {"_id": canonical_id(post_id)},
+                    {"$inc": {"likes_count": 1}},
+                    projection={"likes_count": 1},
+                    return_document=ReturnDocument.AFTER
+                )
                 
+                if updated:
+                    broadcast_thread_delta(post["event_id"], "liked", updated)
                 return {"liked": True, "message": "Post liked"}
                 
         except Exception as e:
@@ -565,10 +601,7 @@ class EventThread:
         
         try:
             # Get the post
-            try:
-                post = db.event_threads.find_one({"_id": ObjectId(post_id)})
-            except:
-                post = db.event_threads.find_one({"_id": post_id})
+            post = db.event_threads.find_one({"_id": canonical_id(post_id)})
             
             if not post:
                 return {"error": "Post not found"}
@@ -581,17 +614,15 @@ class EventThread:
             if post["user_id"] != user_id:
                 return {"error": "You can only delete your own posts"}
             
-            # Mark as deleted in database first
-            try:
-                db.event_threads.update_one(
-                    {"_id": ObjectId(post_id)},
-                    {"$set": {"is_deleted": True, "updated_at": datetime.utcnow()}}
-                )
-            except:
-                db.event_threads.update_one(
-                    {"_id": post_id},
-                    {"$set": {"is_deleted": True, "updated_at": datetime.utcnow()}}
-                )
+            # Mark as deleted in database first; only the request that flips
+            # the flag adjusts the counts, so a repeated delete is harmless
+            result = db.event_threads.update_one(
+                {"_id": canonical_id(post_id), "is_deleted": False},
+                {"$set": {"is_deleted": True, "updated_at": datetime.utcnow()}}
+            )
+            if result.modified_count == 0:
+                return {"message": "Post deleted successfully"}
+            ThreadStats.record_delete(post)
             
             # Clean up S3 images if they exist
             if post.get("s3_keys"):
@@ -616,17 +647,12 @@ class EventThread:
             
             # If this post has a parent, decrement its reply count
             if post.get("reply_to"):
-                try:
-                    db.event_threads.update_one(
-                        {"_id": ObjectId(post["reply_to"])},
-                        {"$inc": {"replies_count": -1}}
-                    )
-                except:
-                    db.event_threads.update_one(
-                        {"_id": post["reply_to"]},
-                        {"$inc": {"replies_count": -1}}
-                    )
+                db.event_threads.update_one(
+                    {"_id": canonical_id(post["reply_to"])},
+                    {"$inc": {"replies_count": -1}}
+                )
             
+            broadcast_thread_delta(post["event_id"], "deleted", {"_id": post["_id"], "reply_to": post.get("reply_to")})
             return {"message": "Post deleted successfully"}
             
         except Exception as e:
@@ -639,20 +665,12 @@ class EventThread:
         db = current_app.config["DB"]
         
         # Verify user is attending the event
-        attendance = db.attendances.find_one({
-            "event_id": event_id,
-            "user_id": user_id
-        })
-        
-        if not attendance:
+        if not friends_attending_cache.is_attending(event_id, user_id):
             return {"error": "You must be attending the event to view its thread"}
         
         try:
             # Get event info
-            try:
-                event = db.events.find_one({"_id": ObjectId(event_id)})
-            except:
-                event = db.events.find_one({"_id": event_id})
+            event = db.events.find_one({"_id": canonical_id(event_id)})
             
             if not event:
                 return {"error": "Event not found"}
@@ -692,10 +710,7 @@ class EventThread:
         
         try:
             # Get the post
-            try:
-                post = db.event_threads.find_one({"_id": ObjectId(post_id)})
-            except:
-                post = db.event_threads.find_one({"_id": post_id})
+            post = db.event_threads.find_one({"_id": canonical_id(post_id)})
             
             if not post:
                 return {"error": "Post not found"}
@@ -713,27 +728,18 @@ class EventThread:
                 return {"error": "Cannot edit deleted posts"}
             
             # Update the post
-            try:
-                db.event_threads.update_one(
-                    {"_id": ObjectId(post_id)},
-                    {
-                        "$set": {
-                            "content": content,
-                            "updated_at": datetime.utcnow()
-                        }
+            updated_at = datetime.utcnow()
+            db.event_threads.update_one(
+                {"_id": canonical_id(post_id)},
+                {
+                    "$set": {
+                        "content": content,
+                        "updated_at": updated_at
                     }
-                )
-            except:
-                db.event_threads.update_one(
-                    {"_id": post_id},
-                    {
-                        "$set": {
-                            "content": content,
-                            "updated_at": datetime.utcnow()
-                        }
-                    }
-                )
+                }
+            )
             
+            broadcast_thread_delta(post["event_id"], "updated", {"_id": post["_id"], "content": content, "updated_at": updated_at})
             return {"message": "Post updated successfully"}
             
         except Exception as e:
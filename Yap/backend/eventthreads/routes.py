@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
 from eventthreads.models import EventThread, get_s3_client, get_s3_bucket_config
+from eventthreads.stats import ThreadStats
 from auth.service import token_required
-from datetime import datetime
+from shared.ids import canonical_id
+from events.friends_cache import friends_attending_cache
 import os
 from werkzeug.utils import secure_filename
 import uuid
@@ -128,11 +130,7 @@ def create_thread_post(current_user, event_id):
         # If it's a reply, validate the parent post exists
         if reply_to:
             db = current_app.config["DB"]
-            try:
-                from bson import ObjectId
-                parent_post = db.event_threads.find_one({"_id": ObjectId(reply_to)})
-            except:
-                parent_post = db.event_threads.find_one({"_id": reply_to})
+            parent_post = db.event_threads.find_one({"_id": canonical_id(reply_to)})
             
             if not parent_post:
                 return jsonify({"error": "Parent post not found"}), 404
@@ -197,13 +195,7 @@ def create_join_notification_manually(current_user, event_id):
         target_username = data.get('username', current_user['username'])
         
         # Verify the target user is actually attending
-        db = current_app.config["DB"]
-        attendance = db.attendances.find_one({
-            "event_id": event_id,
-            "user_id": target_user_id
-        })
-        
-        if not attendance:
+        if not friends_attending_cache.is_attending(event_id, target_user_id):
             return jsonify({"error": "User must be attending the event"}), 400
         
         # Create the join notification
@@ -303,11 +295,7 @@ def delete_thread_post(current_user, post_id):
     try:
         # Get the post first to access S3 keys
         db = current_app.config["DB"]
-        try:
-            from bson import ObjectId
-            post = db.event_threads.find_one({"_id": ObjectId(post_id)})
-        except:
-            post = db.event_threads.find_one({"_id": post_id})
+        post = db.event_threads.find_one({"_id": canonical_id(post_id)})
         
         if not post:
             return jsonify({"error": "Post not found"}), 404
@@ -356,12 +344,7 @@ def get_thread_attendees(current_user, event_id):
     try:
         # Verify user is attending the event
         db = current_app.config["DB"]
-        attendance = db.attendances.find_one({
-            "event_id": event_id,
-            "user_id": current_user['_id']
-        })
-        
-        if not attendance:
+        if not friends_attending_cache.is_attending(event_id, current_user['_id']):
             return jsonify({"error": "You must be attending the event to view thread participants"}), 403
         
         page = int(request.args.get('page', 1))
@@ -424,28 +407,31 @@ def debug_thread(current_user, event_id):
         db = current_app.config["DB"]
         
         # Check attendance
-        attendance = db.attendances.find_one({
-            "event_id": event_id,
-            "user_id": current_user['_id']
-        })
-        
-        if not attendance:
+        if not friends_attending_cache.is_attending(event_id, current_user['_id']):
             return jsonify({"error": "You must be attending this event to debug its thread"}), 403
         
-        # Get all posts for this event (including deleted)
-        all_posts = list(db.event_threads.find({"event_id": event_id}))
+        # Sample of posts for this event (including deleted)
+        sample_posts = list(db.event_threads.find({"event_id": event_id}).sort("created_at", -1).limit(10))
         
         # Convert ObjectIds to strings for JSON serialization
-        for post in all_posts:
+        for post in sample_posts:
             post["_id"] = str(post["_id"])
             if "user_id" in post:
                 post["user_id"] = str(post["user_id"])
         
-        # Get collection stats
-        total_posts = db.event_threads.count_documents({"event_id": event_id})
-        active_posts = db.event_threads.count_documents({"event_id": event_id, "is_deleted": False})
-        deleted_posts = db.event_threads.count_documents({"event_id": event_id, "is_deleted": True})
-        join_notifications = db.event_threads.count_documents({"event_id": event_id, "post_type": "join_notification"})
+        # Get collection stats in one pass
+        counts = next(db.event_threads.aggregate([
+            {"$match": {"event_id": event_id}},
+            {
+                "$group": {
+                    "_id": None,
+                    "total_posts": {"$sum": 1},
+                    "active_posts": {"$sum": {"$cond": [{"$eq": ["$is_deleted", False]}, 1, 0]}},
+                    "deleted_posts": {"$sum": {"$cond": [{"$eq": ["$is_deleted", True]}, 1, 0]}},
+                    "join_notifications": {"$sum": {"$cond": [{"$eq": ["$post_type", "join_notification"]}, 1, 0]}}
+                }
+            }
+        ]), {})
         
         # Get collections list
         collections = db.list_collection_names()
@@ -453,15 +439,15 @@ def debug_thread(current_user, event_id):
         return jsonify({
             "event_id": event_id,
             "user_id": current_user['_id'],
-            "attendance_found": attendance is not None,
+            "attendance_found": True,
             "collections": collections,
             "stats": {
-                "total_posts": total_posts,
-                "active_posts": active_posts,
-                "deleted_posts": deleted_posts,
-                "join_notifications": join_notifications
+                "total_posts": counts.get("total_posts", 0),
+                "active_posts": counts.get("active_posts", 0),
+                "deleted_posts": counts.get("deleted_posts", 0),
+                "join_notifications": counts.get("join_notifications", 0)
             },
-            "all_posts": all_posts[:10],  # Limit to first 10 posts
+            "all_posts": sample_posts,  # Most recent 10 posts
             "event_threads_collection_exists": "event_threads" in collections
         }), 200
         
@@ -477,72 +463,10 @@ def get_thread_stats(current_user, event_id):
     """Get statistics about the event thread"""
     try:
         # Verify user is attending the event
-        db = current_app.config["DB"]
-        attendance = db.attendances.find_one({
-            "event_id": event_id,
-            "user_id": current_user['_id']
-        })
-        
-        if not attendance:
+        if not friends_attending_cache.is_attending(event_id, current_user['_id']):
             return jsonify({"error": "You must be attending the event to view thread stats"}), 403
         
-        # Get various statistics
-        total_posts = db.event_threads.count_documents({
-            "event_id": event_id,
-            "is_deleted": False,
-            "post_type": {"$ne": "join_notification"}  # Exclude join notifications from regular post count
-        })
-        
-        total_replies = db.event_threads.count_documents({
-            "event_id": event_id,
-            "is_deleted": False,
-            "reply_to": {"$ne": None}
-        })
-        
-        join_notifications = db.event_threads.count_documents({
-            "event_id": event_id,
-            "post_type": "join_notification"
-        })
-        
-        # Get most active users
-        active_users_pipeline = [
-            {
-                "$match": {
-                    "event_id": event_id,
-                    "is_deleted": False,
-                    "post_type": {"$ne": "join_notification"}  # Exclude join notifications
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$user_id",
-                    "post_count": {"$sum": 1},
-                    "username": {"$first": "$username"}
-                }
-            },
-            {"$sort": {"post_count": -1}},
-            {"$limit": 5}
-        ]
-        
-        active_users = list(db.event_threads.aggregate(active_users_pipeline))
-        
-        # Get posts in last 24 hours
-        from datetime import timedelta
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        recent_posts = db.event_threads.count_documents({
-            "event_id": event_id,
-            "is_deleted": False,
-            "created_at": {"$gte": yesterday},
-            "post_type": {"$ne": "join_notification"}
-        })
-        
-        return jsonify({
-            "total_posts": total_posts,
-            "total_replies": total_replies,
-            "join_notifications": join_notifications,
-            "posts_last_24h": recent_posts,
-            "most_active_users": active_users
-        }), 200
+        return jsonify(ThreadStats.get(event_id)), 200
         
     except Exception as e:
         print(f"Error getting thread stats: {e}")
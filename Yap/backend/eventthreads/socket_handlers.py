@@ -0,0 +1,126 @@
+from flask_socketio import emit, join_room, leave_room
+from flask import request, current_app
+from events.friends_cache import friends_attending_cache
+from messages.socket_handlers import connected_users
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# {session_id: {"user_id": ..., "event_ids": set(event_ids)}} - threads each socket is watching
+thread_subscriptions = {}
+
+# Fields sent when a post is created; everything a thread view renders
+POST_DELTA_FIELDS = [
+    "_id", "event_id", "user_id", "username", "content", "post_type", "reply_to",
+    "created_at", "updated_at", "likes_count", "replies_count", "secure_image_urls"
+]
+
+
+def _thread_room(event_id):
+    return f"event_{event_id}"
+
+
+def handle_join_event_thread(data):
+    """Subscribe a socket to live updates for an event thread it is attending"""
+    try:
+        event_id = (data or {}).get('event_id')
+
+        user_info = connected_users.get(request.sid)
+        if not user_info:
+            emit('error', {'message': 'Session not found. Please reconnect.'})
+            return
+
+        if not event_id:
+            emit('error', {'message': 'Event ID required'})
+            return
+
+        user_id = user_info['user_id']
+        if not friends_attending_cache.is_attending(event_id, user_id):
+            emit('error', {'message': 'You must be attending the event to follow its thread'})
+            return
+
+        join_room(_thread_room(event_id))
+        subscription = thread_subscriptions.setdefault(request.sid, {"user_id": user_id, "event_ids": set()})
+        subscription["event_ids"].add(event_id)
+
+        emit('joined_event_thread', {'event_id': event_id})
+
+    except Exception as e:
+        logger.error(f"❌ Error in handle_join_event_thread: {str(e)}", exc_info=True)
+        emit('error', {'message': 'Failed to join event thread'})
+
+
+def handle_leave_event_thread(data):
+    """Stop live updates for an event thread"""
+    try:
+        event_id = (data or {}).get('event_id')
+        if not event_id:
+            return
+
+        leave_room(_thread_room(event_id))
+        subscription = thread_subscriptions.get(request.sid)
+        if subscription:
+            subscription["event_ids"].discard(event_id)
+
+        emit('left_event_thread', {'event_id': event_id})
+
+    except Exception as e:
+        logger.error(f"❌ Error in handle_leave_event_thread: {str(e)}", exc_info=True)
+
+
+def handle_event_thread_disconnect():
+    """Forget a disconnected socket's subscriptions (rooms are left automatically)"""
+    thread_subscriptions.pop(request.sid, None)
+
+
+def remove_from_event_thread(event_id, user_id):
+    """Take a user who stopped attending out of the event's room on every socket"""
+    try:
+        socketio = current_app.extensions.get('socketio')
+        if not socketio:
+            return
+
+        room = _thread_room(event_id)
+        for sid, subscription in list(thread_subscriptions.items()):
+            if subscription["user_id"] == user_id and event_id in subscription["event_ids"]:
+                socketio.server.leave_room(sid, room, namespace='/')
+                subscription["event_ids"].discard(event_id)
+
+    except Exception as e:
+        logger.error(f"Error removing user {user_id} from event thread {event_id}: {e}")
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def broadcast_thread_delta(event_id, action, payload):
+    """Push a compact thread change to sockets watching the event's thread
+
+    action is "created" (payload is the new post), "liked" (_id,
+    likes_count), "updated" (_id, content, updated_at) or "deleted" (_id,
+    reply_to). Clients apply it to the posts they already have rather than
+    re-fetching the thread.
+    """
+    try:
+        socketio = current_app.extensions.get('socketio')
+        if not socketio:
+            return
+
+        if action == "created":
+            payload = {field: payload.get(field) for field in POST_DELTA_FIELDS}
+            payload["user_id"] = str(payload["user_id"])
+
+        delta = {
+            "action": action,
+            "event_id": event_id,
+            "post": {key: _serialize(value) for key, value in payload.items()}
+        }
+        delta["post"]["_id"] = str(payload["_id"])
+
+        socketio.emit('event_thread_update', delta, room=_thread_room(event_id))
+
+    except Exception as e:
+        # Live updates are best-effort; the write itself already succeeded
+        logger.error(f"Error broadcasting thread {action}: {e}")
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+
+STATS_TOP_POSTERS = 5
+STATS_REBUILD_INTERVAL = timedelta(days=1)  # Recount from the posts this often to correct any drift
+STATS_HOUR_FORMAT = "%Y%m%d%H"
+
+
+def _counts_toward_posts(post):
+    return post.get("post_type") != "join_notification"
+
+
+class ThreadStats:
+    """Per-event thread statistics kept in event_thread_stats.
+
+    Each event has one document holding its post, reply and join counts, a
+    per-user post count and per-hour post counts for recent activity. Posts
+    and deletions $inc it, so the stats route is a single find_one. The
+    document is rebuilt from event_threads with one $facet aggregation when
+    it is missing or older than STATS_REBUILD_INTERVAL, which also drops
+    hour buckets that have aged out. Every $inc bumps the document's
+    version, and a rebuild only replaces the version it started from, so
+    an increment landing mid-rebuild is never overwritten.
+    """
+
+    @staticmethod
+    def record_post(post):
+        """Count a newly created post or notification"""
+        ThreadStats._apply(post, 1)
+
+    @staticmethod
+    def record_delete(post):
+        """Uncount a post that has just been marked deleted"""
+        ThreadStats._apply(post, -1)
+
+    @staticmethod
+    def get(event_id):
+        """Get an event's thread stats, rebuilding them if needed"""
+        db = current_app.config["DB"]
+
+        stats = db.event_thread_stats.find_one({"_id": event_id})
+        if not stats or datetime.utcnow() - stats["rebuilt_at"] > STATS_REBUILD_INTERVAL:
+            stats = ThreadStats.rebuild(event_id)
+
+        return ThreadStats._serialize(stats)
+
+    @staticmethod
+    def rebuild(event_id):
+        """Recount an event's stats from its posts and store them"""
+        db = current_app.config["DB"]
+        now = datetime.utcnow()
+        current = db.event_thread_stats.find_one({"_id": event_id}, {"version": 1})
+        visible = {"is_deleted": False, "post_type": {"$ne": "join_notification"}}
+
+        pipeline = [
+            {"$match": {"event_id": event_id}},
+            {
+                "$facet": {
+                    "posts": [{"$match": visible}, {"$count": "count"}],
+                    "replies": [
+                        {"$match": {"is_deleted": False, "reply_to": {"$ne": None}}},
+                        {"$count": "count"}
+                    ],
+                    "join_notifications": [
+                        {"$match": {"post_type": "join_notification"}},
+                        {"$count": "count"}
+                    ],
+                    "posters": [
+                        {"$match": visible},
+                        {
+                            "$group": {
+                                "_id": "$user_id",
+                                "count": {"$sum": 1},
+                                "username": {"$first": "$username"}
+                            }
+                        }
+                    ],
+                    "hourly": [
+                        {"$match": {**visible, "created_at": {"$gte": now - timedelta(days=1)}}},
+                        {
+                            "$group": {
+                                "_id": {"$dateToString": {"format": STATS_HOUR_FORMAT, "date": "$created_at"}},
+                                "count": {"$sum": 1}
+                            }
+                        }
+                    ]
+                }
+            }
+        ]
+        result = next(db.event_threads.aggregate(pipeline))
+
+        def count(facet):
+            return result[facet][0]["count"] if result[facet] else 0
+
+        stats = {
+            "_id": event_id,
+            "posts": count("posts"),
+            "replies": count("replies"),
+            "join_notifications": count("join_notifications"),
+            "posters": {
+                str(poster["_id"]): {"count": poster["count"], "username": poster["username"]}
+                for poster in result["posters"]
+            },
+            "hourly": {bucket["_id"]: bucket["count"] for bucket in result["hourly"]},
+            "rebuilt_at": now,
+            "version": current.get("version", 0) if current else 0
+        }
+        if current is None:
+            try:
+                db.event_thread_stats.insert_one(stats)
+            except DuplicateKeyError:
+                pass  # Another rebuild stored it first
+        else:
+            # Matches nothing if a post was counted since the version was read;
+            # the stored counts include it and the next read rebuilds again
+            db.event_thread_stats.replace_one({"_id": event_id, "version": current.get("version")}, stats)
+        return stats
+
+    @staticmethod
+    def delete(event_id):
+        db = current_app.config["DB"]
+        db.event_thread_stats.delete_one({"_id": event_id})
+
+    @staticmethod
+    def _apply(post, delta):
+        """$inc the counters a post contributes to by delta"""
+        db = current_app.config["DB"]
+
+        inc = {}
+        update = {}
+        if _counts_toward_posts(post):
+            user_id = str(post["user_id"])
+            inc["posts"] = delta
+            inc[f"posters.{user_id}.count"] = delta
+            inc[f"hourly.{post['created_at'].strftime(STATS_HOUR_FORMAT)}"] = delta
+            update["$set"] = {f"posters.{user_id}.username": post.get("username")}
+        else:
+            inc["join_notifications"] = delta
+        if post.get("reply_to"):
+            inc["replies"] = delta
+        inc["version"] = 1
+        update["$inc"] = inc
+
+        try:
+            # No upsert: a missing document is rebuilt in full on the next read
+            db.event_thread_stats.update_one({"_id": post["event_id"]}, update)
+        except Exception as e:
+            # Stats are advisory; the daily rebuild corrects a missed update
+            print(f"Error updating thread stats for event {post['event_id']}: {e}")
+
+    @staticmethod
+    def _serialize(stats):
+        since = (datetime.utcnow() - timedelta(days=1)).strftime(STATS_HOUR_FORMAT)
+        posters = sorted(
+            (
+                {"_id": user_id, "post_count": poster["count"], "username": poster.get("username")}
+                for user_id, poster in stats.get("posters", {}).items()
+                if poster.get("count", 0) > 0
+            ),
+            key=lambda poster: poster["post_count"],
+            reverse=True
+        )
+
+        return {
+            "total_posts": stats.get("posts", 0),
+            "total_replies": stats.get("replies", 0),
+            "join_notifications": stats.get("join_notifications", 0),
+            "posts_last_24h": sum(
+                count for hour, count in stats.get("hourly", {}).items() if hour >= since
+            ),
+            "most_active_users": posters[:STATS_TOP_POSTERS]
+        }
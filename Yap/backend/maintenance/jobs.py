@@ -0,0 +1,51 @@
+from maintenance.scheduler import MaintenanceScheduler
+from waypoint.models import Waypoint
+from activities.models import WhatsOnMind
+from events.models import Event
+from events.cancellation import EventCancellation
+from registration.routes import cleanup_expired_registrations
+from messages.socket_handlers import cleanup_expired_typing
+import os
+
+_scheduler = None
+
+
+def init_maintenance_scheduler(app, socketio):
+    """Create the maintenance scheduler, register all sweeps and start it"""
+    global _scheduler
+
+    if os.getenv("MAINTENANCE_SCHEDULER_ENABLED", "true").lower() == "false":
+        print("🕒 Maintenance scheduler disabled")
+        return None
+
+    _scheduler = MaintenanceScheduler(app, socketio)
+
+    # Sweeps that used to run on every read of their collection. Waypoints
+    # run often so subscribed map clients hear about expiries promptly
+    _scheduler.add_job("expired_waypoints", Waypoint.cleanup_expired_waypoints, interval_seconds=60)
+    _scheduler.add_job("expired_registrations", cleanup_expired_registrations, interval_seconds=600)
+    _scheduler.add_job(
+        "old_whats_on_mind_posts",
+        lambda: WhatsOnMind.cleanup_old_posts(hours_old=24),
+        interval_seconds=300
+    )
+
+    # upcoming_events_view upkeep: drop started events each minute, and a
+    # periodic full rebuild to pick up profile changes and heal any drift
+    _scheduler.add_job("past_events_view", Event.remove_past_events_from_view, interval_seconds=60)
+    _scheduler.add_job("upcoming_events_view_rebuild", Event.refresh_upcoming_events_view, interval_seconds=1800)
+
+    # Finish event cancellations whose worker died or hit an error part way
+    _scheduler.add_job("stalled_event_cancellations", EventCancellation.resume_stalled, interval_seconds=120)
+
+    # Typing state lives in each worker's memory, so every worker sweeps its own
+    _scheduler.add_job("expired_typing_indicators", cleanup_expired_typing, interval_seconds=15, leader_only=False)
+
+    app.config["MAINTENANCE_SCHEDULER"] = _scheduler
+    _scheduler.start()
+    return _scheduler
+
+
+def get_maintenance_scheduler():
+    """Get the running scheduler (None if disabled or not started)"""
+    return _scheduler
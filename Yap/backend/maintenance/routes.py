@@ -0,0 +1,37 @@
+from flask import Blueprint, jsonify
+from maintenance.jobs import get_maintenance_scheduler
+from auth.service import token_required
+from events.friends_cache import friends_attending_cache
+from messages.participants_cache import conversation_participants_cache
+import os
+
+maintenance_bp = Blueprint('maintenance', __name__)
+
+# Comma-separated user ids allowed to read scheduler state; empty disables the route
+STATUS_USER_IDS = {
+    user_id.strip() for user_id in os.getenv("MAINTENANCE_STATUS_USER_IDS", "").split(",") if user_id.strip()
+}
+
+@maintenance_bp.route('/status', methods=['GET'])
+@token_required
+def get_maintenance_status(current_user):
+    """Get maintenance scheduler state and job metrics (operators only)"""
+    if current_user["_id"] not in STATUS_USER_IDS:
+        return jsonify({"error": "Not found"}), 404
+
+    try:
+        scheduler = get_maintenance_scheduler()
+        
+        caches = {
+            "friends_attending": friends_attending_cache.get_stats(),
+            "conversation_participants": conversation_participants_cache.get_stats()
+        }
+        
+        if not scheduler:
+            return jsonify({"enabled": False, "caches": caches}), 200
+        
+        return jsonify({"enabled": True, **scheduler.get_status(), "caches": caches}), 200
+        
+    except Exception as e:
+        print(f"Error getting maintenance status: {e}")
+        return jsonify({"error": "Failed to get maintenance status"}), 500
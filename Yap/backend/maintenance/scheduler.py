@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# How often the scheduler wakes up to check for due jobs
+SCHEDULER_TICK_SECONDS = int(os.getenv("MAINTENANCE_TICK_SECONDS", 15))
+# How long a worker holds the leader lock without renewing it
+SCHEDULER_LEASE_SECONDS = int(os.getenv("MAINTENANCE_LEASE_SECONDS", 60))
+SCHEDULER_LOCK_ID = "maintenance_scheduler"
+
+
+class MaintenanceScheduler:
+    """Runs periodic maintenance jobs on a single elected worker.
+
+    Every worker process starts a scheduler, but only the one holding the
+    lease in the scheduler_locks collection runs shared jobs; jobs added
+    with leader_only=False run on every worker. The leader renews its lease
+    each tick; if it dies, another worker takes over once the lease expires.
+    """
+
+    def __init__(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+        self.is_leader = False
+        self.started = False
+
+    def add_job(self, name, func, interval_seconds, leader_only=True):
+        """Register a job. func runs inside an app context and returns a count of removed items
+
+        Jobs that clean up the worker's own in-memory state pass
+        leader_only=False to run on every worker.
+        """
+        self.jobs[name] = {
+            "func": func,
+            "interval_seconds": interval_seconds,
+            "leader_only": leader_only,
+            "next_run_at": datetime.utcnow(),
+            "metrics": {
+                "runs": 0,
+                "errors": 0,
+                "total_removed": 0,
+                "last_run_at": None,
+                "last_duration_ms": None,
+                "last_result": None,
+                "last_error": None
+            }
+        }
+
+    def start(self):
+        """Start the scheduler loop as a SocketIO background task"""
+        if self.started:
+            return
+        self.started = True
+        self.socketio.start_background_task(self._run_loop)
+        logger.info(f"🕒 Maintenance scheduler started on worker {self.worker_id}")
+
+    def _run_loop(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.is_leader = self._acquire_lease()
+                    self._run_due_jobs()
+            except Exception as e:
+                logger.error(f"Maintenance scheduler tick failed: {e}")
+            self.socketio.sleep(SCHEDULER_TICK_SECONDS)
+
+    def _acquire_lease(self):
+        """Take or renew the leader lock, returns True if this worker is the leader"""
+        db = self.app.config["DB"]
+        now = datetime.utcnow()
+
+        try:
+            db.scheduler_locks.find_one_and_update(
+                {
+                    "_id": SCHEDULER_LOCK_ID,
+                    "$or": [
+                        {"owner": self.worker_id},
+                        {"expires_at": {"$lt": now}}
+                    ]
+                },
+                {
+                    "$set": {
+                        "owner": self.worker_id,
+                        "expires_at": now + timedelta(seconds=SCHEDULER_LEASE_SECONDS),
+                        "renewed_at": now
+                    }
+                },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Another worker holds an unexpired lease
+            return False
+
+    def _run_due_jobs(self):
+        now = datetime.utcnow()
+
+        for name, job in self.jobs.items():
+            if job["next_run_at"] > now or (job["leader_only"] and not self.is_leader):
+                continue
+
+            metrics = job["metrics"]
+            started = time.monotonic()
+            try:
+                removed = job["func"]() or 0
+                metrics["last_result"] = removed
+                metrics["total_removed"] += removed
+                metrics["last_error"] = None
+                if removed:
+                    logger.info(f"🧹 {name}: removed {removed}")
+            except Exception as e:
+                metrics["errors"] += 1
+                metrics["last_error"] = str(e)
+                logger.error(f"Maintenance job {name} failed: {e}")
+
+            metrics["runs"] += 1
+            metrics["last_run_at"] = now
+            metrics["last_duration_ms"] = round((time.monotonic() - started) * 1000, 2)
+            job["next_run_at"] = now + timedelta(seconds=job["interval_seconds"])
+
+    def get_status(self):
+        """Get scheduler state and per-job metrics for monitoring"""
+        return {
+            "worker_id": self.worker_id,
+            "is_leader": self.is_leader,
+            "tick_seconds": SCHEDULER_TICK_SECONDS,
+            "jobs": {
+                name: {
+                    "interval_seconds": job["interval_seconds"],
+                    "leader_only": job["leader_only"],
+                    "next_run_at": job["next_run_at"].isoformat(),
+                    **{
+                        key: value.isoformat() if isinstance(value, datetime) else value
+                        for key, value in job["metrics"].items()
+                    }
+                }
+                for name, job in self.jobs.items()
+            }
+        }
@@ -1,11 +1,21 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 from bson import ObjectId
 from flask import current_app
+from messages.participants_cache import conversation_participants_cache
+from messages.pubsub import conversation_events
+from shared.ids import to_object_ids
+from pymongo import ReturnDocument
+from pymongo.errors import ExecutionTimeout
 import logging
 
 logger = logging.getLogger(__name__)
 
+POLL_MAX_MESSAGES = 100  # Messages returned by one poll or SSE catch-up
+SYNC_MAX_MESSAGES = 500  # Messages returned by one sync_since call; clients call again while has_more
+SEQ_GAP_GRACE_SECONDS = 10  # A seq still missing this long after the next message was sent is never coming
+MESSAGE_SEARCH_MAX_TIME_MS = 2000  # Server-side limit on one search; common terms can exceed it
+
 # Define Eastern Time timezone with automatic DST handling
 EASTERN_TZ = pytz.timezone('US/Eastern')
 
@@ -32,72 +42,166 @@ def format_eastern_timestamp(dt):
     
     return dt
 
+def _contiguous_from(messages, since):
+    """The leading run of messages (sorted by seq) that carries on from since
+
+    A message takes its seq before it is inserted, so a concurrent sender's
+    seq N+1 can be readable before N is. Handing out N+1 would move the
+    client's cursor past N for good, so the run stops at the gap and N+1
+    goes out once N lands. A gap still open SEQ_GAP_GRACE_SECONDS after the
+    next message was created is an insert that failed, and is skipped.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=SEQ_GAP_GRACE_SECONDS)
+    expected = since + 1
+    run = []
+    for msg in messages:
+        created_at = msg["created_at"]
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(pytz.UTC).replace(tzinfo=None)
+        if msg["seq"] != expected and created_at > cutoff:
+            break
+        run.append(msg)
+        expected = msg["seq"] + 1
+    return run
+
+def _read_by(msg, watermarks):
+    """Participants who have read msg: the sender, anyone whose watermark has
+    reached it, and readers recorded in read_by before watermarks existed"""
+    readers = [msg["sender_id"]] + [
+        user_id for user_id in msg.get("read_by", []) if user_id != msg["sender_id"]
+    ]
+    for user_id, last_read_seq in (watermarks or {}).items():
+        if last_read_seq is None or user_id in readers:
+            continue
+        # Messages without a seq predate every seq watermark
+        if msg.get("seq") is None or msg["seq"] <= last_read_seq:
+            readers.append(user_id)
+    return readers
+
+def _unread_query(conversation, user_id):
+    """Query for the messages in conversation that user_id hasn't read"""
+    query = {"conversation_id": conversation["_id"], "sender_id": {"$ne": user_id}}
+    last_read_seq = conversation.get("last_read_seq", {}).get(user_id)
+    if last_read_seq is not None:
+        query["seq"] = {"$gt": last_read_seq}
+    else:
+        # Conversations read before watermarks were introduced
+        query["read_by"] = {"$ne": user_id}
+    return query
+
+def _serialize_message(msg, sender, watermarks=None):
+    """Build the API/socket form of a message document"""
+    return {
+        "_id": str(msg["_id"]),
+        "conversation_id": str(msg["conversation_id"]),
+        "seq": msg.get("seq"),
+        "sender_id": msg["sender_id"],
+        "content": msg["content"],
+        "created_at": format_eastern_timestamp(msg["created_at"]),
+        "message_type": msg.get("message_type", "text"),
+        "attachment_url": msg.get("attachment_url"),
+        "attachment_s3_key": msg.get("attachment_s3_key"),
+        "edited": msg.get("edited", False),
+        "edited_at": format_eastern_timestamp(msg.get("edited_at")),
+        "read_by": _read_by(msg, watermarks),
+        "sender": {
+            "_id": msg["sender_id"],
+            "username": sender["username"] if sender else "Unknown",
+            "profile_picture": sender.get("profile_picture", "") if sender else ""
+        }
+    }
+
+def _serialize_messages(db, messages, watermarks=None):
+    """Serialize messages, looking up all their senders in one query
+
+    watermarks maps conversation_id (ObjectId) -> that conversation's
+    {user_id: last_read_seq}.
+    """
+    sender_ids = {msg["sender_id"] for msg in messages}
+    senders = {
+        str(user["_id"]): user
+        for user in db.users.find(
+            {"_id": {"$in": to_object_ids(sender_ids)}},
+            {"username": 1, "profile_picture": 1}
+        )
+    } if sender_ids else {}
+    
+    watermarks = watermarks or {}
+    return [
+        _serialize_message(msg, senders.get(msg["sender_id"]), watermarks.get(msg["conversation_id"]))
+        for msg in messages
+    ]
+
+def _get_watermarks(db, conversation_id):
+    conversation = db.conversations.find_one(
+        {"_id": ObjectId(conversation_id)},
+        {"last_read_seq": 1}
+    )
+    return {ObjectId(conversation_id): (conversation or {}).get("last_read_seq", {})}
+
 class Message:
     @staticmethod
-    def create_message(conversation_id, sender_id, content, message_type="text", attachment_url=None, attachment_s3_key=None):
-        """Create a new message with Eastern Time timestamp and optional attachment"""
+    def create_message(conversation_id, sender_id, content, message_type="text", attachment_url=None, attachment_s3_key=None, sender=None):
+        """Create a new message with Eastern Time timestamp and optional attachment
+
+        sender is the sender's {"username", "profile_picture"} when the caller
+        already has it (the socket session or the authenticated user), which
+        saves looking the user up. Each message takes the next value of its
+        conversation's seq counter in the same write that updates the
+        conversation's last message, so clients can ask for everything after
+        the last seq they saw.
+        """
         db = current_app.config["DB"]
         
         try:
             # Get current Eastern Time
             et_now = get_eastern_now()
+            message_object_id = ObjectId()
+            
+            # Update conversation's last message timestamp and take the next seq.
+            # $max so a concurrent send that got here first isn't overwritten
+            conversation = db.conversations.find_one_and_update(
+                {"_id": ObjectId(conversation_id)},
+                {
+                    "$max": {
+                        "last_message_at": et_now,
+                        "last_message": message_object_id
+                    },
+                    "$inc": {"seq": 1}
+                },
+                projection={"seq": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if not conversation:
+                logger.error(f"Conversation {conversation_id} not found for new message")
+                return None
             
             # Create message document
             message_doc = {
+                "_id": message_object_id,
                 "conversation_id": ObjectId(conversation_id),
+                "seq": conversation["seq"],
                 "sender_id": sender_id,
                 "content": content,
                 "created_at": et_now,
-                "read_by": [sender_id],
                 "message_type": message_type,
                 "attachment_url": attachment_url,
                 "attachment_s3_key": attachment_s3_key,
                 "edited": False,
                 "edited_at": None
             }
+            db.messages.insert_one(message_doc)
             
-            result = db.messages.insert_one(message_doc)
-            message_id = str(result.inserted_id)
-            
-            # Update conversation's last message timestamp
-            db.conversations.update_one(
-                {"_id": ObjectId(conversation_id)},
-                {
-                    "$set": {
-                        "last_message_at": et_now,
-                        "last_message": result.inserted_id
-                    }
-                }
-            )
+            # Fall back to looking the sender up when the caller didn't pass them
+            if sender is None:
+                sender = db.users.find_one(
+                    {"_id": ObjectId(sender_id)},
+                    {"username": 1, "profile_picture": 1}
+                )
             
-            # Get sender info for the response
-            sender = db.users.find_one({"_id": ObjectId(sender_id)})
-            if sender:
-                sender["_id"] = str(sender["_id"])
+            message_response = _serialize_message(message_doc, sender)
             
-            # Return Eastern Time timestamp in ISO format
-            created_at_iso = et_now.isoformat()
-            
-            # Prepare message response
-            message_response = {
-                "_id": message_id,
-                "conversation_id": conversation_id,
-                "sender_id": sender_id,
-                "content": content,
-                "created_at": created_at_iso,
-                "message_type": message_type,
-                "attachment_url": attachment_url,
-                "attachment_s3_key": attachment_s3_key,
-                "edited": False,
-                "read_by": [sender_id],
-                "sender": {
-                    "_id": sender["_id"] if sender else sender_id,
-                    "username": sender["username"] if sender else "Unknown",
-                    "profile_picture": sender.get("profile_picture", "") if sender else ""
-                }
-            }
-            
-            logger.info(f"Message created: {message_id} in conversation {conversation_id}")
+            logger.info(f"Message created: {message_response['_id']} (seq {message_doc['seq']}) in conversation {conversation_id}")
             return message_response
             
         except Exception as e:
@@ -114,71 +218,230 @@ class Message:
                 "conversation_id": ObjectId(conversation_id)
             }).sort("created_at", -1).skip(skip).limit(limit))
             
-            result = []
-            
-            for msg in messages:
-                # Get sender info
-                sender = db.users.find_one({"_id": ObjectId(msg["sender_id"])})
-                
-                # Format timestamp
-                stored_time = msg["created_at"]
-                if isinstance(stored_time, datetime):
-                    if stored_time.tzinfo is None:
-                        stored_time = stored_time.replace(tzinfo=pytz.UTC)
-                    eastern_time = stored_time.astimezone(EASTERN_TZ)
-                    created_at_iso = eastern_time.isoformat()
-                else:
-                    created_at_iso = stored_time
-                
-                message = {
-                    "_id": str(msg["_id"]),
-                    "conversation_id": str(msg["conversation_id"]),
-                    "sender_id": msg["sender_id"],
-                    "content": msg["content"],
-                    "created_at": created_at_iso,
-                    "message_type": msg.get("message_type", "text"),
-                    "attachment_url": msg.get("attachment_url"),
-                    "attachment_s3_key": msg.get("attachment_s3_key"),
-                    "edited": msg.get("edited", False),
-                    "edited_at": format_eastern_timestamp(msg.get("edited_at")),
-                    "read_by": msg.get("read_by", []),
-                    "sender": {
-                        "_id": str(sender["_id"]) if sender else msg["sender_id"],
-                        "username": sender["username"] if sender else "Unknown",
-                        "profile_picture": sender.get("profile_picture", "") if sender else ""
-                    }
-                }
-                result.append(message)
-            
             # Return in chronological order (oldest first)
-            return result[::-1]
+            return _serialize_messages(db, messages[::-1], _get_watermarks(db, conversation_id))
             
         except Exception as e:
             logger.error(f"Error getting messages: {e}")
             return []
     
+    @staticmethod
+    def get_messages_after(conversation_id, since=None, limit=POLL_MAX_MESSAGES):
+        """Get a conversation's messages after the since cursor, oldest first
+
+        since is the seq of the last message the client has (the cursor
+        returned with every page). Without one, the latest limit messages
+        are returned to start from. Like sync, a page stops short of a seq
+        that hasn't been inserted yet, so the cursor never skips a message.
+        """
+        db = current_app.config["DB"]
+        
+        try:
+            query = {"conversation_id": ObjectId(conversation_id)}
+            if since is None:
+                messages = list(db.messages.find(query).sort("created_at", -1).limit(limit))[::-1]
+                # Messages from before seqs existed have none and are kept as they are
+                sequenced = sorted((msg for msg in messages if msg.get("seq") is not None), key=lambda msg: msg["seq"])
+                if sequenced:
+                    last_seq = _contiguous_from(sequenced, sequenced[0]["seq"] - 1)[-1]["seq"]
+                    messages = [msg for msg in messages if msg.get("seq") is None or msg["seq"] <= last_seq]
+                has_more = False
+            else:
+                query["seq"] = {"$gt": since}
+                messages = list(db.messages.find(query).sort("seq", 1).limit(limit + 1))
+                page = _contiguous_from(messages[:limit], since)
+                has_more = len(messages) > limit and len(page) == limit
+                messages = page
+            
+            seqs = [msg["seq"] for msg in messages if msg.get("seq") is not None]
+            return {
+                "messages": _serialize_messages(db, messages, _get_watermarks(db, conversation_id)),
+                "cursor": max(seqs) if seqs else (since or 0),
+                "has_more": has_more
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting messages after seq {since} in conversation {conversation_id}: {e}")
+            return {"error": str(e)}
+    
+    @staticmethod
+    def get_messages_since(user_id, cursors=None, limit=SYNC_MAX_MESSAGES):
+        """Get the messages a user hasn't received yet, across all their conversations
+
+        cursors maps conversation_id -> the last seq the client has. A
+        conversation without a cursor resumes from the last seq the user
+        acknowledged, so a client that lost its state still only gets what
+        it missed. Each conversation stops short of a seq that hasn't been
+        inserted yet (see _contiguous_from); the live new_message event
+        delivers the rest.
+        """
+        db = current_app.config["DB"]
+        cursors = cursors or {}
+        
+        try:
+            conversations = db.conversations.find(
+                {"participants": user_id, "seq": {"$gt": 0}},
+                {"seq": 1, "delivered_seq": 1, "last_read_seq": 1}
+            )
+            
+            clauses = []
+            watermarks = {}
+            starts = {}
+            for conv in conversations:
+                watermarks[conv["_id"]] = conv.get("last_read_seq", {})
+                conversation_id = str(conv["_id"])
+                since = cursors.get(conversation_id)
+                if since is None:
+                    since = conv.get("delivered_seq", {}).get(user_id, 0)
+                if conv["seq"] > since:
+                    starts[conv["_id"]] = since
+                    clauses.append({"conversation_id": conv["_id"], "seq": {"$gt": since}})
+            
+            if not clauses:
+                return {"messages": [], "has_more": False}
+            
+            messages = list(
+                db.messages.find({"$or": clauses})
+                .sort([("conversation_id", 1), ("seq", 1)])
+                .limit(limit + 1)
+            )
+            has_more = len(messages) > limit
+            
+            by_conversation = {}
+            for msg in messages[:limit]:
+                by_conversation.setdefault(msg["conversation_id"], []).append(msg)
+            
+            synced = []
+            for conversation_id, conversation_messages in by_conversation.items():
+                synced.extend(_contiguous_from(conversation_messages, starts[conversation_id]))
+            
+            return {
+                "messages": _serialize_messages(db, synced, watermarks),
+                "has_more": has_more
+            }
+            
+        except Exception as e:
+            logger.error(f"Error syncing messages for user {user_id}: {e}")
+            return {"error": str(e)}
+    
+    @staticmethod
+    def search_messages(user_id, query, limit=20, skip=0):
+        """Full-text search over the messages in a user's conversations, best matches first
+
+        Uses the text index on messages.content, which MongoDB keeps current
+        as messages are created and edited. $text is answered from that
+        index across every conversation before conversation_id narrows it
+        to the user's, so the cost grows with how common the terms are
+        across all messages (see scripts/benchmark_message_search.py). A
+        search is stopped after MESSAGE_SEARCH_MAX_TIME_MS and returns
+        {"error", "timed_out": True} rather than holding a worker.
+        """
+        db = current_app.config["DB"]
+        
+        try:
+            watermarks = {
+                conv["_id"]: conv.get("last_read_seq", {})
+                for conv in db.conversations.find({"participants": user_id}, {"last_read_seq": 1})
+            }
+            if not watermarks:
+                return {"messages": []}
+            
+            messages = list(
+                db.messages.find(
+                    {
+                        "$text": {"$search": query},
+                        "conversation_id": {"$in": list(watermarks)}
+                    },
+                    {"score": {"$meta": "textScore"}}
+                )
+                .sort([("score", {"$meta": "textScore"}), ("created_at", -1)])
+                .skip(skip)
+                .limit(limit)
+                .max_time_ms(MESSAGE_SEARCH_MAX_TIME_MS)
+            )
+            
+            results = _serialize_messages(db, messages, watermarks)
+            for result, msg in zip(results, messages):
+                result["score"] = msg["score"]
+            return {"messages": results}
+            
+        except ExecutionTimeout:
+            logger.warning(f"Message search for user {user_id} exceeded {MESSAGE_SEARCH_MAX_TIME_MS}ms: {query!r}")
+            return {"error": "Search timed out", "timed_out": True}
+        except Exception as e:
+            logger.error(f"Error searching messages for user {user_id}: {e}")
+            return {"error": str(e)}
+    
+    @staticmethod
+    def acknowledge_delivery(conversation_id, user_id, seq):
+        """Record that a participant has received a conversation's messages up to seq"""
+        db = current_app.config["DB"]
+        
+        try:
+            result = db.conversations.update_one(
+                {"_id": ObjectId(conversation_id), "participants": user_id},
+                {"$max": {f"delivered_seq.{user_id}": int(seq)}}
+            )
+            return result.matched_count > 0
+            
+        except Exception as e:
+            logger.error(f"Error acknowledging delivery in conversation {conversation_id}: {e}")
+            return False
+    
     @staticmethod
     def mark_messages_as_read(conversation_id, user_id):
-        """Mark all messages in a conversation as read by user"""
+        """Mark all messages in a conversation as read by user
+
+        Read state is a per-participant watermark on the conversation
+        (last_read_seq.<user_id>), moved in a single $max update however many
+        messages were unread. It only moves as far as the last message with
+        nothing missing below it (see _contiguous_from): a seq that has been
+        taken but not inserted yet hasn't reached the reader, so marking it
+        read would leave it never counted as unread. Returns the new
+        watermark, or None if it didn't move.
+        """
         db = current_app.config["DB"]
+        watermark_field = f"last_read_seq.{user_id}"
         
         try:
-            result = db.messages.update_many(
-                {
-                    "conversation_id": ObjectId(conversation_id),
-                    "read_by": {"$ne": user_id}
-                },
-                {
-                    "$addToSet": {"read_by": user_id}
-                }
+            conversation = db.conversations.find_one(
+                {"_id": ObjectId(conversation_id), "participants": user_id},
+                {"last_read_seq": 1, "seq": 1}
             )
+            if not conversation:
+                return None
+            
+            previous = conversation.get("last_read_seq", {}).get(user_id)
+            if previous is not None and previous >= conversation.get("seq", 0):
+                return None
             
-            logger.info(f"Marked {result.modified_count} messages as read for user {user_id}")
-            return result.modified_count
+            since = previous or 0
+            unread = db.messages.find(
+                {"conversation_id": ObjectId(conversation_id), "seq": {"$gt": since}},
+                {"seq": 1, "created_at": 1, "_id": 0}
+            ).sort("seq", 1)
+            run = _contiguous_from(unread, since)
+            # Conversations with only pre-seq messages get 0, which covers all of them
+            last_read_seq = run[-1]["seq"] if run else since
+            if previous is not None and last_read_seq <= previous:
+                return None
+            
+            db.conversations.update_one(
+                {"_id": ObjectId(conversation_id)},
+                {"$max": {watermark_field: last_read_seq}}
+            )
+            
+            # Lets the other participants update their "seen" indicators
+            conversation_events.publish(conversation_id, 'messages_read', {
+                'conversation_id': conversation_id,
+                'user_id': user_id,
+                'last_read_seq': last_read_seq
+            })
+            return last_read_seq
             
         except Exception as e:
             logger.error(f"Error marking messages as read: {e}")
-            return 0
+            return None
 
     @staticmethod
     def get_unread_message_count(user_id):
@@ -187,16 +450,14 @@ class Message:
         
         try:
             # Get user's conversations
-            user_conversations = db.conversations.find({"participants": user_id})
+            user_conversations = db.conversations.find(
+                {"participants": user_id},
+                {"last_read_seq": 1}
+            )
             total_unread = 0
             
             for conv in user_conversations:
-                unread_count = db.messages.count_documents({
-                    "conversation_id": conv["_id"],
-                    "sender_id": {"$ne": user_id},
-                    "read_by": {"$ne": user_id}
-                })
-                total_unread += unread_count
+                total_unread += db.messages.count_documents(_unread_query(conv, user_id))
             
             return total_unread
             
@@ -297,6 +558,7 @@ class Conversation:
             
             result = db.conversations.insert_one(conversation_doc)
             conversation_doc["_id"] = str(result.inserted_id)
+            conversation_participants_cache.set_participants(conversation_doc["_id"], participant_ids)
             conversation_doc["created_at"] = et_now.isoformat()
             conversation_doc["last_message_at"] = et_now.isoformat()
             
@@ -366,11 +628,9 @@ class Conversation:
                         }
                 
                 # Get unread count for this conversation
-                unread_count = db.messages.count_documents({
-                    "conversation_id": ObjectId(conv["_id"]),
-                    "sender_id": {"$ne": user_id},
-                    "read_by": {"$ne": user_id}
-                })
+                unread_count = db.messages.count_documents(
+                    _unread_query({**conv, "_id": ObjectId(conv["_id"])}, user_id)
+                )
                 
                 # Format timestamps
                 conv["last_message_at"] = format_eastern_timestamp(conv.get("last_message_at"))
@@ -0,0 +1,46 @@
+from flask import current_app
+from shared.ids import to_object_id
+from shared.set_cache import SetCache
+
+
+def _load_participants(conversation_id):
+    db = current_app.config["DB"]
+    object_id = to_object_id(conversation_id)
+    if object_id is None:
+        return []
+
+    conversation = db.conversations.find_one({"_id": object_id}, {"participants": 1})
+    return conversation["participants"] if conversation else []
+
+
+class ConversationParticipantsCache:
+    """In-memory participant sets per conversation.
+
+    Socket events (joins, messages, typing) and HTTP routes only need to
+    know who is in a conversation, so membership checks and notification
+    fan-out read from here instead of loading the conversation document.
+    Participants don't change once a conversation exists; creating one
+    stores its set straight away (replacing any cached miss for the id) and
+    the TTL covers changes made by other processes.
+    """
+
+    def __init__(self, ttl_seconds=600, max_conversations=10000):
+        self.participants = SetCache(_load_participants, ttl_seconds, max_conversations)
+
+    def get_participants(self, conversation_id):
+        return self.participants.get(conversation_id)
+
+    def is_participant(self, conversation_id, user_id):
+        return user_id in self.get_participants(conversation_id)
+
+    def set_participants(self, conversation_id, participant_ids):
+        self.participants.set(conversation_id, participant_ids)
+
+    def invalidate(self, conversation_id):
+        self.participants.invalidate(conversation_id)
+
+    def get_stats(self):
+        return self.participants.get_stats()
+
+
+conversation_participants_cache = ConversationParticipantsCache()
@@ -0,0 +1,72 @@
+from collections import deque
+from flask import current_app
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 200  # Events a slow stream may fall behind by before the oldest are dropped
+
+
+class Subscription:
+    def __init__(self, conversation_id):
+        self.conversation_id = conversation_id
+        self.events = deque(maxlen=SUBSCRIBER_QUEUE_SIZE)
+
+    def drain(self):
+        """Take every queued (event, data) pair"""
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+
+class ConversationEvents:
+    """In-process publish/subscribe for conversation events.
+
+    publish() emits to the conversation's Socket.IO room and hands the same
+    event to any server-sent-event streams open on this worker, so socket
+    and SSE clients see identical events from one call. Like Socket.IO here
+    it is per process (there is no message queue between workers).
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # {conversation_id: set(Subscription)}
+        self._lock = threading.Lock()
+
+    def subscribe(self, conversation_id):
+        subscription = Subscription(conversation_id)
+        with self._lock:
+            self._subscribers.setdefault(conversation_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.conversation_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.conversation_id]
+
+    def publish(self, conversation_id, event, data):
+        try:
+            socketio = current_app.extensions.get('socketio')
+            if socketio:
+                socketio.emit(event, data, room=f"conversation_{conversation_id}")
+        except Exception as e:
+            logger.error(f"Error emitting {event} to conversation {conversation_id}: {e}")
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(conversation_id, ()))
+        for subscription in subscribers:
+            subscription.events.append((event, data))
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "conversations": len(self._subscribers),
+                "streams": sum(len(subscribers) for subscribers in self._subscribers.values())
+            }
+
+
+conversation_events = ConversationEvents()
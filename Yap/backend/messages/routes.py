@@ -1,10 +1,14 @@
 import datetime
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from werkzeug.utils import secure_filename
 import os
 import uuid
-from auth.service import token_required
-from messages.models import Conversation, Message
+import json
+import time
+from auth.service import token_required, get_optional_user_id, generate_stream_token, verify_stream_token, STREAM_TOKEN_TTL
+from messages.models import Conversation, Message, POLL_MAX_MESSAGES
+from messages.participants_cache import conversation_participants_cache
+from messages.pubsub import conversation_events
 from users.models import User
 import boto3
 from botocore.exceptions import ClientError
@@ -15,6 +19,11 @@ messages_bp = Blueprint('messages', __name__)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
+# Server-sent-events fallback
+SSE_MAX_STREAM_SECONDS = 300  # Streams end after this long; EventSource reconnects with Last-Event-ID
+SSE_HEARTBEAT_SECONDS = 15
+SSE_POLL_INTERVAL_SECONDS = 0.5
+
 def get_s3_client():
     """Get S3 client"""
     return boto3.client(
@@ -238,8 +247,7 @@ def get_messages(current_user, conversation_id):
     """Get messages from a conversation"""
     try:
         # Verify user is part of conversation
-        conversation = Conversation.get_conversation(conversation_id)
-        if not conversation or current_user['_id'] not in conversation['participants']:
+        if not conversation_participants_cache.is_participant(conversation_id, current_user['_id']):
             return jsonify({"error": "Access denied"}), 403
         
         page = int(request.args.get('page', 1))
@@ -272,8 +280,8 @@ def send_message_http(current_user, conversation_id):
     """Send a message via HTTP (fallback for non-WebSocket clients)"""
     try:
         # Verify user is part of conversation
-        conversation = Conversation.get_conversation(conversation_id)
-        if not conversation or current_user['_id'] not in conversation['participants']:
+        participants = conversation_participants_cache.get_participants(conversation_id)
+        if current_user['_id'] not in participants:
             return jsonify({"error": "Access denied"}), 403
         
         data = request.get_json()
@@ -301,7 +309,8 @@ def send_message_http(current_user, conversation_id):
             content=content,
             message_type=message_type,
             attachment_url=attachment_url,
-            attachment_s3_key=attachment_s3_key
+            attachment_s3_key=attachment_s3_key,
+            sender=current_user
         )
         
         if not message:
@@ -311,11 +320,10 @@ def send_message_http(current_user, conversation_id):
         try:
             socketio = current_app.extensions.get('socketio')
             if socketio:
-                room_name = f"conversation_{conversation_id}"
-                socketio.emit('new_message', message, room=room_name)
+                conversation_events.publish(conversation_id, 'new_message', message)
                 
                 # Send notifications to participants
-                for participant_id in conversation['participants']:
+                for participant_id in participants:
                     if participant_id != current_user['_id']:
                         socketio.emit(
                             'new_message_notification',
@@ -348,8 +356,7 @@ def edit_message(current_user, conversation_id, message_id):
     """Edit a message"""
     try:
         # Verify user is part of conversation
-        conversation = Conversation.get_conversation(conversation_id)
-        if not conversation or current_user['_id'] not in conversation['participants']:
+        if not conversation_participants_cache.is_participant(conversation_id, current_user['_id']):
             return jsonify({"error": "Access denied"}), 403
         
         data = request.get_json()
@@ -365,15 +372,12 @@ def edit_message(current_user, conversation_id, message_id):
         
         # Try to broadcast edit via SocketIO if available
         try:
-            socketio = current_app.extensions.get('socketio')
-            if socketio:
-                room_name = f"conversation_{conversation_id}"
-                socketio.emit('message_edited', {
-                    'message_id': message_id,
-                    'conversation_id': conversation_id,
-                    'new_content': new_content,
-                    'edited_at': result['edited_at']
-                }, room=room_name)
+            conversation_events.publish(conversation_id, 'message_edited', {
+                'message_id': message_id,
+                'conversation_id': conversation_id,
+                'new_content': new_content,
+                'edited_at': result['edited_at']
+            })
         except Exception as socket_error:
             print(f"SocketIO broadcast failed: {socket_error}")
         
@@ -392,21 +396,57 @@ def mark_conversation_read(current_user, conversation_id):
     """Mark all messages in a conversation as read"""
     try:
         # Verify user is part of conversation
-        conversation = Conversation.get_conversation(conversation_id)
-        if not conversation or current_user['_id'] not in conversation['participants']:
+        if not conversation_participants_cache.is_participant(conversation_id, current_user['_id']):
             return jsonify({"error": "Access denied"}), 403
         
-        count = Message.mark_messages_as_read(conversation_id, current_user['_id'])
+        last_read_seq = Message.mark_messages_as_read(conversation_id, current_user['_id'])
         
         return jsonify({
             "success": True,
-            "marked_read": count
+            "marked_read": last_read_seq is not None,
+            "last_read_seq": last_read_seq
         }), 200
         
     except Exception as e:
         print(f"Error marking messages as read: {e}")
         return jsonify({"error": "Failed to mark messages as read"}), 500
 
+@messages_bp.route('/search', methods=['GET'])
+@token_required
+def search_messages(current_user):
+    """Search the messages in the current user's conversations"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "Search query required"}), 400
+        
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            limit = max(1, min(int(request.args.get('limit', 20)), 50))
+        except ValueError:
+            return jsonify({"error": "page and limit must be integers"}), 400
+        skip = (page - 1) * limit
+        
+        result = Message.search_messages(current_user['_id'], query, limit=limit, skip=skip)
+        if result.get("timed_out"):
+            return jsonify({"error": "Search took too long, try more specific words"}), 503
+        if "error" in result:
+            return jsonify({"error": "Failed to search messages"}), 500
+        messages = result["messages"]
+        
+        return jsonify({
+            "success": True,
+            "messages": messages,
+            "query": query,
+            "page": page,
+            "limit": limit,
+            "has_more": len(messages) == limit
+        }), 200
+        
+    except Exception as e:
+        print(f"Error searching messages: {e}")
+        return jsonify({"error": "Failed to search messages"}), 500
+
 @messages_bp.route('/unread-count', methods=['GET'])
 @token_required
 def get_unread_count(current_user):
@@ -423,34 +463,168 @@ def get_unread_count(current_user):
         print(f"Error getting unread count: {e}")
         return jsonify({"error": "Failed to get unread count"}), 500
 
-# Optional: Polling endpoint for real-time-like updates without WebSocket
+def parse_seq_cursor(value):
+    """Parse a seq cursor (a non-negative integer), None if absent; raises ValueError if invalid"""
+    if value in (None, ""):
+        return None
+    seq = int(value)
+    if seq < 0:
+        raise ValueError("seq cursor must not be negative")
+    return seq
+
+# Fallbacks for clients that can't hold a WebSocket: an incremental poll and
+# a server-sent-events stream, both keyed by the same seq cursor
 @messages_bp.route('/conversations/<conversation_id>/poll', methods=['GET'])
 @token_required
 def poll_conversation_updates(current_user, conversation_id):
-    """Poll for new messages and updates in a conversation"""
+    """Poll for messages newer than the since cursor"""
     try:
         # Verify user is part of conversation
-        conversation = Conversation.get_conversation(conversation_id)
-        if not conversation or current_user['_id'] not in conversation['participants']:
+        if not conversation_participants_cache.is_participant(conversation_id, current_user['_id']):
             return jsonify({"error": "Access denied"}), 403
         
-        # Get timestamp from query params for polling
-        since_timestamp = request.args.get('since')
-        
-        # This would need additional logic to get messages since timestamp
-        # For now, just return recent messages
-        messages = Message.get_conversation_messages(conversation_id, limit=10)
+        try:
+            since = parse_seq_cursor(request.args.get('since'))
+            limit = max(1, min(int(request.args.get('limit', POLL_MAX_MESSAGES)), POLL_MAX_MESSAGES))
+        except ValueError:
+            return jsonify({"error": "since must be a seq and limit an integer"}), 400
         
-        # Get conversation update timestamp
-        conversation_updated = conversation.get('last_message_at')
+        result = Message.get_messages_after(conversation_id, since, limit=limit)
+        if "error" in result:
+            return jsonify({"error": "Failed to poll conversation"}), 500
         
         return jsonify({
             "success": True,
-            "messages": messages,
-            "conversation_updated": conversation_updated,
-            "server_time": datetime.now().isoformat()
+            **result,
+            "server_time": datetime.datetime.now().isoformat()
         }), 200
         
     except Exception as e:
         print(f"Error polling conversation: {e}")
-        return jsonify({"error": "Failed to poll conversation"}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to poll conversation"}), 500
+
+@messages_bp.route('/conversations/<conversation_id>/stream-token', methods=['POST'])
+@token_required
+def create_stream_token(current_user, conversation_id):
+    """Issue a short-lived token for opening the conversation's event stream"""
+    try:
+        if not conversation_participants_cache.is_participant(conversation_id, current_user['_id']):
+            return jsonify({"error": "Access denied"}), 403
+        
+        return jsonify({
+            "success": True,
+            "token": generate_stream_token(current_user['_id'], conversation_id),
+            "expires_in": int(STREAM_TOKEN_TTL.total_seconds())
+        }), 200
+        
+    except Exception as e:
+        print(f"Error creating stream token: {e}")
+        return jsonify({"error": "Failed to create stream token"}), 500
+
+@messages_bp.route('/conversations/<conversation_id>/stream', methods=['GET'])
+def stream_conversation(conversation_id):
+    """Stream a conversation's events as server-sent events
+
+    Browsers' EventSource can't send an Authorization header, so the
+    stream also accepts ?token= from /stream-token. That token is checked
+    when the stream opens, so a client that reconnects after it expires
+    fetches a new one. fetch()-based clients can send the Bearer header.
+
+    Sends everything after the since seq (or the Last-Event-ID header when
+    the browser reconnects) first, a page at a time, then every event
+    published to the conversation. A message event's id is the highest seq the stream has
+    sent with nothing missing below it, so reconnecting never skips one.
+    """
+    try:
+        user_id = get_optional_user_id()
+        if user_id is None and request.args.get('token'):
+            user_id = verify_stream_token(request.args.get('token'), conversation_id)
+        if user_id is None:
+            return jsonify({"error": "Authentication token required"}), 401
+        
+        if not conversation_participants_cache.is_participant(conversation_id, user_id):
+            return jsonify({"error": "Access denied"}), 403
+        
+        try:
+            since = parse_seq_cursor(request.headers.get('Last-Event-ID') or request.args.get('since'))
+        except ValueError:
+            return jsonify({"error": "since must be a seq"}), 400
+        
+        # Subscribe before catching up so nothing published in between is lost
+        subscription = conversation_events.subscribe(conversation_id)
+        backlog = Message.get_messages_after(conversation_id, since) if since is not None else {"messages": []}
+        
+        socketio = current_app.extensions.get('socketio')
+        sleep = socketio.sleep if socketio else time.sleep
+        
+        # Highest seq sent with no gap below it, and seqs sent past a gap
+        delivered = {"seq": backlog.get("cursor", since)}
+        pending = set()
+        
+        def advance(seq):
+            """Record a sent message's seq, returns the new contiguous seq if it moved"""
+            if seq is None or (delivered["seq"] is not None and seq <= delivered["seq"]):
+                return None
+            if delivered["seq"] is None:
+                delivered["seq"] = seq
+                return seq
+            pending.add(seq)
+            moved = False
+            while delivered["seq"] + 1 in pending:
+                delivered["seq"] += 1
+                pending.discard(delivered["seq"])
+                moved = True
+            return delivered["seq"] if moved else None
+        
+        def format_event(event, data, event_id=None):
+            lines = [f"event: {event}"]
+            if event_id is not None:
+                lines.append(f"id: {event_id}")
+            lines.append(f"data: {json.dumps(data, default=str)}")
+            return "\n".join(lines) + "\n\n"
+        
+        def generate():
+            try:
+                sent_ids = set()
+                page = backlog
+                while True:
+                    for message in page.get("messages", []):
+                        sent_ids.add(message["_id"])
+                        yield format_event('new_message', message, message.get("seq"))
+                    delivered["seq"] = page.get("cursor", delivered["seq"])
+                    if not page.get("has_more"):
+                        break
+                    page = Message.get_messages_after(conversation_id, delivered["seq"])
+                
+                started = time.monotonic()
+                last_write = started
+                while time.monotonic() - started < SSE_MAX_STREAM_SECONDS:
+                    events = subscription.drain()
+                    for event, data in events:
+                        if event == 'new_message':
+                            if data.get("_id") in sent_ids:
+                                continue
+                            yield format_event(event, data, advance(data.get("seq")))
+                        else:
+                            yield format_event(event, data)
+                    
+                    if events:
+                        last_write = time.monotonic()
+                    elif time.monotonic() - last_write >= SSE_HEARTBEAT_SECONDS:
+                        # Comment line keeps proxies from closing an idle stream
+                        yield ": keep-alive\n\n"
+                        last_write = time.monotonic()
+                    
+                    sleep(SSE_POLL_INTERVAL_SECONDS)
+            finally:
+                conversation_events.unsubscribe(subscription)
+        
+        # Later backlog pages are read from inside the stream
+        return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        
+    except Exception as e:
+        print(f"Error streaming conversation: {e}")
+        return jsonify({"error": "Failed to stream conversation"}), 500
@@ -2,7 +2,10 @@ from flask_socketio import emit, join_room, leave_room
 from flask import request, current_app
 from auth.service import verify_token
 from users.models import User
-from messages.models import Message, Conversation
+from messages.models import Message
+from messages.participants_cache import conversation_participants_cache
+from messages.typing import typing_tracker
+from messages.pubsub import conversation_events
 from datetime import datetime
 import logging
 
@@ -13,7 +16,6 @@ logger = logging.getLogger(__name__)
 # In-memory storage for simple session management
 connected_users = {}  # {session_id: user_info}
 user_sessions = {}    # {user_id: [session_ids]}
-typing_users = {}     # {conversation_id: {user_id: timestamp}}
 
 def get_socketio():
     """Get the SocketIO instance from the current app"""
@@ -171,14 +173,14 @@ def handle_join_conversation(socketio, data):
         logger.info(f"👤 User {username} attempting to join conversation {conversation_id}")
         
         # Verify user is part of this conversation
-        conversation = Conversation.get_conversation(conversation_id)
+        participants = conversation_participants_cache.get_participants(conversation_id)
         
-        if not conversation:
+        if not participants:
             logger.warning(f"❌ Conversation {conversation_id} not found")
             emit('error', {'message': 'Conversation not found'})
             return
             
-        if user_id not in conversation['participants']:
+        if user_id not in participants:
             logger.warning(f"❌ User {username} denied access to conversation {conversation_id}")
             emit('error', {'message': 'Access denied to conversation'})
             return
@@ -251,13 +253,13 @@ def handle_send_message(socketio, data):
             return
         
         # Verify user is part of conversation
-        conversation = Conversation.get_conversation(conversation_id)
-        if not conversation:
+        participants = conversation_participants_cache.get_participants(conversation_id)
+        if not participants:
             logger.warning(f"❌ Conversation {conversation_id} not found")
             emit('error', {'message': 'Conversation not found'})
             return
             
-        if user_id not in conversation['participants']:
+        if user_id not in participants:
             logger.warning(f"❌ User {username} denied access to conversation {conversation_id}")
             emit('error', {'message': 'Access denied to conversation'})
             return
@@ -272,7 +274,8 @@ def handle_send_message(socketio, data):
             content=content,
             message_type=message_type,
             attachment_url=attachment_url,
-            attachment_s3_key=attachment_s3_key
+            attachment_s3_key=attachment_s3_key,
+            sender=user_info
         )
         
         if message:
@@ -283,15 +286,11 @@ def handle_send_message(socketio, data):
             # Get SocketIO instance and broadcast
             socketio_instance = get_socketio()
             if socketio_instance:
-                # Emit to all users in the conversation room
-                socketio_instance.emit(
-                    'new_message', 
-                    message, 
-                    room=room_name
-                )
+                # Emit to all users in the conversation room (and its SSE streams)
+                conversation_events.publish(conversation_id, 'new_message', message)
                 
                 # Send notifications to participants not in the room
-                for participant_id in conversation['participants']:
+                for participant_id in participants:
                     if participant_id != user_id:  # Don't notify sender
                         socketio_instance.emit(
                             'new_message_notification',
@@ -307,20 +306,22 @@ def handle_send_message(socketio, data):
                         )
             
             # Confirm to sender
-            emit('message_sent', {
+            confirmation = {
                 'success': True,
                 'message_id': message['_id'],
+                'seq': message['seq'],
                 'timestamp': message['created_at']
-            })
+            }
+            emit('message_sent', confirmation)
             
-            # Clear typing status
-            if conversation_id in typing_users and user_id in typing_users[conversation_id]:
-                del typing_users[conversation_id][user_id]
-                if not typing_users[conversation_id]:
-                    del typing_users[conversation_id]
+            # Clear typing status; the new message tells the room they stopped
+            typing_tracker.clear(conversation_id, user_id)
             
             logger.info(f"✅ Message sent successfully: {message['_id']} from {username}")
             
+            # Also returned as the Socket.IO ack for clients that send with a callback
+            return confirmation
+            
         else:
             logger.error(f"❌ Failed to create message for user {username}")
             emit('error', {'message': 'Failed to send message'})
@@ -329,8 +330,61 @@ def handle_send_message(socketio, data):
         logger.error(f"❌ Error in handle_send_message: {str(e)}", exc_info=True)
         emit('error', {'message': 'Failed to send message'})
 
+def handle_sync_since(data):
+    """Send a reconnecting client the messages it missed
+
+    data is {"cursors": {conversation_id: last_seq}}; conversations the
+    client leaves out resume from the user's last acknowledged seq. Replies
+    with sync_messages, and returns the same payload as the ack.
+    """
+    try:
+        user_info = connected_users.get(request.sid)
+        if not user_info:
+            emit('error', {'message': 'Session not found. Please reconnect.'})
+            return
+        
+        cursors = {}
+        for conversation_id, seq in ((data or {}).get('cursors') or {}).items():
+            try:
+                cursors[conversation_id] = int(seq)
+            except (TypeError, ValueError):
+                continue
+        
+        result = Message.get_messages_since(user_info['user_id'], cursors)
+        if "error" in result:
+            emit('error', {'message': 'Failed to sync messages'})
+            return
+        
+        emit('sync_messages', result)
+        return result
+        
+    except Exception as e:
+        logger.error(f"❌ Error in handle_sync_since: {str(e)}", exc_info=True)
+        emit('error', {'message': 'Failed to sync messages'})
+
+def handle_message_ack(data):
+    """Record that the client has received a conversation's messages up to a seq"""
+    try:
+        user_info = connected_users.get(request.sid)
+        if not user_info:
+            return
+        
+        conversation_id = (data or {}).get('conversation_id')
+        try:
+            seq = int((data or {}).get('seq'))
+        except (TypeError, ValueError):
+            return
+        
+        if not conversation_id or not conversation_participants_cache.is_participant(conversation_id, user_info['user_id']):
+            return
+        
+        Message.acknowledge_delivery(conversation_id, user_info['user_id'], seq)
+        
+    except Exception as e:
+        logger.error(f"❌ Error in handle_message_ack: {str(e)}", exc_info=True)
+
 def handle_typing_start(socketio, data):
-    """Handle typing indicator start"""
+    """Handle typing indicator start (throttled and batched by typing_tracker)"""
     try:
         conversation_id = data.get('conversation_id')
         if not conversation_id:
@@ -342,29 +396,11 @@ def handle_typing_start(socketio, data):
             return
         
         user_id = user_info['user_id']
-        username = user_info['username']
         
-        # Track typing status
-        if conversation_id not in typing_users:
-            typing_users[conversation_id] = {}
-        typing_users[conversation_id][user_id] = datetime.now()
+        if not conversation_participants_cache.is_participant(conversation_id, user_id):
+            return
         
-        # Broadcast typing indicator
-        room_name = f"conversation_{conversation_id}"
-        socketio_instance = get_socketio()
-        if socketio_instance:
-            socketio_instance.emit(
-                'user_typing', 
-                {
-                    'user_id': user_id,
-                    'username': username,
-                    'conversation_id': conversation_id,
-                    'typing': True,
-                    'timestamp': datetime.now().isoformat()
-                },
-                room=room_name,
-                include_self=False
-            )
+        typing_tracker.start(get_socketio(), conversation_id, user_id, user_info['username'])
         
     except Exception as e:
         logger.error(f"❌ Error in handle_typing_start: {str(e)}", exc_info=True)
@@ -382,30 +418,11 @@ def handle_typing_stop(socketio, data):
             return
         
         user_id = user_info['user_id']
-        username = user_info['username']
         
-        # Clear typing status
-        if conversation_id in typing_users and user_id in typing_users[conversation_id]:
-            del typing_users[conversation_id][user_id]
-            if not typing_users[conversation_id]:
-                del typing_users[conversation_id]
+        if not conversation_participants_cache.is_participant(conversation_id, user_id):
+            return
         
-        # Broadcast typing stop
-        room_name = f"conversation_{conversation_id}"
-        socketio_instance = get_socketio()
-        if socketio_instance:
-            socketio_instance.emit(
-                'user_typing', 
-                {
-                    'user_id': user_id,
-                    'username': username,
-                    'conversation_id': conversation_id,
-                    'typing': False,
-                    'timestamp': datetime.now().isoformat()
-                },
-                room=room_name,
-                include_self=False
-            )
+        typing_tracker.stop(get_socketio(), conversation_id, user_id, user_info['username'])
         
     except Exception as e:
         logger.error(f"❌ Error in handle_typing_stop: {str(e)}", exc_info=True)
@@ -427,12 +444,8 @@ def is_user_online(user_id):
 def get_online_users_in_conversation(conversation_id):
     """Get list of online users in a conversation"""
     try:
-        conversation = Conversation.get_conversation(conversation_id)
-        if not conversation:
-            return []
-        
         online_users = []
-        for participant_id in conversation['participants']:
+        for participant_id in conversation_participants_cache.get_participants(conversation_id):
             if is_user_online(participant_id):
                 # Get user info from any of their sessions
                 sessions = get_user_sessions_by_id(participant_id)
@@ -455,39 +468,7 @@ def get_online_users_in_conversation(conversation_id):
 def get_typing_users_in_conversation(conversation_id):
     """Get list of users currently typing in a conversation"""
     try:
-        if conversation_id not in typing_users:
-            return []
-        
-        # Clean up old typing statuses (older than 15 seconds)
-        current_time = datetime.now()
-        expired_users = []
-        
-        for user_id, timestamp in typing_users[conversation_id].items():
-            if (current_time - timestamp).total_seconds() > 15:
-                expired_users.append(user_id)
-        
-        # Remove expired typing statuses
-        for user_id in expired_users:
-            del typing_users[conversation_id][user_id]
-        
-        # Clean up empty conversation
-        if not typing_users[conversation_id]:
-            del typing_users[conversation_id]
-            return []
-        
-        # Return current typing users with their info
-        typing_list = []
-        for user_id in typing_users[conversation_id].keys():
-            sessions = get_user_sessions_by_id(user_id)
-            if sessions:
-                user_info = connected_users.get(sessions[0])
-                if user_info:
-                    typing_list.append({
-                        'user_id': user_id,
-                        'username': user_info['username']
-                    })
-        
-        return typing_list
+        return typing_tracker.get_typing_users(conversation_id)
         
     except Exception as e:
         logger.error(f"Error getting typing users for conversation {conversation_id}: {e}")
@@ -518,11 +499,9 @@ def broadcast_to_conversation(conversation_id, event, data, exclude_user=None):
         
         if exclude_user:
             # Get conversation participants
-            conversation = Conversation.get_conversation(conversation_id)
-            if conversation:
-                for participant_id in conversation['participants']:
-                    if participant_id != exclude_user:
-                        socketio_instance.emit(event, data, room=f"user_{participant_id}")
+            for participant_id in conversation_participants_cache.get_participants(conversation_id):
+                if participant_id != exclude_user:
+                    socketio_instance.emit(event, data, room=f"user_{participant_id}")
         else:
             socketio_instance.emit(event, data, room=room_name)
         
@@ -533,52 +512,16 @@ def broadcast_to_conversation(conversation_id, event, data, exclude_user=None):
         return False
 
 def cleanup_expired_typing():
-    """Clean up expired typing indicators - can be called periodically"""
+    """Clean up expired typing indicators - scheduled on every worker by the maintenance scheduler"""
     try:
-        current_time = datetime.now()
-        conversations_to_remove = []
-        
-        for conversation_id, users in typing_users.items():
-            expired_users = []
-            
-            for user_id, timestamp in users.items():
-                if (current_time - timestamp).total_seconds() > 15:
-                    expired_users.append(user_id)
-            
-            # Remove expired users
-            for user_id in expired_users:
-                del typing_users[conversation_id][user_id]
-                
-                # Broadcast typing stop for expired user
-                sessions = get_user_sessions_by_id(user_id)
-                if sessions:
-                    user_info = connected_users.get(sessions[0])
-                    if user_info:
-                        broadcast_to_conversation(
-                            conversation_id,
-                            'user_typing',
-                            {
-                                'user_id': user_id,
-                                'username': user_info['username'],
-                                'conversation_id': conversation_id,
-                                'typing': False,
-                                'timestamp': current_time.isoformat()
-                            },
-                            exclude_user=user_id
-                        )
-            
-            # Mark empty conversations for removal
-            if not typing_users[conversation_id]:
-                conversations_to_remove.append(conversation_id)
-        
-        # Remove empty conversations
-        for conversation_id in conversations_to_remove:
-            del typing_users[conversation_id]
-        
-        logger.info(f"Cleaned up typing indicators for {len(conversations_to_remove)} conversations")
+        expired = typing_tracker.sweep_expired(get_socketio())
+        if expired:
+            logger.info(f"Cleaned up {expired} expired typing indicators")
+        return expired
         
     except Exception as e:
         logger.error(f"Error cleaning up typing indicators: {e}")
+        return 0
 
 def get_server_stats():
     """Get server statistics for monitoring"""
@@ -586,8 +529,7 @@ def get_server_stats():
         return {
             'connected_sessions': len(connected_users),
             'unique_users_online': len(user_sessions),
-            'active_conversations_with_typing': len(typing_users),
-            'total_typing_users': sum(len(users) for users in typing_users.values())
+            'typing': typing_tracker.get_stats()
         }
     except Exception as e:
         logger.error(f"Error getting server stats: {e}")
@@ -0,0 +1,152 @@
+from datetime import datetime
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TYPING_TIMEOUT_SECONDS = 15  # A user who sends nothing for this long stops typing
+TYPING_REFRESH_SECONDS = 5  # Someone still typing is re-announced at most this often
+TYPING_FLUSH_SECONDS = 0.5  # Changes are held this long and sent as one batch per conversation
+
+
+class TypingTracker:
+    """Who is typing in each conversation, with throttled, batched broadcasts.
+
+    Clients send typing_start on every few keystrokes. Rather than relaying
+    each one, a start only produces an update when the user wasn't already
+    typing or hasn't been announced for TYPING_REFRESH_SECONDS, and a stop
+    only when they were typing. Updates are queued per conversation and a
+    background task sends each conversation's queue as a single
+    typing_batch event after TYPING_FLUSH_SECONDS. The maintenance
+    scheduler calls sweep_expired on every worker to stop users whose
+    client never sent typing_stop.
+
+    State is per process, like the socket sessions it belongs to.
+    """
+
+    def __init__(self):
+        self.typing = {}  # {conversation_id: {user_id: {"username", "last_seen", "last_sent"}}}
+        self._pending = {}  # {conversation_id: {user_id: update}}
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+        self.broadcasts = 0
+        self.suppressed = 0
+
+    def start(self, socketio, conversation_id, user_id, username):
+        now = time.monotonic()
+        with self._lock:
+            users = self.typing.setdefault(conversation_id, {})
+            state = users.get(user_id)
+            if state and now - state["last_sent"] < TYPING_REFRESH_SECONDS:
+                state["last_seen"] = now
+                self.suppressed += 1
+                return
+
+            users[user_id] = {"username": username, "last_seen": now, "last_sent": now}
+            self._queue(conversation_id, user_id, username, True)
+        self._schedule_flush(socketio)
+
+    def stop(self, socketio, conversation_id, user_id, username=None):
+        with self._lock:
+            state = self._remove(conversation_id, user_id)
+            if not state:
+                self.suppressed += 1
+                return
+            self._queue(conversation_id, user_id, username or state["username"], False)
+        self._schedule_flush(socketio)
+
+    def clear(self, conversation_id, user_id):
+        """Forget a user's typing state without announcing it (e.g. they just sent a message)"""
+        with self._lock:
+            self._remove(conversation_id, user_id)
+            self._pending.get(conversation_id, {}).pop(user_id, None)
+
+    def get_typing_users(self, conversation_id):
+        cutoff = time.monotonic() - TYPING_TIMEOUT_SECONDS
+        with self._lock:
+            return [
+                {"user_id": user_id, "username": state["username"]}
+                for user_id, state in self.typing.get(conversation_id, {}).items()
+                if state["last_seen"] >= cutoff
+            ]
+
+    def sweep_expired(self, socketio=None):
+        """Stop users who haven't sent typing_start within the timeout, returns how many"""
+        cutoff = time.monotonic() - TYPING_TIMEOUT_SECONDS
+        expired = 0
+        with self._lock:
+            for conversation_id in list(self.typing):
+                for user_id, state in list(self.typing[conversation_id].items()):
+                    if state["last_seen"] < cutoff:
+                        self._remove(conversation_id, user_id)
+                        self._queue(conversation_id, user_id, state["username"], False)
+                        expired += 1
+        if expired:
+            self._schedule_flush(socketio)
+        return expired
+
+    def flush(self, socketio):
+        """Send every conversation's queued updates as one typing_batch event"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._flush_scheduled = False
+
+        for conversation_id, updates in pending.items():
+            if not updates:
+                continue
+            try:
+                socketio.emit(
+                    'typing_batch',
+                    {'conversation_id': conversation_id, 'updates': list(updates.values())},
+                    room=f"conversation_{conversation_id}"
+                )
+                self.broadcasts += 1
+            except Exception as e:
+                logger.error(f"Error broadcasting typing updates for conversation {conversation_id}: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "conversations_with_typing": len(self.typing),
+                "typing_users": sum(len(users) for users in self.typing.values()),
+                "broadcasts": self.broadcasts,
+                "suppressed": self.suppressed
+            }
+
+    def _remove(self, conversation_id, user_id):
+        users = self.typing.get(conversation_id)
+        if not users:
+            return None
+        state = users.pop(user_id, None)
+        if not users:
+            del self.typing[conversation_id]
+        return state
+
+    def _queue(self, conversation_id, user_id, username, typing):
+        # A later update for the same user replaces an unsent one
+        self._pending.setdefault(conversation_id, {})[user_id] = {
+            'user_id': user_id,
+            'username': username,
+            'conversation_id': conversation_id,
+            'typing': typing,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def _schedule_flush(self, socketio):
+        if socketio is None:
+            return
+        with self._lock:
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+
+        def task():
+            socketio.sleep(TYPING_FLUSH_SECONDS)
+            self.flush(socketio)
+
+        socketio.start_background_task(task)
+
+
+typing_tracker = TypingTracker()
@@ -0,0 +1,114 @@
+"""One-off backfill of event_id/expires_at on event waypoints.
+
+Event waypoints created before event_id was stored were only recognisable by
+their "📅" title prefix and an "Event on YYYY-MM-DD at HH:MM" description.
+This links each one to its event and sets expires_at so the TTL index on
+waypoint.expires_at removes it server-side.
+
+Run from the backend directory:
+    python -m migrations.backfill_event_waypoint_expiry [--test] [--dry-run]
+"""
+from datetime import datetime
+from pymongo import UpdateOne
+from migrations.common import get_migration_db
+from waypoint.models import EVENT_WAYPOINT_GRACE_PERIOD
+import re
+import sys
+
+BATCH_SIZE = 500
+EVENT_DATE_PATTERN = re.compile(r"Event on (\d{4}-\d{2}-\d{2}) at (\d{2}:\d{2})")
+
+
+def find_event(db, waypoint):
+    """Find the event a legacy waypoint was created for (same creator and title)"""
+    title = waypoint.get("title", "")
+    if title.startswith("📅"):
+        title = title[len("📅"):].strip()
+    
+    return db.events.find_one(
+        {"user_id": waypoint.get("user_id"), "title": title},
+        {"_id": 1, "event_datetime": 1},
+        sort=[("created_at", -1)]
+    )
+
+
+def parse_event_datetime(description):
+    """Parse the event time out of a legacy waypoint description"""
+    match = EVENT_DATE_PATTERN.search(description or "")
+    if not match:
+        return None
+    
+    try:
+        return datetime.strptime(f"{match.group(1)} {match.group(2)}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        return None
+
+
+def build_update(db, waypoint):
+    """Build the update for one waypoint, or None if it can't be linked to a time"""
+    update = {}
+    event = find_event(db, waypoint)
+    event_datetime = None
+    
+    if event:
+        update["event_id"] = str(event["_id"])
+        event_datetime = event.get("event_datetime")
+    
+    if not isinstance(event_datetime, datetime):
+        event_datetime = parse_event_datetime(waypoint.get("description"))
+    
+    if event_datetime:
+        expires_at = event_datetime + EVENT_WAYPOINT_GRACE_PERIOD
+        # Never extend an expiry that was already set
+        if not waypoint.get("expires_at") or expires_at < waypoint["expires_at"]:
+            update["expires_at"] = expires_at
+    
+    if not update:
+        return None
+    return UpdateOne({"_id": waypoint["_id"]}, {"$set": update})
+
+
+def run(dry_run=False):
+    db = get_migration_db()
+    
+    # Legacy event waypoints: no event_id field yet
+    cursor = db.waypoint.find(
+        {
+            "event_id": {"$exists": False},
+            "$or": [
+                {"type": "event"},
+                {"title": {"$regex": "^📅"}}
+            ]
+        },
+        {"_id": 1, "user_id": 1, "title": 1, "description": 1, "expires_at": 1}
+    ).batch_size(BATCH_SIZE)
+    
+    scanned = 0
+    updated = 0
+    skipped = 0
+    batch = []
+    
+    for waypoint in cursor:
+        scanned += 1
+        operation = build_update(db, waypoint)
+        
+        if operation is None:
+            skipped += 1
+            continue
+        
+        batch.append(operation)
+        if len(batch) >= BATCH_SIZE:
+            if not dry_run:
+                updated += db.waypoint.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    
+    if batch and not dry_run:
+        updated += db.waypoint.bulk_write(batch, ordered=False).modified_count
+    
+    print(f"✅ Scanned {scanned} event waypoints, updated {updated}, skipped {skipped} without a parseable time")
+    if dry_run:
+        print("   (dry run - no changes written)")
+
+
+if __name__ == "__main__":
+    run(dry_run="--dry-run" in sys.argv)
@@ -0,0 +1,59 @@
+"""Backfill the fields user search matches and ranks on.
+
+User.search_users matches username_prefixes and name_prefixes and
+ranks by followers_count. New users get these fields at registration,
+profile edits keep the name fields current and follows keep
+followers_count current; this sets them on existing users. Until it has
+run, users without them are only found by the substring fallback, which
+only runs when nothing else matches.
+
+Safe to re-run: it recomputes every user's fields from scratch.
+
+Run from the backend directory:
+    python -m migrations.backfill_user_search_fields [--test] [--dry-run]
+"""
+from pymongo import UpdateOne
+from migrations.common import get_migration_db
+from users.models import user_search_fields
+import sys
+
+BATCH_SIZE = 1000
+
+
+def count_followers(db):
+    """Followers per user id (as a string), whichever form following_id is stored in"""
+    pipeline = [
+        {"$group": {"_id": {"$toString": "$following_id"}, "count": {"$sum": 1}}}
+    ]
+    return {doc["_id"]: doc["count"] for doc in db.follows.aggregate(pipeline, allowDiskUse=True)}
+
+
+def run(dry_run=False):
+    db = get_migration_db()
+    followers = count_followers(db)
+
+    scanned = 0
+    updated = 0
+    batch = []
+
+    for user in db.users.find({}, {"username": 1, "full_name": 1}).batch_size(BATCH_SIZE):
+        scanned += 1
+        fields = user_search_fields(user.get("username", ""), user.get("full_name") or "")
+        fields["followers_count"] = followers.get(str(user["_id"]), 0)
+        batch.append(UpdateOne({"_id": user["_id"]}, {"$set": fields}))
+
+        if len(batch) >= BATCH_SIZE:
+            if not dry_run:
+                updated += db.users.bulk_write(batch, ordered=False).modified_count
+            batch = []
+
+    if batch and not dry_run:
+        updated += db.users.bulk_write(batch, ordered=False).modified_count
+
+    print(f"✅ Scanned {scanned} users, updated {updated}")
+    if dry_run:
+        print("   (dry run - no changes written)")
+
+
+if __name__ == "__main__":
+    run(dry_run="--dry-run" in sys.argv)
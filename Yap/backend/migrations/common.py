@@ -0,0 +1,19 @@
+from pymongo import MongoClient
+from dotenv import load_dotenv
+import os
+import sys
+
+load_dotenv()
+
+
+def get_migration_db():
+    """Connect to the same database app.py uses (pass --test for the test database)"""
+    if "--test" in sys.argv or os.getenv("FLASK_ENV") == "testing":
+        mongo_uri = os.getenv("MONGO_TEST_URI")
+        db_name = "unithread_test"
+    else:
+        mongo_uri = os.getenv("MONGO_URI")
+        db_name = "unithread"
+    
+    print(f"📊 Migrating database: {db_name}")
+    return MongoClient(mongo_uri)[db_name]
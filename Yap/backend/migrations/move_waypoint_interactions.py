@@ -0,0 +1,92 @@
+"""Move waypoint joined/liked/bookmarked user arrays into waypoint_interactions.
+
+Each user id in a waypoint's joined_users, liked_users and bookmarked_users
+becomes one row in waypoint_interactions, and the arrays are removed from
+the waypoint document. The interactions.* counters are recomputed from the
+arrays while doing so. Safe to re-run: rows are upserted and only waypoints
+that still have an array are processed.
+
+Run from the backend directory:
+    python -m migrations.move_waypoint_interactions [--test] [--dry-run]
+"""
+from datetime import datetime
+from pymongo import UpdateOne
+from migrations.common import get_migration_db
+import sys
+
+BATCH_SIZE = 200
+
+ARRAY_FIELDS = {
+    "joined_users": ("join", "joins"),
+    "liked_users": ("like", "likes"),
+    "bookmarked_users": ("bookmark", "bookmarks")
+}
+
+
+def run(dry_run=False):
+    db = get_migration_db()
+    
+    cursor = db.waypoint.find(
+        {"$or": [{field: {"$exists": True}} for field in ARRAY_FIELDS]},
+        {"expires_at": 1, "created_at": 1, **{field: 1 for field in ARRAY_FIELDS}}
+    ).batch_size(BATCH_SIZE)
+    
+    waypoints_migrated = 0
+    interactions_written = 0
+    interaction_ops = []
+    waypoint_ops = []
+    
+    def flush():
+        nonlocal interactions_written
+        if dry_run:
+            return
+        # Interactions first, so an interrupted run never loses membership
+        if interaction_ops:
+            result = db.waypoint_interactions.bulk_write(interaction_ops, ordered=False)
+            interactions_written += result.upserted_count
+        if waypoint_ops:
+            db.waypoint.bulk_write(waypoint_ops, ordered=False)
+        interaction_ops.clear()
+        waypoint_ops.clear()
+    
+    for waypoint in cursor:
+        waypoint_id = str(waypoint["_id"])
+        counters = {}
+        
+        for field, (interaction_type, counter) in ARRAY_FIELDS.items():
+            user_ids = list(dict.fromkeys(waypoint.get(field) or []))
+            counters[f"interactions.{counter}"] = len(user_ids)
+            
+            for user_id in user_ids:
+                key = {"waypoint_id": waypoint_id, "user_id": user_id, "type": interaction_type}
+                interaction_ops.append(UpdateOne(
+                    key,
+                    {"$setOnInsert": {
+                        **key,
+                        "created_at": waypoint.get("created_at") or datetime.utcnow(),
+                        "expires_at": waypoint.get("expires_at")
+                    }},
+                    upsert=True
+                ))
+        
+        waypoint_ops.append(UpdateOne(
+            {"_id": waypoint["_id"]},
+            {
+                "$set": counters,
+                "$unset": {field: "" for field in ARRAY_FIELDS}
+            }
+        ))
+        waypoints_migrated += 1
+        
+        if len(waypoint_ops) >= BATCH_SIZE:
+            flush()
+    
+    flush()
+    
+    print(f"✅ Migrated {waypoints_migrated} waypoints, created {interactions_written} interaction rows")
+    if dry_run:
+        print("   (dry run - no changes written)")
+
+
+if __name__ == "__main__":
+    run(dry_run="--dry-run" in sys.argv)
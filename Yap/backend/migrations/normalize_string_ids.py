@@ -0,0 +1,127 @@
+"""Convert documents stored with a string _id to an ObjectId _id.
+
+A handful of old documents were written with their _id as a hex string, which
+is why models used to try ObjectId(id) and then fall back to the raw string.
+shared.ids.canonical_id now assumes ObjectId, so this rewrites those
+documents. References to them (event_id, post_id, ...) are already stored as
+the same hex string, so nothing else needs to change.
+
+_id can't be updated in place, so each batch is copied to
+id_migration_backup, deleted, re-inserted under the ObjectId and then
+removed from the backup. If the script dies part way, the next run restores
+anything still in the backup before carrying on.
+
+Run from the backend directory:
+    python -m migrations.normalize_string_ids [--test] [--dry-run]
+"""
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+from migrations.common import get_migration_db
+import sys
+
+BATCH_SIZE = 500
+BACKUP_COLLECTION = "id_migration_backup"
+COLLECTIONS = [
+    "users", "events", "posts", "comments", "likes", "follows", "attendances",
+    "event_threads", "thread_likes", "waypoint", "whats_on_mind",
+    "conversations", "messages"
+]
+DUPLICATE_KEY_ERROR = 11000
+
+
+def insert_ignoring_duplicates(collection, documents):
+    """Insert documents, skipping any whose _id already exists, returns number inserted"""
+    if not documents:
+        return 0
+    try:
+        return collection.bulk_write([InsertOne(doc) for doc in documents], ordered=False).inserted_count
+    except BulkWriteError as e:
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+            raise
+        return e.details["nInserted"]
+
+
+def restore_from_backup(db, collection_name):
+    """Finish batches left half-done by a previous run"""
+    backup = db[BACKUP_COLLECTION]
+    entries = list(backup.find({"collection": collection_name}))
+    if not entries:
+        return 0
+
+    documents = []
+    for entry in entries:
+        doc = entry["document"]
+        doc["_id"] = ObjectId(doc["_id"])
+        documents.append(doc)
+
+    db[collection_name].delete_many({"_id": {"$in": [str(doc["_id"]) for doc in documents]}})
+    restored = insert_ignoring_duplicates(db[collection_name], documents)
+    backup.delete_many({"_id": {"$in": [entry["_id"] for entry in entries]}})
+    return restored
+
+
+def migrate_batch(db, collection_name, documents):
+    """Move one batch of string-_id documents to ObjectId _ids"""
+    backup = db[BACKUP_COLLECTION]
+    collection = db[collection_name]
+    backup_ids = [f"{collection_name}:{doc['_id']}" for doc in documents]
+
+    backup.bulk_write([
+        ReplaceOne(
+            {"_id": backup_id},
+            {"_id": backup_id, "collection": collection_name, "document": doc},
+            upsert=True
+        )
+        for backup_id, doc in zip(backup_ids, documents)
+    ], ordered=False)
+
+    # Old documents go first so unique indexes (username, email, ...) don't reject the copies
+    collection.bulk_write([DeleteOne({"_id": doc["_id"]}) for doc in documents], ordered=False)
+
+    for doc in documents:
+        doc["_id"] = ObjectId(doc["_id"])
+    inserted = insert_ignoring_duplicates(collection, documents)
+
+    backup.delete_many({"_id": {"$in": backup_ids}})
+    return inserted
+
+
+def run(dry_run=False):
+    db = get_migration_db()
+
+    for collection_name in COLLECTIONS:
+        collection = db[collection_name]
+
+        restored = 0 if dry_run else restore_from_backup(db, collection_name)
+
+        converted = 0
+        invalid = 0
+        batch = []
+
+        for doc in collection.find({"_id": {"$type": "string"}}).batch_size(BATCH_SIZE):
+            if not ObjectId.is_valid(doc["_id"]):
+                # Nothing the app creates looks like this; leave it for a human
+                invalid += 1
+                continue
+
+            batch.append(doc)
+            if len(batch) >= BATCH_SIZE:
+                if not dry_run:
+                    migrate_batch(db, collection_name, batch)
+                converted += len(batch)
+                batch = []
+
+        if batch:
+            if not dry_run:
+                migrate_batch(db, collection_name, batch)
+            converted += len(batch)
+
+        print(f"✅ {collection_name}: converted {converted}, restored {restored}, skipped {invalid} non-ObjectId ids")
+
+    if dry_run:
+        print("   (dry run - no changes written)")
+
+
+if __name__ == "__main__":
+    run(dry_run="--dry-run" in sys.argv)
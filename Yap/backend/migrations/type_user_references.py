@@ -0,0 +1,156 @@
+"""Convert string references (user_id, follower_id, post_id, ...) to ObjectIds.
+
+Most collections stored the ids of the users (and posts) they point at as
+hex strings, so every join had to $toObjectId them first and couldn't use
+the _id index directly. The models now write ObjectIds and, while
+TYPED_IDS_DUAL_READ is on (see shared/ids.py), read either form. This
+converts the existing documents online, in _id order and in batches, saving
+a checkpoint after each batch so it can be stopped and re-run at any point.
+
+Rollout:
+    1. Deploy the app (writes ObjectIds, reads both)
+    2. python -m migrations.type_user_references          [--test] [--dry-run]
+    3. python -m migrations.type_user_references --status  -> all zeros
+    4. Set TYPED_IDS_DUAL_READ=false and restart
+
+Pass --reset to forget the checkpoints and rescan from the beginning.
+"""
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from migrations.common import get_migration_db
+import sys
+
+BATCH_SIZE = 1000
+CHECKPOINT_COLLECTION = "migration_checkpoints"
+MIGRATION_NAME = "type_user_references"
+
+# collection -> reference fields to convert
+REFERENCE_FIELDS = {
+    "posts": ["user_id"],
+    "comments": ["user_id"],
+    "likes": ["user_id", "post_id"],
+    "follows": ["follower_id", "following_id"],
+    "waypoint": ["user_id"],
+    "whats_on_mind": ["user_id", "created_by"],
+    "events": ["user_id"]
+}
+
+
+def checkpoint_id(collection_name):
+    return f"{MIGRATION_NAME}:{collection_name}"
+
+
+def load_checkpoint(db, collection_name):
+    return db[CHECKPOINT_COLLECTION].find_one({"_id": checkpoint_id(collection_name)}) or {}
+
+
+def save_checkpoint(db, collection_name, last_id, converted, completed=False):
+    db[CHECKPOINT_COLLECTION].update_one(
+        {"_id": checkpoint_id(collection_name)},
+        {
+            "$set": {
+                "last_id": last_id,
+                "completed": completed,
+                "updated_at": datetime.utcnow()
+            },
+            "$inc": {"converted": converted}
+        },
+        upsert=True
+    )
+
+
+def build_update(doc, fields):
+    """Build the update for one document, or None if it has nothing to convert"""
+    converted = {}
+    for field in fields:
+        value = doc.get(field)
+        if isinstance(value, str) and ObjectId.is_valid(value):
+            converted[field] = value
+
+    if not converted:
+        return None
+
+    # Only convert a field if it still holds the string we read, so a
+    # concurrent write by the app is never overwritten
+    return UpdateOne(
+        {"_id": doc["_id"], **converted},
+        {"$set": {field: ObjectId(value) for field, value in converted.items()}}
+    )
+
+
+def migrate_collection(db, collection_name, fields, dry_run=False):
+    collection = db[collection_name]
+    checkpoint = load_checkpoint(db, collection_name)
+
+    if checkpoint.get("completed"):
+        print(f"⏭️  {collection_name}: already completed ({checkpoint.get('converted', 0)} converted)")
+        return
+
+    last_id = checkpoint.get("last_id")
+    scanned = 0
+    converted = 0
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(
+            collection.find(query, {field: 1 for field in fields})
+            .sort("_id", 1)
+            .limit(BATCH_SIZE)
+        )
+        if not batch:
+            break
+
+        operations = [op for op in (build_update(doc, fields) for doc in batch) if op]
+        batch_converted = 0
+        if operations and not dry_run:
+            batch_converted = collection.bulk_write(operations, ordered=False).modified_count
+        elif dry_run:
+            batch_converted = len(operations)
+
+        last_id = batch[-1]["_id"]
+        scanned += len(batch)
+        converted += batch_converted
+
+        if not dry_run:
+            save_checkpoint(db, collection_name, last_id, batch_converted)
+
+    if not dry_run:
+        save_checkpoint(db, collection_name, last_id, 0, completed=True)
+
+    print(f"✅ {collection_name}: scanned {scanned}, converted {converted}")
+
+
+def print_status(db):
+    """Show how many string references are left in each collection"""
+    for collection_name, fields in REFERENCE_FIELDS.items():
+        remaining = {
+            field: db[collection_name].count_documents({field: {"$type": "string"}})
+            for field in fields
+        }
+        checkpoint = load_checkpoint(db, collection_name)
+        state = "completed" if checkpoint.get("completed") else "in progress" if checkpoint else "not started"
+        print(f"{collection_name} ({state}): " + ", ".join(f"{field}={count}" for field, count in remaining.items()))
+
+
+def run(dry_run=False, reset=False):
+    db = get_migration_db()
+
+    if reset and not dry_run:
+        db[CHECKPOINT_COLLECTION].delete_many({"_id": {"$regex": f"^{MIGRATION_NAME}:"}})
+        print("🔄 Checkpoints cleared")
+
+    for collection_name, fields in REFERENCE_FIELDS.items():
+        migrate_collection(db, collection_name, fields, dry_run=dry_run)
+
+    if dry_run:
+        print("   (dry run - no changes written)")
+    else:
+        print("Run with --status to confirm nothing is left before disabling TYPED_IDS_DUAL_READ")
+
+
+if __name__ == "__main__":
+    if "--status" in sys.argv:
+        print_status(get_migration_db())
+    else:
+        run(dry_run="--dry-run" in sys.argv, reset="--reset" in sys.argv)
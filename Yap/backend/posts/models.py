@@ -1,5 +1,5 @@
 from datetime import datetime
-from bson import ObjectId
+from shared.ids import canonical_id, ref_match, ref_match_any, lookup_by_ref
 from flask import current_app
 
 class Post:
@@ -11,7 +11,7 @@ class Post:
         
         # Create the format of the post
         post_doc = {
-            "user_id": user_id,
+            "user_id": canonical_id(user_id),
             "username": username,
             "content": content,
             "images": images or [],  # Store image URLs
@@ -25,6 +25,7 @@ class Post:
         
         # Return the created post with its ID
         post_doc["_id"] = str(result.inserted_id)
+        post_doc["user_id"] = str(post_doc["user_id"])
         return post_doc
     
     @staticmethod
@@ -33,21 +34,7 @@ class Post:
         db = current_app.config["DB"]
         
         pipeline = [
-            # Convert string user_id to ObjectId for lookup
-            # Aggregation pipeline completely used AI
-            {
-                "$addFields": {
-                    "user_object_id": {"$toObjectId": "$user_id"}
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "users",
-                    "localField": "user_object_id",
-                    "foreignField": "_id",
-                    "as": "user_info"
-                }
-            },
+            lookup_by_ref("users", "user_id", "user_info"),
             {
                 "$unwind": {
                     "path": "$user_info",
@@ -57,7 +44,7 @@ class Post:
             {
                 "$project": {
                     "_id": {"$toString": "$_id"},
-                    "user_id": 1,
+                    "user_id": {"$toString": "$user_id"},
                     "username": {"$ifNull": ["$user_info.username", "$username"]},  # Fallback to original username
                     "content": 1,
                     "images": {"$ifNull": ["$images", []]},  # Include images array
@@ -76,23 +63,53 @@ class Post:
         return posts
     
     @staticmethod
-    def get_user_posts(user_id, limit=50, skip=0):
-        """Get posts by a specific user with profile picture and images"""
+    def search_posts(query, limit=20, skip=0):
+        """Full-text search over post content, best matches first
+
+        Uses the text index on posts.content, which MongoDB keeps current on
+        every insert, edit and delete.
+        """
         db = current_app.config["DB"]
         
         pipeline = [
-            {"$match": {"user_id": user_id}},
-            # Convert string user_id to ObjectId for lookup
+            {"$match": {"$text": {"$search": query}}},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$sort": {"score": -1, "created_at": -1}},
+            {"$skip": skip},
+            {"$limit": limit},
+            lookup_by_ref("users", "user_id", "user_info"),
             {
-                "$lookup": {
-                    "from": "users",
-                    "let": {"user_id": {"$toObjectId": "$user_id"}},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                    ],
-                    "as": "user_info"
+                "$unwind": {
+                    "path": "$user_info",
+                    "preserveNullAndEmptyArrays": True
                 }
             },
+            {
+                "$project": {
+                    "_id": {"$toString": "$_id"},
+                    "user_id": {"$toString": "$user_id"},
+                    "username": {"$ifNull": ["$user_info.username", "$username"]},
+                    "content": 1,
+                    "images": {"$ifNull": ["$images", []]},
+                    "created_at": 1,
+                    "likes_count": 1,
+                    "comments_count": 1,
+                    "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]},
+                    "score": 1
+                }
+            }
+        ]
+        
+        return list(db.posts.aggregate(pipeline))
+    
+    @staticmethod
+    def get_user_posts(user_id, limit=50, skip=0):
+        """Get posts by a specific user with profile picture and images"""
+        db = current_app.config["DB"]
+        
+        pipeline = [
+            {"$match": {"user_id": ref_match(user_id)}},
+            lookup_by_ref("users", "user_id", "user_info"),
             {
                 "$unwind": {
                     "path": "$user_info",
@@ -102,7 +119,7 @@ class Post:
             {
                 "$project": {
                     "_id": {"$toString": "$_id"},
-                    "user_id": 1,
+                    "user_id": {"$toString": "$user_id"},
                     "username": {"$ifNull": ["$user_info.username", "$username"]},
                     "content": 1,
                     "images": {"$ifNull": ["$images", []]},  # Include images array
@@ -128,101 +145,40 @@ class Post:
         try:
             print(f"Looking for post with ID: {post_id}")
             
-            # Try both ObjectId and string formats
             post = None
-            
-            # First try with ObjectId
-            try:
-                pipeline = [
-                    {"$match": {"_id": ObjectId(post_id)}},
-                    {
-                        "$lookup": {
-                            "from": "users",
-                            "let": {"user_id": {"$toObjectId": "$user_id"}},
-                            "pipeline": [
-                                {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                            ],
-                            "as": "user_info"
-                        }
-                    },
-                    {
-                        "$unwind": {
-                            "path": "$user_info",
-                            "preserveNullAndEmptyArrays": True
-                        }
-                    },
-                    {
-                        "$project": {
-                            "_id": {"$toString": "$_id"},
-                            "user_id": 1,
-                            "username": {"$ifNull": ["$user_info.username", "$username"]},
-                            "content": 1,
-                            "images": {"$ifNull": ["$images", []]},  # Include images array
-                            "created_at": 1,
-                            "likes_count": 1,
-                            "comments_count": 1,
-                            "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]}
-                        }
+            pipeline = [
+                {"$match": {"_id": canonical_id(post_id)}},
+                lookup_by_ref("users", "user_id", "user_info"),
+                {
+                    "$unwind": {
+                        "path": "$user_info",
+                        "preserveNullAndEmptyArrays": True
                     }
-                ]
-                
-                result = list(db.posts.aggregate(pipeline))
-                if result:
-                    post = result[0]
-                    print(f"Found post with ObjectId: {post['_id']}")
-                    
-            except Exception as e:
-                print(f"ObjectId lookup failed: {e}")
+                },
+                {
+                    "$project": {
+                        "_id": {"$toString": "$_id"},
+                        "user_id": {"$toString": "$user_id"},
+                        "username": {"$ifNull": ["$user_info.username", "$username"]},
+                        "content": 1,
+                        "images": {"$ifNull": ["$images", []]},  # Include images array
+                        "created_at": 1,
+                        "likes_count": 1,
+                        "comments_count": 1,
+                        "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]}
+                    }
+                }
+            ]
             
-            # If not found with ObjectId, try with string ID
-            if not post:
-                try:
-                    pipeline = [
-                        {"$match": {"_id": post_id}},  # Try string ID
-                        {
-                            "$lookup": {
-                                "from": "users",
-                                "let": {"user_id": {"$toObjectId": "$user_id"}},
-                                "pipeline": [
-                                    {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                                ],
-                                "as": "user_info"
-                            }
-                        },
-                        {
-                            "$unwind": {
-                                "path": "$user_info",
-                                "preserveNullAndEmptyArrays": True
-                            }
-                        },
-                        {
-                            "$project": {
-                                "_id": 1,  # Keep as string if it's stored as string
-                                "user_id": 1,
-                                "username": {"$ifNull": ["$user_info.username", "$username"]},
-                                "content": 1,
-                                "images": {"$ifNull": ["$images", []]},  # Include images array
-                                "created_at": 1,
-                                "likes_count": 1,
-                                "comments_count": 1,
-                                "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]}
-                            }
-                        }
-                    ]
-                    
-                    result = list(db.posts.aggregate(pipeline))
-                    if result:
-                        post = result[0]
-                        print(f"Found post with string ID: {post['_id']}")
-                        
-                except Exception as e:
-                    print(f"String ID lookup failed: {e}")
+            result = list(db.posts.aggregate(pipeline))
+            if result:
+                post = result[0]
             
             if post:
                 print(f"Successfully found post: {post['username']} - {post['content'][:50]}...")
                 return post
             else:
-                print(f"Post not found with either ObjectId or string ID: {post_id}")
+                print(f"Post not found: {post_id}")
                 return None
                 
         except Exception as e:
@@ -241,8 +197,8 @@ class Post:
             
             # Check if user already liked this post
             existing_like = db.likes.find_one({
-                "post_id": post_id,
-                "user_id": user_id,
+                "post_id": ref_match(post_id),
+                "user_id": ref_match(user_id),
                 "type": "post"
             })
             
@@ -252,41 +208,29 @@ class Post:
                 # Unlike - remove like and decrement count
                 db.likes.delete_one({"_id": existing_like["_id"]})
                 
-                # Update post like count - try both ObjectId and string
-                try:
-                    db.posts.update_one(
-                        {"_id": ObjectId(post_id)},
-                        {"$inc": {"likes_count": -1}}
-                    )
-                except:
-                    db.posts.update_one(
-                        {"_id": post_id},
-                        {"$inc": {"likes_count": -1}}
-                    )
+                # Update post like count
+                db.posts.update_one(
+                    {"_id": canonical_id(post_id)},
+                    {"$inc": {"likes_count": -1}}
+                )
                     
                 print("Post unliked successfully")
                 return {"liked": False, "message": "Post unliked"}
             else:
                 # Like - add like and increment count
                 like_doc = {
-                    "post_id": post_id,
-                    "user_id": user_id,
+                    "post_id": canonical_id(post_id),
+                    "user_id": canonical_id(user_id),
                     "type": "post",
                     "created_at": datetime.utcnow()
                 }
                 db.likes.insert_one(like_doc)
                 
-                # Update post like count - try both ObjectId and string
-                try:
-                    db.posts.update_one(
-                        {"_id": ObjectId(post_id)},
-                        {"$inc": {"likes_count": 1}}
-                    )
-                except:
-                    db.posts.update_one(
-                        {"_id": post_id},
-                        {"$inc": {"likes_count": 1}}
-                    )
+                # Update post like count
+                db.posts.update_one(
+                    {"_id": canonical_id(post_id)},
+                    {"$inc": {"likes_count": 1}}
+                )
                     
                 print("Post liked successfully")
                 return {"liked": True, "message": "Post liked"}
@@ -303,8 +247,8 @@ class Post:
         db = current_app.config["DB"]
         
         like = db.likes.find_one({
-            "post_id": post_id,
-            "user_id": user_id,
+            "post_id": ref_match(post_id),
+            "user_id": ref_match(user_id),
             "type": "post"
         })
         
@@ -319,41 +263,22 @@ class Post:
             pipeline = [
                 {
                     "$match": {
-                        "user_id": user_id,
+                        "user_id": ref_match(user_id),
                         "type": "post"
                     }
                 },
                 {"$sort": {"created_at": -1}},
                 {"$skip": skip},
                 {"$limit": limit},
-                {
-                    "$addFields": {
-                        "post_object_id": {"$toObjectId": "$post_id"}
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "posts",
-                        "localField": "post_object_id",
-                        "foreignField": "_id",
-                        "as": "post_details"
-                    }
-                },
+                lookup_by_ref("posts", "post_id", "post_details"),
                 {"$unwind": "$post_details"},
                 # Add lookup for user info to get profile picture
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "post_details.user_id",
-                        "foreignField": "_id",
-                        "as": "user_info"
-                    }
-                },
+                lookup_by_ref("users", "post_details.user_id", "user_info"),
                 {"$unwind": "$user_info"},
                 {
                     "$project": {
                         "_id": {"$toString": "$post_details._id"},
-                        "user_id": "$post_details.user_id",
+                        "user_id": {"$toString": "$post_details.user_id"},
                         "username": "$user_info.username",  # Get from user_info
                         "content": "$post_details.content",
                         "images": {"$ifNull": ["$post_details.images", []]},  # Include images
@@ -380,7 +305,7 @@ class Post:
         
         try:
             count = db.likes.count_documents({
-                "user_id": user_id,
+                "user_id": ref_match(user_id),
                 "type": "post"
             })
             return count
@@ -399,7 +324,7 @@ class Post:
                 # Match likes by this user for posts
                 {
                     "$match": {
-                        "user_id": user_id,
+                        "user_id": ref_match(user_id),
                         "type": "post"
                     }
                 },
@@ -408,34 +333,12 @@ class Post:
                 # Pagination
                 {"$skip": skip},
                 {"$limit": limit},
-                # Convert post_id string to ObjectId for lookup
-                {
-                    "$addFields": {
-                        "post_object_id": {"$toObjectId": "$post_id"}
-                    }
-                },
                 # Join with posts collection to get full post details
-                {
-                    "$lookup": {
-                        "from": "posts",
-                        "localField": "post_object_id",
-                        "foreignField": "_id",
-                        "as": "post_details"
-                    }
-                },
+                lookup_by_ref("posts", "post_id", "post_details"),
                 # Unwind the post details (should be only one match)
                 {"$unwind": "$post_details"},
                 # Join with users collection to get profile pictures
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "let": {"user_id": {"$toObjectId": "$post_details.user_id"}},
-                        "pipeline": [
-                            {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                        ],
-                        "as": "user_info"
-                    }
-                },
+                lookup_by_ref("users", "post_details.user_id", "user_info"),
                 {
                     "$unwind": {
                         "path": "$user_info",
@@ -446,7 +349,7 @@ class Post:
                 {
                     "$project": {
                         "_id": {"$toString": "$post_details._id"},
-                        "user_id": "$post_details.user_id",
+                        "user_id": {"$toString": "$post_details.user_id"},
                         "username": {"$ifNull": ["$user_info.username", "$post_details.username"]},
                         "content": "$post_details.content",
                         "images": {"$ifNull": ["$post_details.images", []]},  # Include images
@@ -469,13 +372,13 @@ class Post:
                 
                 # Get current user's likes for these posts
                 user_likes = db.likes.find({
-                    "user_id": current_user_id,
-                    "post_id": {"$in": post_ids},
+                    "user_id": ref_match(current_user_id),
+                    "post_id": ref_match_any(post_ids),
                     "type": "post"
                 })
                 
                 # Create a set of post IDs the current user has liked
-                current_user_liked_posts = {like["post_id"] for like in user_likes}
+                current_user_liked_posts = {str(like["post_id"]) for like in user_likes}
                 
                 # Add like status to each post
                 for post in liked_posts:
@@ -497,7 +400,7 @@ class Post:
         try:
             # First, get list of users the current user follows
             following_pipeline = [
-                {"$match": {"follower_id": user_id}},
+                {"$match": {"follower_id": ref_match(user_id)}},
                 {"$project": {"following_id": 1}}
             ]
             
@@ -510,21 +413,8 @@ class Post:
             
             # Get posts from followed users with profile pictures and images
             pipeline = [
-                {"$match": {"user_id": {"$in": following_ids}}},
-                # Convert string user_id to ObjectId for lookup
-                {
-                    "$addFields": {
-                        "user_object_id": {"$toObjectId": "$user_id"}
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "user_object_id",
-                        "foreignField": "_id",
-                        "as": "user_info"
-                    }
-                },
+                {"$match": {"user_id": ref_match_any(following_ids)}},
+                lookup_by_ref("users", "user_id", "user_info"),
                 {
                     "$unwind": {
                         "path": "$user_info",
@@ -534,7 +424,7 @@ class Post:
                 {
                     "$project": {
                         "_id": {"$toString": "$_id"},
-                        "user_id": 1,
+                        "user_id": {"$toString": "$user_id"},
                         "username": {"$ifNull": ["$user_info.username", "$username"]},  # Fallback to original username
                         "content": 1,
                         "images": {"$ifNull": ["$images", []]},  # Include images array
@@ -575,25 +465,17 @@ class Post:
             
             # Delete all likes associated with this post
             db.likes.delete_many({
-                "post_id": post_id,
+                "post_id": ref_match(post_id),
                 "type": "post"
             })
             
             # Delete all comments associated with this post (if you have comments)
             # db.comments.delete_many({"post_id": post_id})
             
-            # Delete the post itself - try both ObjectId and string formats
-            deleted = False
-            try:
-                result = db.posts.delete_one({"_id": ObjectId(post_id)})
-                if result.deleted_count > 0:
-                    deleted = True
-            except:
-                result = db.posts.delete_one({"_id": post_id})
-                if result.deleted_count > 0:
-                    deleted = True
+            # Delete the post itself
+            result = db.posts.delete_one({"_id": canonical_id(post_id)})
             
-            if deleted:
+            if result.deleted_count > 0:
                 return {"success": True, "message": "Post deleted successfully"}
             else:
                 return {"error": "Failed to delete post"}
@@ -180,6 +180,35 @@ def get_feed():
         print(f"Error fetching feed: {e}")
         return jsonify({"error": "Failed to fetch posts"}), 500
 
+@posts_bp.route('/search', methods=['GET'])
+def search_posts():
+    """Search posts by content - PUBLIC route"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "Search query required"}), 400
+        
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            limit = max(1, min(int(request.args.get('limit', 20)), 50))
+        except ValueError:
+            return jsonify({"error": "page and limit must be integers"}), 400
+        skip = (page - 1) * limit
+        
+        posts = Post.search_posts(query, limit=limit, skip=skip)
+        
+        return jsonify({
+            "posts": posts,
+            "query": query,
+            "page": page,
+            "limit": limit,
+            "has_more": len(posts) == limit
+        }), 200
+        
+    except Exception as e:
+        print(f"Error searching posts: {e}")
+        return jsonify({"error": "Failed to search posts"}), 500
+
 @posts_bp.route('/following-feed', methods=['GET'])
 @token_required
 def get_following_feed(current_user):
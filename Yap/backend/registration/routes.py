@@ -25,15 +25,16 @@ def cleanup_expired_registrations():
         
         if result.deleted_count > 0:
             print(f"[CLEANUP] Removed {result.deleted_count} expired pending registrations")
+        
+        return result.deleted_count
             
     except Exception as e:
         print(f"[ERROR] Failed to cleanup expired registrations: {e}")
+        return 0
 
 @registration_bp.route("/register", methods=["POST"])
 def register():
-    # Clean up expired registrations first
-    cleanup_expired_registrations()
-    
+    # Expired registrations are swept by the maintenance scheduler
     data = request.get_json()
     username = data.get("username", "").strip()
     password = data.get("password", "")
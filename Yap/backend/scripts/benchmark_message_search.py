@@ -0,0 +1,188 @@
+"""Benchmark Message.search_messages against a seeded message collection.
+
+Seeds a throwaway database with users, direct conversations and messages
+drawn from a fixed vocabulary, builds the same message indexes app.py
+does, then times search_messages for a sample of users and queries and
+prints latency percentiles plus the explain() counters for one query of
+each kind.
+
+The $text stage is answered from the global text index on
+messages.content before conversation_id narrows it to the user's
+conversations, so docs/keys examined grow with how common a term is
+across all messages, not within one user's conversations. Common-term
+queries are the case to watch as the collection grows; searches are cut
+off after MESSAGE_SEARCH_MAX_TIME_MS, and the timeouts column counts how
+many of the sampled searches hit that limit.
+
+It never touches the app's databases: it writes to its own database
+(dropped afterwards unless --keep) on MONGO_TEST_URI.
+
+Run from the backend directory:
+    python -m scripts.benchmark_message_search [--messages 2000000] [--keep]
+"""
+from datetime import datetime, timedelta
+from flask import Flask
+from pymongo import MongoClient, TEXT
+from dotenv import load_dotenv
+import argparse
+import os
+import random
+import statistics
+import time
+
+load_dotenv()
+
+BENCHMARK_DB = "unithread_search_benchmark"
+INSERT_BATCH_SIZE = 10000
+
+# Word frequencies roughly follow chat text: a few very common words, a long tail of rare ones
+COMMON_WORDS = ["hey", "today", "class", "lunch", "meeting", "tonight", "thanks", "campus", "library", "later"]
+RARE_WORDS = [f"term{i}" for i in range(5000)]
+FILLER_WORDS = ["the", "a", "at", "is", "are", "you", "we", "i", "for", "to", "and", "see", "going", "be"]
+
+# (label, query) pairs; each is timed for every sampled user
+QUERIES = [
+    ("common", "lunch"),
+    ("common pair", "meeting tonight"),
+    ("rare", "term42"),
+    ("missing", "zzzznotaword")
+]
+
+
+def random_content(rng):
+    words = rng.choices(FILLER_WORDS, k=rng.randint(3, 10))
+    words.append(rng.choice(COMMON_WORDS))
+    if rng.random() < 0.3:
+        words.append(rng.choice(RARE_WORDS))
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def seed(db, users, conversations, messages, rng):
+    print(f"🌱 Seeding {users} users, {conversations} conversations, {messages} messages")
+    started = time.monotonic()
+
+    user_ids = db.users.insert_many(
+        [{"username": f"bench_user_{i}", "profile_picture": ""} for i in range(users)]
+    ).inserted_ids
+    user_ids = [str(user_id) for user_id in user_ids]
+
+    conversation_docs = []
+    for _ in range(conversations):
+        participants = sorted(rng.sample(user_ids, 2))
+        conversation_docs.append({"participants": participants, "seq": 0, "last_read_seq": {}})
+    conversation_ids = db.conversations.insert_many(conversation_docs).inserted_ids
+    participants_by_conversation = dict(zip(conversation_ids, (doc["participants"] for doc in conversation_docs)))
+
+    seqs = {conversation_id: 0 for conversation_id in conversation_ids}
+    now = datetime.utcnow()
+    batch = []
+    for i in range(messages):
+        conversation_id = rng.choice(conversation_ids)
+        seqs[conversation_id] += 1
+        batch.append({
+            "conversation_id": conversation_id,
+            "seq": seqs[conversation_id],
+            "sender_id": rng.choice(participants_by_conversation[conversation_id]),
+            "content": random_content(rng),
+            "created_at": now - timedelta(seconds=messages - i),
+            "message_type": "text"
+        })
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.messages.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.messages.insert_many(batch, ordered=False)
+
+    for conversation_id, seq in seqs.items():
+        if seq:
+            db.conversations.update_one({"_id": conversation_id}, {"$set": {"seq": seq}})
+
+    print(f"   seeded in {time.monotonic() - started:.1f}s")
+    return user_ids
+
+
+def build_indexes(db):
+    # The indexes setup_message_indexes in app.py creates
+    started = time.monotonic()
+    db.conversations.create_index([("participants", 1)])
+    db.messages.create_index([("conversation_id", 1), ("seq", 1)])
+    db.messages.create_index([("conversation_id", 1), ("created_at", -1)])
+    db.messages.create_index([("content", TEXT)], default_language="english")
+    print(f"🗂️  Indexes built in {time.monotonic() - started:.1f}s")
+
+
+def explain_query(db, user_id, query):
+    conversation_ids = [conv["_id"] for conv in db.conversations.find({"participants": user_id}, {"_id": 1})]
+    plan = db.messages.find(
+        {"$text": {"$search": query}, "conversation_id": {"$in": conversation_ids}},
+        {"score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"}), ("created_at", -1)]).limit(20).explain()
+    stats = plan.get("executionStats", {})
+    return stats.get("totalKeysExamined"), stats.get("totalDocsExamined"), stats.get("nReturned")
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_benchmark(db, user_ids, sample_users, rng):
+    from messages.models import Message
+
+    app = Flask(__name__)
+    app.config["DB"] = db
+    sampled = rng.sample(user_ids, min(sample_users, len(user_ids)))
+
+    with app.app_context():
+        print(f"\n⏱️  search_messages over {sample_users} users (ms)")
+        print(f"   {'query':<14}{'p50':>8}{'p95':>8}{'max':>8}{'timeouts':>10}   keys/docs examined, returned")
+        for label, query in QUERIES:
+            timings = []
+            timeouts = 0
+            for user_id in sampled:
+                started = time.perf_counter()
+                result = Message.search_messages(user_id, query)
+                timings.append((time.perf_counter() - started) * 1000)
+                if result.get("timed_out"):
+                    timeouts += 1
+                elif "error" in result:
+                    raise RuntimeError(result["error"])
+
+            keys, docs, returned = explain_query(db, sampled[0], query)
+            print(
+                f"   {label:<14}{statistics.median(timings):>8.1f}{percentile(timings, 0.95):>8.1f}"
+                f"{max(timings):>8.1f}{timeouts:>10}   {keys}/{docs}, {returned}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--conversations", type=int, default=200000)
+    parser.add_argument("--messages", type=int, default=2000000)
+    parser.add_argument("--sample-users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark database afterwards")
+    args = parser.parse_args()
+
+    mongo_uri = os.getenv("MONGO_TEST_URI")
+    if not mongo_uri:
+        raise SystemExit("MONGO_TEST_URI must be set; the benchmark never runs against the app database")
+
+    client = MongoClient(mongo_uri)
+    client.drop_database(BENCHMARK_DB)
+    db = client[BENCHMARK_DB]
+    rng = random.Random(args.seed)
+
+    try:
+        user_ids = seed(db, args.users, args.conversations, args.messages, rng)
+        build_indexes(db)
+        run_benchmark(db, user_ids, args.sample_users, rng)
+    finally:
+        if not args.keep:
+            client.drop_database(BENCHMARK_DB)
+
+
+if __name__ == "__main__":
+    main()
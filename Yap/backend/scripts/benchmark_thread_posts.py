@@ -0,0 +1,180 @@
+"""Count the database commands one event thread page costs.
+
+Seeds a throwaway database with one event thread (top-level posts with
+replies, images and likes), builds the same indexes app.py does, then
+calls EventThread.get_thread_posts_with_secure_urls for pages of each
+size and prints the commands the client sent, counted with a pymongo
+CommandListener, plus the call latency.
+
+The replies, authors and like flags come back from $lookup stages inside
+one aggregation, so the command count should be the same for every page
+size: the attendance check plus one aggregate (and a getMore if a page
+outgrows the first batch).
+
+It never touches the app's databases: it writes to its own database
+(dropped afterwards unless --keep) on MONGO_TEST_URI.
+
+Run from the backend directory:
+    python -m scripts.benchmark_thread_posts [--posts 500] [--page-sizes 20 100] [--keep]
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import Flask
+from pymongo import MongoClient, monitoring
+from dotenv import load_dotenv
+import argparse
+import os
+import random
+import statistics
+import time
+
+load_dotenv()
+
+BENCHMARK_DB = "unithread_thread_benchmark"
+RUNS_PER_PAGE_SIZE = 20
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the benchmark database by name"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.enabled = False
+
+    def started(self, event):
+        if self.enabled and event.database_name == BENCHMARK_DB:
+            self.counts[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, users, posts, max_replies, rng):
+    print(f"🌱 Seeding {users} users and {posts} posts with up to {max_replies} replies each")
+    started = time.monotonic()
+
+    user_ids = db.users.insert_many(
+        [{"username": f"bench_user_{i}", "full_name": f"Bench User {i}", "profile_picture": ""} for i in range(users)]
+    ).inserted_ids
+    user_ids = [str(user_id) for user_id in user_ids]
+    event_id = str(db.events.insert_one({"title": "Benchmark event", "is_active": True}).inserted_id)
+    db.attendances.insert_many([{"event_id": event_id, "user_id": user_id} for user_id in user_ids])
+
+    now = datetime.utcnow()
+
+    def post_doc(created_at, reply_to=None):
+        author = rng.randrange(len(user_ids))
+        return {
+            "event_id": event_id,
+            "user_id": user_ids[author],
+            "username": f"bench_user_{author}",
+            "content": "benchmark post",
+            "post_type": "text",
+            "s3_keys": [f"event_threads/{event_id}/{rng.getrandbits(64):x}.jpg"] if rng.random() < 0.3 else [],
+            "reply_to": reply_to,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "likes_count": 0,
+            "replies_count": 0,
+            "is_deleted": False
+        }
+
+    top_level = [post_doc(now - timedelta(minutes=posts - i)) for i in range(posts)]
+    post_ids = [str(post_id) for post_id in db.event_threads.insert_many(top_level).inserted_ids]
+
+    replies = []
+    likes = []
+    for post_id, post in zip(post_ids, top_level):
+        reply_count = rng.randint(0, max_replies)
+        replies.extend(post_doc(post["created_at"] + timedelta(seconds=i + 1), post_id) for i in range(reply_count))
+        likers = rng.sample(user_ids, rng.randint(0, min(10, len(user_ids))))
+        likes.extend({"post_id": post_id, "user_id": user_id, "created_at": now} for user_id in likers)
+        db.event_threads.update_one(
+            {"_id": post["_id"]},
+            {"$set": {"replies_count": reply_count, "likes_count": len(likers)}}
+        )
+    if replies:
+        db.event_threads.insert_many(replies)
+    if likes:
+        db.thread_likes.insert_many(likes)
+
+    print(f"   seeded in {time.monotonic() - started:.1f}s")
+    return event_id, user_ids
+
+
+def build_indexes(db):
+    # The indexes setup_event_indexes and setup_event_thread_indexes in app.py create
+    db.attendances.create_index([("event_id", 1), ("user_id", 1)])
+    db.event_threads.create_index([("event_id", 1), ("reply_to", 1), ("is_deleted", 1), ("created_at", -1)])
+    db.event_threads.create_index([("reply_to", 1), ("is_deleted", 1), ("created_at", 1)])
+    db.thread_likes.create_index([("post_id", 1), ("user_id", 1)])
+
+
+def run_benchmark(db, counter, event_id, user_ids, page_sizes, rng):
+    from eventthreads.models import EventThread
+
+    app = Flask(__name__)
+    app.config["DB"] = db
+    app.config["S3_CONFIG"] = {"private_bucket": "benchmark-private"}  # URLs are signed locally, no S3 calls
+
+    with app.app_context():
+        print("\n⏱️  get_thread_posts_with_secure_urls")
+        print(f"   {'page':>6}{'posts':>7}{'replies':>9}   commands per page{'p50 ms':>22}{'max ms':>8}")
+        for page_size in page_sizes:
+            counts = set()
+            timings = []
+            for _ in range(RUNS_PER_PAGE_SIZE):
+                counter.counts.clear()
+                counter.enabled = True
+                started = time.perf_counter()
+                posts = EventThread.get_thread_posts_with_secure_urls(event_id, rng.choice(user_ids), limit=page_size)
+                timings.append((time.perf_counter() - started) * 1000)
+                counter.enabled = False
+                if isinstance(posts, dict):
+                    raise RuntimeError(posts["error"])
+                counts.add(tuple(sorted(counter.counts.items())))
+
+            replies = sum(len(post.get("replies", [])) for post in posts)
+            commands = ", ".join(
+                " / ".join(f"{name} x{count}" for name, count in run) for run in sorted(counts)
+            )
+            print(
+                f"   {page_size:>6}{len(posts):>7}{replies:>9}   {commands:<30}"
+                f"{statistics.median(timings):>9.1f}{max(timings):>8.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--max-replies", type=int, default=15)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark database afterwards")
+    args = parser.parse_args()
+
+    mongo_uri = os.getenv("MONGO_TEST_URI")
+    if not mongo_uri:
+        raise SystemExit("MONGO_TEST_URI must be set; the benchmark never runs against the app database")
+
+    counter = CommandCounter()
+    client = MongoClient(mongo_uri, event_listeners=[counter])
+    client.drop_database(BENCHMARK_DB)
+    db = client[BENCHMARK_DB]
+    rng = random.Random(args.seed)
+
+    try:
+        event_id, user_ids = seed(db, args.users, args.posts, args.max_replies, rng)
+        build_indexes(db)
+        run_benchmark(db, counter, event_id, user_ids, args.page_sizes, rng)
+    finally:
+        if not args.keep:
+            client.drop_database(BENCHMARK_DB)
+
+
+if __name__ == "__main__":
+    main()
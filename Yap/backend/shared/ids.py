@@ -0,0 +1,93 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+import os
+
+# References to users (user_id, follower_id, following_id) are being moved
+# from hex strings to ObjectIds by migrations/type_user_references.py. Until
+# it has finished, reads match both forms; set TYPED_IDS_DUAL_READ=false
+# once it reports nothing left to convert.
+TYPED_IDS_DUAL_READ = os.getenv("TYPED_IDS_DUAL_READ", "true").lower() != "false"
+
+
+def to_object_id(value):
+    """Convert an id string to an ObjectId, returns None if it isn't a valid ObjectId"""
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+def canonical_id(value):
+    """Get the value a document's _id (or a typed reference) is stored under for an id string
+
+    Every _id is an ObjectId once migrations/normalize_string_ids.py has run,
+    so a valid id string is converted once and used for a single query. Ids
+    that aren't valid ObjectIds can't match anything we create, but are
+    passed through unchanged so lookups simply miss instead of raising.
+    """
+    object_id = to_object_id(value)
+    return object_id if object_id is not None else value
+
+
+def to_object_ids(values):
+    """Convert a list of id strings to ObjectIds, dropping any that are invalid"""
+    object_ids = []
+    for value in values:
+        object_id = to_object_id(value)
+        if object_id is not None:
+            object_ids.append(object_id)
+    return object_ids
+
+
+def ref_match(value):
+    """Query value for a reference field pointing at value's id"""
+    object_id = to_object_id(value)
+    if object_id is None:
+        return value
+    if TYPED_IDS_DUAL_READ:
+        return {"$in": [object_id, str(object_id)]}
+    return object_id
+
+
+def ref_match_any(values):
+    """Query value for a reference field pointing at any of values' ids"""
+    object_ids = to_object_ids(values)
+    if TYPED_IDS_DUAL_READ:
+        return {"$in": object_ids + [str(object_id) for object_id in object_ids]}
+    return {"$in": object_ids}
+
+
+def lookup_by_ref(from_collection, local_field, as_field, legacy_strings=False):
+    """$lookup stage joining from_collection's _id on a reference field
+
+    Once every reference is an ObjectId this is a plain localField join on
+    the _id index. During the rollout, or for collections that still store
+    references as strings (legacy_strings=True), they are converted inside
+    the lookup instead.
+    """
+    if not TYPED_IDS_DUAL_READ and not legacy_strings:
+        return {
+            "$lookup": {
+                "from": from_collection,
+                "localField": local_field,
+                "foreignField": "_id",
+                "as": as_field
+            }
+        }
+
+    return {
+        "$lookup": {
+            "from": from_collection,
+            "let": {
+                "ref_id": {
+                    "$convert": {"input": f"${local_field}", "to": "objectId", "onError": None, "onNull": None}
+                }
+            },
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$ref_id"]}}}
+            ],
+            "as": as_field
+        }
+    }
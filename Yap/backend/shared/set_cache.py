@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class SetCache:
+    """LRU of frozensets with a TTL, loaded on miss"""
+
+    def __init__(self, loader, ttl_seconds, max_entries):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Bumped on every write to a key so a load that raced with it isn't cached
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            version = self._versions.get(key, 0)
+
+        # Load outside the lock so one slow query doesn't block other lookups
+        value = frozenset(self.loader(key))
+
+        with self._lock:
+            if self._versions.get(key, 0) != version:
+                return value
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def peek(self, key):
+        """The cached set for key, or None if it isn't cached (never loads)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self.hits += 1
+                return entry[1]
+            return None
+
+    def _bump(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+        if len(self._versions) > self.max_entries * 2:
+            # Only in-flight loads care about versions, so old ones can go
+            self._versions = {k: v for k, v in self._versions.items() if k in self._entries}
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._bump(key)
+
+    def set(self, key, members):
+        """Store a set that is already known, e.g. for a just-created document"""
+        with self._lock:
+            self._bump(key)
+            self._entries[key] = (time.monotonic(), frozenset(members))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, member):
+        """Add a member to a cached set in place of dropping it"""
+        with self._lock:
+            self._bump(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1] | {member})
+
+    def discard(self, key, member):
+        with self._lock:
+            self._bump(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1] - {member})
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl_seconds
+            }
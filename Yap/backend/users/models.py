@@ -1,10 +1,45 @@
 from datetime import datetime
 from bson import ObjectId
+from shared.ids import canonical_id, ref_match, lookup_by_ref
 from flask import current_app
 import re
+from events.friends_cache import friends_attending_cache
+
+USER_SEARCH_FALLBACK_MIN_LENGTH = 3  # Shorter queries only get prefix matches
+USER_SEARCH_PREFIX_LENGTH = 10  # Longest prefix stored; longer queries are narrowed with a regex
+
+# Fields returned for each search result
+USER_SEARCH_PROJECTION = {
+    "username": 1, "email": 1, "created_at": 1, "profile_picture": 1,
+    "full_name": 1, "is_verified": 1, "followers_count": 1
+}
+
+def _prefixes(word):
+    return [word[:length] for length in range(1, min(len(word), USER_SEARCH_PREFIX_LENGTH) + 1)]
+
+def user_search_fields(username=None, full_name=None):
+    """Normalized fields user search matches against
+
+    username_prefixes and name_prefixes hold every prefix (up to
+    USER_SEARCH_PREFIX_LENGTH characters) of the lowercased username and
+    of each word of the full name, so "smi" finds "John Smith" with an
+    equality match. Each is indexed together with followers_count, so the
+    most-followed matches are read straight off the index. username_lower
+    and name_tokens narrow longer queries and find exact usernames.
+    """
+    fields = {}
+    if username is not None:
+        fields["username_lower"] = username.lower()
+        fields["username_prefixes"] = _prefixes(fields["username_lower"])
+    if full_name is not None:
+        fields["name_tokens"] = sorted(set(re.findall(r"\w+", full_name.lower())))
+        fields["name_prefixes"] = sorted({prefix for token in fields["name_tokens"] for prefix in _prefixes(token)})
+    return fields
 
 def create_user_document(username, hashed_password):
     return {
+        **user_search_fields(username, ""),
+        "followers_count": 0,
         "username": username,
         "password": hashed_password,
         "is_verified": False,
@@ -23,36 +58,68 @@ def create_user_document(username, hashed_password):
 class User:
     @staticmethod
     def search_users(query, limit=20, skip=0):
-        """Search users by username"""
+        """Search users by username or name, most-followed first
+
+        Matches are prefixes of the lowercased username or of any word of
+        the full name (every word of the query must match one). Both are
+        equality lookups on username_prefixes / name_prefixes, whose
+        indexes are ordered by followers_count, so neither the match nor
+        the ranking scans or sorts the collection. An exact username match
+        always comes first. Only when nothing matches a prefix does a
+        longer query fall back to a substring match, which can't use an
+        index.
+        """
         db = current_app.config["DB"]
+        normalized = query.strip().lower()
+        words = re.findall(r"\w+", normalized)
         
-        # Create case-insensitive regex pattern
-        pattern = re.compile(f".*{re.escape(query)}.*", re.IGNORECASE)
+        exact = db.users.find_one({"username_lower": normalized}, USER_SEARCH_PROJECTION)
+        excluded = {"_id": {"$ne": exact["_id"]}} if exact else {}
         
-        pipeline = [
-            {
-                "$match": {
-                    "username": {"$regex": pattern}
-                }
-            },
-            {"$skip": skip},
-            {"$limit": limit},
-            {
-                "$project": {
-                    "_id": {"$toString": "$_id"},
-                    "username": 1,
-                    "email": 1,
-                    "created_at": 1,
-                    "profile_picture": 1, 
-                    "full_name": 1,   
-                    "is_verified": 1  
-                }
-            }
-        ]
+        username_match = {"username_prefixes": normalized[:USER_SEARCH_PREFIX_LENGTH], **excluded}
+        if len(normalized) > USER_SEARCH_PREFIX_LENGTH:
+            username_match["username_lower"] = {"$regex": f"^{re.escape(normalized)}"}
+        prefix_match = [username_match]
+        if words:
+            prefix_match.append({
+                "name_prefixes": words[0][:USER_SEARCH_PREFIX_LENGTH],
+                "name_tokens": {"$all": [re.compile(f"^{re.escape(word)}") for word in words]},
+                **excluded
+            })
         
-        users = list(db.users.aggregate(pipeline))
+        # The exact match takes the first slot of page one
+        if exact and skip == 0:
+            users = [exact] + User._search_users_page(db, {"$or": prefix_match}, limit - 1, 0)
+        else:
+            users = User._search_users_page(db, {"$or": prefix_match}, limit, max(0, skip - (1 if exact else 0)))
+        
+        if skip == 0 and not users and len(normalized) >= USER_SEARCH_FALLBACK_MIN_LENGTH:
+            pattern = re.compile(re.escape(normalized), re.IGNORECASE)
+            users = User._search_users_page(
+                db,
+                {"$or": [{"username": {"$regex": pattern}}, {"full_name": {"$regex": pattern}}]},
+                limit,
+                0
+            )
+        
+        for user in users:
+            user["_id"] = str(user["_id"])
+            user["followers_count"] = user.get("followers_count", 0)
         return users
     
+    @staticmethod
+    def _search_users_page(db, match, limit, skip):
+        if limit <= 0:
+            return []
+        
+        cursor = (
+            db.users.find(match, USER_SEARCH_PROJECTION)
+            .sort([("followers_count", -1), ("username_lower", 1)])
+            .skip(skip)
+            .limit(limit)
+        )
+        return list(cursor)
+    
     @staticmethod
     def get_user_profile(user_id):
         """Get user profile with stats"""
@@ -65,11 +132,11 @@ class User:
                 return None
             
             # Count posts by this user
-            posts_count = db.posts.count_documents({"user_id": user_id})
+            posts_count = db.posts.count_documents({"user_id": ref_match(user_id)})
             
             # Count followers and following
-            followers_count = db.follows.count_documents({"following_id": user_id})
-            following_count = db.follows.count_documents({"follower_id": user_id})
+            followers_count = db.follows.count_documents({"following_id": ref_match(user_id)})
+            following_count = db.follows.count_documents({"follower_id": ref_match(user_id)})
             
             # Prepare profile data
             profile = {
@@ -111,11 +178,11 @@ class User:
                 return None
             
             # Count posts by this user
-            posts_count = db.posts.count_documents({"user_id": user_id})
+            posts_count = db.posts.count_documents({"user_id": ref_match(user_id)})
             
             # Count followers and following
-            followers_count = db.follows.count_documents({"following_id": user_id})
-            following_count = db.follows.count_documents({"follower_id": user_id})
+            followers_count = db.follows.count_documents({"following_id": ref_match(user_id)})
+            following_count = db.follows.count_documents({"follower_id": ref_match(user_id)})
             
             # Check if current user is following this user
             is_following = False
@@ -189,6 +256,10 @@ class User:
             if not update_doc:
                 return {"error": "No valid fields to update"}
             
+            # Keep the search tokens in step with the name
+            if 'full_name' in update_doc:
+                update_doc.update(user_search_fields(full_name=update_doc['full_name'] or ""))
+            
             # Add updated timestamp
             update_doc['updated_at'] = datetime.now()
             
@@ -221,15 +292,15 @@ class User:
                 return None
             
             # Count posts by this user
-            posts_count = db.posts.count_documents({"user_id": user_id})
+            posts_count = db.posts.count_documents({"user_id": ref_match(user_id)})
             
             # Count followers and following
-            followers_count = db.follows.count_documents({"following_id": user_id})
-            following_count = db.follows.count_documents({"follower_id": user_id})
+            followers_count = db.follows.count_documents({"following_id": ref_match(user_id)})
+            following_count = db.follows.count_documents({"follower_id": ref_match(user_id)})
             
             # Count liked posts by this user
             liked_posts_count = db.likes.count_documents({
-                "user_id": user_id,
+                "user_id": ref_match(user_id),
                 "type": "post"
             })
             
@@ -280,22 +351,26 @@ class Follow:
         try:
             # check if already following
             existing_follow = db.follows.find_one({
-                "follower_id": follower_id,
-                "following_id": following_id
+                "follower_id": ref_match(follower_id),
+                "following_id": ref_match(following_id)
             })
             
             if existing_follow:
                 # Unfollow - remove follow relationship
                 db.follows.delete_one({"_id": existing_follow["_id"]})
+                db.users.update_one({"_id": canonical_id(following_id)}, {"$inc": {"followers_count": -1}})
+                friends_attending_cache.invalidate_user(follower_id)
                 return {"following": False, "message": "Unfollowed user"}
             else:
                 # Follow - create follow relationship
                 follow_doc = {
-                    "follower_id": follower_id,
-                    "following_id": following_id,
+                    "follower_id": canonical_id(follower_id),
+                    "following_id": canonical_id(following_id),
                     "created_at": datetime.utcnow()
                 }
                 db.follows.insert_one(follow_doc)
+                db.users.update_one({"_id": canonical_id(following_id)}, {"$inc": {"followers_count": 1}})
+                friends_attending_cache.invalidate_user(follower_id)
                 return {"following": True, "message": "Following user"}
                 
         except Exception as e:
@@ -307,8 +382,8 @@ class Follow:
         db = current_app.config["DB"]
         
         follow = db.follows.find_one({
-            "follower_id": follower_id,
-            "following_id": following_id
+            "follower_id": ref_match(follower_id),
+            "following_id": ref_match(following_id)
         })
         
         return follow is not None
@@ -319,20 +394,11 @@ class Follow:
         db = current_app.config["DB"]
         
         pipeline = [
-            {"$match": {"following_id": user_id}},
+            {"$match": {"following_id": ref_match(user_id)}},
             {"$sort": {"created_at": -1}},
             {"$skip": skip},
             {"$limit": limit},
-            {
-                "$lookup": {
-                    "from": "users",
-                    "let": {"follower_object_id": {"$toObjectId": "$follower_id"}},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$_id", "$$follower_object_id"]}}}
-                    ],
-                    "as": "follower_info"
-                }
-            },
+            lookup_by_ref("users", "follower_id", "follower_info"),
             {"$unwind": "$follower_info"},
             {
                 "$project": {
@@ -354,20 +420,11 @@ class Follow:
         db = current_app.config["DB"]
         
         pipeline = [
-            {"$match": {"follower_id": user_id}},
+            {"$match": {"follower_id": ref_match(user_id)}},
             {"$sort": {"created_at": -1}},
             {"$skip": skip},
             {"$limit": limit},
-            {
-                "$lookup": {
-                    "from": "users",
-                    "let": {"following_object_id": {"$toObjectId": "$following_id"}},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$_id", "$$following_object_id"]}}}
-                    ],
-                    "as": "following_info"
-                }
-            },
+            lookup_by_ref("users", "following_id", "following_info"),
             {"$unwind": "$following_info"},
             {
                 "$project": {
@@ -390,8 +447,8 @@ class Follow:
         
         try:
             # Step 1: Get all users that the target user follows
-            users_i_follow = db.follows.find({"follower_id": user_id})
-            following_ids = [follow["following_id"] for follow in users_i_follow]
+            users_i_follow = db.follows.find({"follower_id": ref_match(user_id)})
+            following_ids = [str(follow["following_id"]) for follow in users_i_follow]
             
             if not following_ids:
                 return []
@@ -401,8 +458,8 @@ class Follow:
             for following_id in following_ids:
                 # Check if this user also follows me back
                 follows_me_back = db.follows.find_one({
-                    "follower_id": following_id,
-                    "following_id": user_id
+                    "follower_id": ref_match(following_id),
+                    "following_id": ref_match(user_id)
                 })
                 
                 if follows_me_back:
@@ -411,8 +468,8 @@ class Follow:
                     if user_info:
                         # Get the original follow date
                         original_follow = db.follows.find_one({
-                            "follower_id": user_id,
-                            "following_id": following_id
+                            "follower_id": ref_match(user_id),
+                            "following_id": ref_match(following_id)
                         })
                         
                         friend_data = {
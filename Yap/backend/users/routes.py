@@ -11,6 +11,7 @@ import uuid
 from botocore.exceptions import ClientError
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+USER_SEARCH_CACHE_SECONDS = 30  # Browser cache for typeahead results
 
 def get_s3_client():
     """Get S3 client"""
@@ -51,18 +52,24 @@ def search_users():
         if len(query) < 2:
             return jsonify({"error": "Search query must be at least 2 characters"}), 400
         
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 20))
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            limit = max(1, min(int(request.args.get('limit', 20)), 50))
+        except ValueError:
+            return jsonify({"error": "page and limit must be integers"}), 400
         skip = (page - 1) * limit
-        
+
         users = User.search_users(query, limit=limit, skip=skip)
         
-        return jsonify({
+        response = jsonify({
             "users": users,
             "query": query,
             "page": page,
             "limit": limit
-        }), 200
+        })
+        # Typeahead re-sends the same prefixes as people type and backspace
+        response.headers["Cache-Control"] = f"public, max-age={USER_SEARCH_CACHE_SECONDS}"
+        return response, 200
         
     except Exception as e:
         print(f"Error searching users: {e}")
@@ -1,15 +1,45 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+import math
 from flask import current_app
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from waypoint.tile_cache import (
+    waypoint_tile_cache,
+    tiles_for_radius,
+    decode_geohash_bounds,
+    distance_meters,
+    MAX_TILES_PER_QUERY
+)
+from waypoint.socket_handlers import broadcast_waypoint_delta
+from shared.ids import canonical_id, ref_match, lookup_by_ref
+
+# Event waypoints stay on the map for this long after the event starts
+EVENT_WAYPOINT_GRACE_PERIOD = timedelta(hours=2)
+
+# Viewport queries below this zoom level return grid clusters instead of points
+CLUSTER_MAX_ZOOM = 16
+CLUSTER_CELL_PIXELS = 80
+MAX_CLUSTER_CELLS = 400
+VIEWPORT_STRIP_DEGREES = 10  # Widest single polygon in a viewport query
+MAX_MAP_LATITUDE = 85.05112878  # Web Mercator maps stop here
+
+# Interaction types stored in waypoint_interactions, mapped to their counter
+# in waypoint.interactions and the per-viewer flag returned to clients
+INTERACTION_TYPES = {
+    "join": {"counter": "joins", "flag": "is_joined"},
+    "like": {"counter": "likes", "flag": "is_liked"},
+    "bookmark": {"counter": "bookmarks", "flag": "is_bookmarked"}
+}
 
 class Waypoint:
     @staticmethod
-    def create_waypoint(user_id, username, title, description, waypoint_type, latitude, longitude, expires_at=None):
-        """Create a new waypoint"""
+    def create_waypoint(user_id, username, title, description, waypoint_type, latitude, longitude, expires_at=None, event_id=None):
+        """Create a new waypoint, optionally linked to an event via event_id"""
         db = current_app.config["DB"]
         
         waypoint_doc = {
-            "user_id": user_id,
+            "user_id": canonical_id(user_id),
             "username": username,
             "title": title,
             "description": description,
@@ -22,74 +52,58 @@ class Waypoint:
             "longitude": longitude,
             "active": True,
             "created_at": datetime.utcnow(),
-            "expires_at": expires_at,  # Optional expiration
+            "expires_at": expires_at,  # Optional expiration, enforced by the TTL index
+            "event_id": event_id,  # Set for waypoints created alongside an event
             "interactions": {
                 "likes": 0,
                 "joins": 0,
                 "views": 0,
                 "bookmarks": 0  # Add bookmarks count
-            },
-            "joined_users": [],  # List of user IDs who joined
-            "liked_users": [],   # List of user IDs who liked
-            "bookmarked_users": []  # Add list of user IDs who bookmarked
+            }
+            # Who joined/liked/bookmarked lives in waypoint_interactions so
+            # this document stays the same size however popular it gets
         }
         
         result = db.waypoint.insert_one(waypoint_doc)
         waypoint_doc["_id"] = str(result.inserted_id)
+        waypoint_doc["user_id"] = str(waypoint_doc["user_id"])
+        
+        waypoint_tile_cache.invalidate_point(latitude, longitude)
+        broadcast_waypoint_delta("created", {
+            key: waypoint_doc[key]
+            for key in ("_id", "user_id", "username", "title", "description", "type",
+                        "latitude", "longitude", "created_at", "expires_at", "event_id", "interactions")
+        })
         
         return waypoint_doc
     
     @staticmethod
     def cleanup_expired_waypoints():
-        """Remove expired waypoints and past event waypoints from the database"""
+        """Remove expired waypoints from the database
+        
+        The TTL index on expires_at does this server-side; this sweep only
+        covers the gap until MongoDB's TTL monitor next runs. Event waypoints
+        carry an expires_at derived from the event time, so no parsing of
+        titles or descriptions is needed.
+        """
         db = current_app.config["DB"]
         
         try:
-            deleted_count = 0
-            
-            # 1. Delete waypoints that have explicit expiration dates that have passed
-            result1 = db.waypoint.delete_many({
-                "expires_at": {"$lt": datetime.utcnow()}
-            })
-            deleted_count += result1.deleted_count
-            
-            # 2. Delete event waypoints that are past their event time
-            # Look for event waypoints with event info in title/description
-            event_waypoints = db.waypoint.find({
-                "$or": [
-                    {"type": "event"},
-                    {"title": {"$regex": "^📅", "$options": "i"}},
-                    {"description": {"$regex": "Event on", "$options": "i"}}
-                ]
-            })
+            # Fetch first so subscribed map clients can be told what went away
+            expired = list(db.waypoint.find(
+                {"expires_at": {"$lt": datetime.utcnow()}},
+                {"_id": 1, "latitude": 1, "longitude": 1}
+            ))
+            if not expired:
+                return 0
             
-            for waypoint in event_waypoints:
-                # Try to extract event datetime from description
-                description = waypoint.get("description", "")
-                
-                # Look for patterns like "Event on 2024-12-15 at 14:30"
-                import re
-                date_time_pattern = r"Event on (\d{4}-\d{2}-\d{2}) at (\d{2}:\d{2})"
-                match = re.search(date_time_pattern, description)
-                
-                if match:
-                    try:
-                        event_date = match.group(1)
-                        event_time = match.group(2)
-                        event_datetime_str = f"{event_date} {event_time}"
-                        event_datetime = datetime.strptime(event_datetime_str, "%Y-%m-%d %H:%M")
-                        
-                        # If event is in the past, delete the waypoint
-                        if event_datetime <= datetime.utcnow():
-                            result2 = db.waypoint.delete_one({"_id": waypoint["_id"]})
-                            if result2.deleted_count > 0:
-                                deleted_count += 1
-                                print(f"Deleted past event waypoint: {waypoint.get('title', 'Unknown')}")
-                    except ValueError as e:
-                        print(f"Error parsing event datetime for waypoint {waypoint.get('_id')}: {e}")
-                        continue
+            result = db.waypoint.delete_many({"_id": {"$in": [w["_id"] for w in expired]}})
+            deleted_count = result.deleted_count
             
             if deleted_count > 0:
+                waypoint_tile_cache.invalidate_all()
+                for waypoint in expired:
+                    broadcast_waypoint_delta("removed", waypoint)
                 print(f"Cleaned up {deleted_count} expired/past event waypoints")
             
             return deleted_count
@@ -98,14 +112,250 @@ class Waypoint:
             return 0
     
     @staticmethod
-    def get_waypoints_in_area(center_lat, center_lng, radius_km=5, limit=50, skip=0):
-        """Get waypoints within a certain radius of a point, excluding expired and past event waypoints"""
+    def update_event_waypoint_expiry(event_id, event_datetime):
+        """Move the expiry of an event's waypoint after the event is rescheduled"""
         db = current_app.config["DB"]
         
         try:
-            # First, cleanup expired and past event waypoints
-            Waypoint.cleanup_expired_waypoints()
+            expires_at = event_datetime + EVENT_WAYPOINT_GRACE_PERIOD
+            result = db.waypoint.update_many(
+                {"event_id": event_id},
+                {"$set": {"expires_at": expires_at}}
+            )
             
+            # Interactions expire with their waypoint
+            waypoints = list(db.waypoint.find({"event_id": event_id}, {"_id": 1, "latitude": 1, "longitude": 1}))
+            if waypoints:
+                db.waypoint_interactions.update_many(
+                    {"waypoint_id": {"$in": [str(w["_id"]) for w in waypoints]}},
+                    {"$set": {"expires_at": expires_at}}
+                )
+            if result.modified_count > 0:
+                waypoint_tile_cache.invalidate_all()
+                for waypoint in waypoints:
+                    broadcast_waypoint_delta("updated", {**waypoint, "expires_at": expires_at})
+            return result.modified_count
+        except Exception as e:
+            print(f"Error updating event waypoint expiry: {e}")
+            return 0
+    
+    @staticmethod
+    def delete_event_waypoints(event_id):
+        """Remove the waypoint(s) linked to an event"""
+        db = current_app.config["DB"]
+        
+        try:
+            waypoints = list(db.waypoint.find({"event_id": event_id}, {"_id": 1, "latitude": 1, "longitude": 1}))
+            result = db.waypoint.delete_many({"event_id": event_id})
+            if waypoints:
+                db.waypoint_interactions.delete_many({"waypoint_id": {"$in": [str(w["_id"]) for w in waypoints]}})
+            if result.deleted_count > 0:
+                waypoint_tile_cache.invalidate_all()
+                for waypoint in waypoints:
+                    broadcast_waypoint_delta("removed", waypoint)
+            return result.deleted_count
+        except Exception as e:
+            print(f"Error deleting event waypoints: {e}")
+            return 0
+    
+    @staticmethod
+    def _user_lookup_stages():
+        """Pipeline stages that join each waypoint with its creator's profile"""
+        return [
+            lookup_by_ref("users", "user_id", "user_info"),
+            {
+                "$unwind": {
+                    "path": "$user_info",
+                    "preserveNullAndEmptyArrays": True
+                }
+            }
+        ]
+    
+    @staticmethod
+    def _summary_projection():
+        """Fields returned for each waypoint in map queries"""
+        return {
+            "_id": {"$toString": "$_id"},
+            "user_id": {"$toString": "$user_id"},
+            "username": {"$ifNull": ["$user_info.username", "$username"]},
+            "title": 1,
+            "description": 1,
+            "type": 1,
+            "latitude": 1,
+            "longitude": 1,
+            "created_at": 1,
+            "expires_at": 1,
+            "interactions": 1,
+            "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]},
+            "is_verified": {"$ifNull": ["$user_info.is_verified", False]}
+        }
+    
+    @staticmethod
+    def _apply_viewer_flags(waypoints, viewer_id):
+        """Set is_joined/is_liked/is_bookmarked on each waypoint for the viewer
+        
+        One indexed query against waypoint_interactions covers the whole page.
+        Anonymous viewers get every flag set to False.
+        """
+        for waypoint in waypoints:
+            for interaction in INTERACTION_TYPES.values():
+                waypoint[interaction["flag"]] = False
+        
+        if not viewer_id or not waypoints:
+            return waypoints
+        
+        db = current_app.config["DB"]
+        by_id = {waypoint["_id"]: waypoint for waypoint in waypoints}
+        
+        interactions = db.waypoint_interactions.find(
+            {"user_id": viewer_id, "waypoint_id": {"$in": list(by_id.keys())}},
+            {"_id": 0, "waypoint_id": 1, "type": 1}
+        )
+        for interaction in interactions:
+            waypoint = by_id.get(interaction["waypoint_id"])
+            interaction_type = INTERACTION_TYPES.get(interaction["type"])
+            if waypoint and interaction_type:
+                waypoint[interaction_type["flag"]] = True
+        
+        return waypoints
+    
+    @staticmethod
+    def _toggle_interaction(waypoint_id, user_id, interaction_type):
+        """Add or remove a user's join/like/bookmark, returns True if it is now set"""
+        db = current_app.config["DB"]
+        
+        waypoint = db.waypoint.find_one(
+            {"_id": ObjectId(waypoint_id)},
+            {"latitude": 1, "longitude": 1, "expires_at": 1}
+        )
+        if not waypoint:
+            return None
+        
+        counter = f"interactions.{INTERACTION_TYPES[interaction_type]['counter']}"
+        interaction_key = {
+            "waypoint_id": waypoint_id,
+            "user_id": user_id,
+            "type": interaction_type
+        }
+        
+        updated = None
+        removed = db.waypoint_interactions.delete_one(interaction_key)
+        if removed.deleted_count > 0:
+            updated = db.waypoint.find_one_and_update(
+                {"_id": ObjectId(waypoint_id)},
+                {"$inc": {counter: -1}},
+                projection={"latitude": 1, "longitude": 1, "interactions": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            is_set = False
+        else:
+            try:
+                db.waypoint_interactions.insert_one({
+                    **interaction_key,
+                    "created_at": datetime.utcnow(),
+                    "expires_at": waypoint.get("expires_at")  # Removed by TTL with the waypoint
+                })
+                updated = db.waypoint.find_one_and_update(
+                    {"_id": ObjectId(waypoint_id)},
+                    {"$inc": {counter: 1}},
+                    projection={"latitude": 1, "longitude": 1, "interactions": 1},
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                pass  # A concurrent request already added it
+            is_set = True
+        
+        waypoint_tile_cache.invalidate_point(waypoint.get("latitude"), waypoint.get("longitude"))
+        if updated:
+            # Only the new counts go out; per-user flags stay private
+            broadcast_waypoint_delta("updated", updated)
+        return is_set
+    
+    @staticmethod
+    def _load_tile(tile):
+        """Load summaries of all active waypoints inside a tile, using the tile cache"""
+        cached = waypoint_tile_cache.get(tile)
+        if cached is not None:
+            return cached
+        
+        db = current_app.config["DB"]
+        south, west, north, east = decode_geohash_bounds(tile)
+        
+        pipeline = [
+            {
+                "$match": {
+                    "active": True,
+                    "latitude": {"$gte": south, "$lt": north},
+                    "longitude": {"$gte": west, "$lt": east}
+                }
+            },
+            *Waypoint._user_lookup_stages(),
+            {"$project": Waypoint._summary_projection()}
+        ]
+        
+        waypoints = list(db.waypoint.aggregate(pipeline))
+        waypoint_tile_cache.set(tile, waypoints)
+        return waypoints
+    
+    @staticmethod
+    def get_waypoints_in_area(center_lat, center_lng, radius_km=5, limit=50, skip=0, viewer_id=None):
+        """Get waypoints within a certain radius of a point, excluding expired waypoints
+        
+        Served from the geohash tile cache when the circle covers few enough
+        tiles; wide-radius queries go straight to $geoNear. Only the viewer's
+        interaction flags are computed per request.
+        """
+        tiles = tiles_for_radius(center_lat, center_lng, radius_km, MAX_TILES_PER_QUERY)
+        if tiles is None:
+            waypoints = Waypoint._get_waypoints_in_area_uncached(center_lat, center_lng, radius_km, limit, skip)
+            return Waypoint._apply_viewer_flags(waypoints, viewer_id)
+        
+        try:
+            now = datetime.utcnow()
+            max_distance = radius_km * 1000
+            waypoints = []
+            
+            for tile in tiles:
+                for cached_waypoint in Waypoint._load_tile(tile):
+                    # Filter out waypoints that expired since the tile was cached
+                    expires_at = cached_waypoint.get("expires_at")
+                    if expires_at is not None and expires_at <= now:
+                        continue
+                    
+                    distance = distance_meters(
+                        center_lat, center_lng,
+                        cached_waypoint["latitude"], cached_waypoint["longitude"]
+                    )
+                    if distance > max_distance:
+                        continue
+                    
+                    # Copy so per-request fields don't leak into the cache
+                    waypoint = dict(cached_waypoint)
+                    waypoint["distance"] = distance
+                    waypoints.append(waypoint)
+            
+            # Same ordering as the $geoNear query: nearest first, then newest
+            waypoints.sort(key=lambda w: w["created_at"], reverse=True)
+            waypoints.sort(key=lambda w: w["distance"])
+            waypoints = waypoints[skip:skip + limit]
+            
+            # Convert distance to km and add time ago
+            for waypoint in waypoints:
+                waypoint["distance_km"] = round(waypoint["distance"] / 1000, 2)
+                waypoint["time_ago"] = Waypoint._calculate_time_ago(waypoint["created_at"])
+            
+            return Waypoint._apply_viewer_flags(waypoints, viewer_id)
+            
+        except Exception as e:
+            print(f"Error getting waypoints in area: {e}")
+            return []
+    
+    @staticmethod
+    def _get_waypoints_in_area_uncached(center_lat, center_lng, radius_km=5, limit=50, skip=0):
+        """Get waypoints within a radius using $geoNear directly (no tile cache)"""
+        db = current_app.config["DB"]
+        
+        try:
             # Create geospatial query
             pipeline = [
                 {
@@ -130,41 +380,11 @@ class Waypoint:
                     }
                 },
                 # Join with users to get profile info
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "let": {"user_id": {"$toObjectId": "$user_id"}},
-                        "pipeline": [
-                            {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                        ],
-                        "as": "user_info"
-                    }
-                },
-                {
-                    "$unwind": {
-                        "path": "$user_info",
-                        "preserveNullAndEmptyArrays": True
-                    }
-                },
+                *Waypoint._user_lookup_stages(),
                 {
                     "$project": {
-                        "_id": {"$toString": "$_id"},
-                        "user_id": 1,
-                        "username": {"$ifNull": ["$user_info.username", "$username"]},
-                        "title": 1,
-                        "description": 1,
-                        "type": 1,
-                        "latitude": 1,
-                        "longitude": 1,
-                        "created_at": 1,
-                        "expires_at": 1,
-                        "interactions": 1,
-                        "distance": 1,  # Distance in meters
-                        "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]},
-                        "is_verified": {"$ifNull": ["$user_info.is_verified", False]},
-                        "joined_users": 1,
-                        "liked_users": 1,
-                        "bookmarked_users": 1  # Include bookmarked users for status checking
+                        **Waypoint._summary_projection(),
+                        "distance": 1  # Distance in meters
                     }
                 },
                 {"$sort": {"distance": 1, "created_at": -1}},
@@ -186,24 +406,166 @@ class Waypoint:
             return []
     
     @staticmethod
-    def get_waypoint_by_id(waypoint_id):
-        """Get a single waypoint by ID"""
+    def _viewport_geometry(south, west, north, east):
+        """GeoJSON area covering a lat/lng viewport
+        
+        GeoJSON edges are great-circle arcs, so one polygon for a wide viewport
+        bows away from the parallels it should follow and a full-world one
+        collapses to a line. The viewport is split into strips at most
+        VIEWPORT_STRIP_DEGREES wide, and latitudes are clamped to the range a
+        web map can show.
+        """
+        south = max(south, -MAX_MAP_LATITUDE)
+        north = min(north, MAX_MAP_LATITUDE)
+        
+        strips = max(1, math.ceil((east - west) / VIEWPORT_STRIP_DEGREES))
+        width = (east - west) / strips
+        polygons = []
+        for i in range(strips):
+            left = west + i * width
+            right = east if i == strips - 1 else left + width
+            polygons.append([[
+                [left, south], [right, south], [right, north], [left, north], [left, south]
+            ]])
+        
+        if len(polygons) == 1:
+            return {"type": "Polygon", "coordinates": polygons[0]}
+        return {"type": "MultiPolygon", "coordinates": polygons}
+    
+    @staticmethod
+    def _grid_cells(south, west, north, east, cell_size):
+        """Number of world-grid cells of cell_size degrees a viewport touches"""
+        columns = math.floor(east / cell_size) - math.floor(west / cell_size) + 1
+        rows = math.floor(north / cell_size) - math.floor(south / cell_size) + 1
+        return columns * rows
+    
+    @staticmethod
+    def get_waypoints_in_bounds(south, west, north, east, zoom, limit=200, viewer_id=None):
+        """Get waypoints inside a map viewport
+        
+        At zoom levels below CLUSTER_MAX_ZOOM waypoints are grouped on a fixed
+        world grid of roughly CLUSTER_CELL_PIXELS-wide cells and each cell comes back as a
+        count plus centroid, so the payload size depends on the screen size
+        rather than how many waypoints are in view. Cells holding a single
+        waypoint come back as points. From CLUSTER_MAX_ZOOM up, the newest
+        individual waypoints are returned (capped at limit).
+        """
         db = current_app.config["DB"]
         
+        match = {
+            "active": True,
+            "location": {
+                "$geoWithin": {"$geometry": Waypoint._viewport_geometry(south, west, north, east)}
+            },
+            # Filter out expired waypoints
+            "$or": [
+                {"expires_at": None},
+                {"expires_at": {"$gt": datetime.utcnow()}}
+            ]
+        }
+        
         try:
+            if zoom >= CLUSTER_MAX_ZOOM:
+                pipeline = [
+                    {"$match": match},
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": limit + 1},  # One extra to detect truncation
+                    *Waypoint._user_lookup_stages(),
+                    {"$project": Waypoint._summary_projection()}
+                ]
+                
+                waypoints = list(db.waypoint.aggregate(pipeline))
+                truncated = len(waypoints) > limit
+                waypoints = waypoints[:limit]
+                
+                for waypoint in waypoints:
+                    waypoint["time_ago"] = Waypoint._calculate_time_ago(waypoint["created_at"])
+                
+                return {
+                    "mode": "points",
+                    "points": Waypoint._apply_viewer_flags(waypoints, viewer_id),
+                    "clusters": [],
+                    "truncated": truncated
+                }
+            
+            # Grid cell size in degrees for this zoom level (256px world at zoom 0)
+            cell_size = 360.0 / (2 ** zoom) * (CLUSTER_CELL_PIXELS / 256.0)
+            # Never produce more than MAX_CLUSTER_CELLS cells, however large the
+            # viewport. Doubling keeps cells on the same world grid as the zoom's
+            # own size, so a waypoint's cell doesn't depend on the viewport
+            while Waypoint._grid_cells(south, west, north, east, cell_size) > MAX_CLUSTER_CELLS:
+                cell_size *= 2
+            
             pipeline = [
-                {"$match": {"_id": ObjectId(waypoint_id)}},
-                # Join with users to get profile info
+                {"$match": match},
                 {
-                    "$lookup": {
-                        "from": "users",
-                        "let": {"user_id": {"$toObjectId": "$user_id"}},
-                        "pipeline": [
-                            {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}}
-                        ],
-                        "as": "user_info"
+                    # Cells are anchored at 0,0 rather than the viewport corner so
+                    # clusters stay put while the map is panned
+                    "$group": {
+                        "_id": {
+                            "x": {"$floor": {"$divide": ["$longitude", cell_size]}},
+                            "y": {"$floor": {"$divide": ["$latitude", cell_size]}}
+                        },
+                        "count": {"$sum": 1},
+                        "latitude": {"$avg": "$latitude"},
+                        "longitude": {"$avg": "$longitude"},
+                        "types": {"$addToSet": "$type"},
+                        # Enough to render a lone waypoint as a regular marker
+                        "waypoint": {
+                            "$first": {
+                                "_id": {"$toString": "$_id"},
+                                "title": "$title",
+                                "type": "$type",
+                                "latitude": "$latitude",
+                                "longitude": "$longitude",
+                                "username": "$username",
+                                "interactions": "$interactions",
+                                "created_at": "$created_at",
+                                "expires_at": "$expires_at"
+                            }
+                        }
                     }
-                },
+                }
+            ]
+            
+            clusters = []
+            points = []
+            for cell in db.waypoint.aggregate(pipeline):
+                if cell["count"] == 1:
+                    waypoint = cell["waypoint"]
+                    waypoint["time_ago"] = Waypoint._calculate_time_ago(waypoint["created_at"])
+                    points.append(waypoint)
+                else:
+                    clusters.append({
+                        "cell": f"{int(cell['_id']['x'])}:{int(cell['_id']['y'])}",
+                        "count": cell["count"],
+                        "latitude": cell["latitude"],
+                        "longitude": cell["longitude"],
+                        "types": cell["types"]
+                    })
+            
+            return {
+                "mode": "clusters",
+                "points": Waypoint._apply_viewer_flags(points, viewer_id),
+                "clusters": clusters,
+                "cell_size_degrees": cell_size,
+                "truncated": False
+            }
+            
+        except Exception as e:
+            print(f"Error getting waypoints in bounds: {e}")
+            return {"mode": "points", "points": [], "clusters": [], "truncated": False}
+    
+    @staticmethod
+    def get_waypoint_by_id(waypoint_id, viewer_id=None):
+        """Get a single waypoint by ID, with interaction flags for the viewer"""
+        db = current_app.config["DB"]
+        
+        try:
+            pipeline = [
+                {"$match": {"_id": ObjectId(waypoint_id)}},
+                # Join with users to get profile info
+                lookup_by_ref("users", "user_id", "user_info"),
                 {
                     "$unwind": {
                         "path": "$user_info",
@@ -213,7 +575,7 @@ class Waypoint:
                 {
                     "$project": {
                         "_id": {"$toString": "$_id"},
-                        "user_id": 1,
+                        "user_id": {"$toString": "$user_id"},
                         "username": {"$ifNull": ["$user_info.username", "$username"]},
                         "title": 1,
                         "description": 1,
@@ -223,9 +585,6 @@ class Waypoint:
                         "created_at": 1,
                         "expires_at": 1,
                         "interactions": 1,
-                        "joined_users": 1,
-                        "liked_users": 1,
-                        "bookmarked_users": 1,  # Include bookmarked users
                         "profile_picture": {"$ifNull": ["$user_info.profile_picture", None]},
                         "is_verified": {"$ifNull": ["$user_info.is_verified", False]}
                     }
@@ -236,6 +595,7 @@ class Waypoint:
             if result:
                 waypoint = result[0]
                 waypoint["time_ago"] = Waypoint._calculate_time_ago(waypoint["created_at"])
+                Waypoint._apply_viewer_flags([waypoint], viewer_id)
                 return waypoint
             
             return None
@@ -247,35 +607,14 @@ class Waypoint:
     @staticmethod
     def join_waypoint(waypoint_id, user_id):
         """Join or leave a waypoint"""
-        db = current_app.config["DB"]
-        
         try:
-            waypoint = db.waypoint.find_one({"_id": ObjectId(waypoint_id)})
-            if not waypoint:
+            joined = Waypoint._toggle_interaction(waypoint_id, user_id, "join")
+            if joined is None:
                 return {"error": "Waypoint not found"}
             
-            joined_users = waypoint.get("joined_users", [])
-            
-            if user_id in joined_users:
-                # Leave waypoint
-                db.waypoint.update_one(
-                    {"_id": ObjectId(waypoint_id)},
-                    {
-                        "$pull": {"joined_users": user_id},
-                        "$inc": {"interactions.joins": -1}
-                    }
-                )
-                return {"joined": False, "message": "Left waypoint"}
-            else:
-                # Join waypoint
-                db.waypoint.update_one(
-                    {"_id": ObjectId(waypoint_id)},
-                    {
-                        "$addToSet": {"joined_users": user_id},
-                        "$inc": {"interactions.joins": 1}
-                    }
-                )
+            if joined:
                 return {"joined": True, "message": "Joined waypoint"}
+            return {"joined": False, "message": "Left waypoint"}
                 
         except Exception as e:
             print(f"Error joining waypoint: {e}")
@@ -284,35 +623,14 @@ class Waypoint:
     @staticmethod
     def like_waypoint(waypoint_id, user_id):
         """Like or unlike a waypoint"""
-        db = current_app.config["DB"]
-        
         try:
-            waypoint = db.waypoint.find_one({"_id": ObjectId(waypoint_id)})
-            if not waypoint:
+            liked = Waypoint._toggle_interaction(waypoint_id, user_id, "like")
+            if liked is None:
                 return {"error": "Waypoint not found"}
             
-            liked_users = waypoint.get("liked_users", [])
-            
-            if user_id in liked_users:
-                # Unlike waypoint
-                db.waypoint.update_one(
-                    {"_id": ObjectId(waypoint_id)},
-                    {
-                        "$pull": {"liked_users": user_id},
-                        "$inc": {"interactions.likes": -1}
-                    }
-                )
-                return {"liked": False, "message": "Unliked waypoint"}
-            else:
-                # Like waypoint
-                db.waypoint.update_one(
-                    {"_id": ObjectId(waypoint_id)},
-                    {
-                        "$addToSet": {"liked_users": user_id},
-                        "$inc": {"interactions.likes": 1}
-                    }
-                )
+            if liked:
                 return {"liked": True, "message": "Liked waypoint"}
+            return {"liked": False, "message": "Unliked waypoint"}
                 
         except Exception as e:
             print(f"Error liking waypoint: {e}")
@@ -321,35 +639,14 @@ class Waypoint:
     @staticmethod
     def bookmark_waypoint(waypoint_id, user_id):
         """Bookmark or unbookmark a waypoint"""
-        db = current_app.config["DB"]
-        
         try:
-            waypoint = db.waypoint.find_one({"_id": ObjectId(waypoint_id)})
-            if not waypoint:
+            bookmarked = Waypoint._toggle_interaction(waypoint_id, user_id, "bookmark")
+            if bookmarked is None:
                 return {"error": "Waypoint not found"}
             
-            bookmarked_users = waypoint.get("bookmarked_users", [])
-            
-            if user_id in bookmarked_users:
-                # Unbookmark waypoint
-                db.waypoint.update_one(
-                    {"_id": ObjectId(waypoint_id)},
-                    {
-                        "$pull": {"bookmarked_users": user_id},
-                        "$inc": {"interactions.bookmarks": -1}
-                    }
-                )
-                return {"bookmarked": False, "message": "Removed bookmark"}
-            else:
-                # Bookmark waypoint
-                db.waypoint.update_one(
-                    {"_id": ObjectId(waypoint_id)},
-                    {
-                        "$addToSet": {"bookmarked_users": user_id},
-                        "$inc": {"interactions.bookmarks": 1}
-                    }
-                )
+            if bookmarked:
                 return {"bookmarked": True, "message": "Bookmarked waypoint"}
+            return {"bookmarked": False, "message": "Removed bookmark"}
                 
         except Exception as e:
             print(f"Error bookmarking waypoint: {e}")
@@ -365,12 +662,19 @@ class Waypoint:
             if not waypoint:
                 return {"error": "Waypoint not found"}
             
-            if waypoint["user_id"] != user_id:
+            if str(waypoint["user_id"]) != user_id:
                 return {"error": "You can only delete your own waypoints"}
             
             result = db.waypoint.delete_one({"_id": ObjectId(waypoint_id)})
             
             if result.deleted_count > 0:
+                db.waypoint_interactions.delete_many({"waypoint_id": waypoint_id})
+                waypoint_tile_cache.invalidate_point(waypoint.get("latitude"), waypoint.get("longitude"))
+                broadcast_waypoint_delta("removed", {
+                    "_id": waypoint["_id"],
+                    "latitude": waypoint.get("latitude"),
+                    "longitude": waypoint.get("longitude")
+                })
                 return {"success": True, "message": "Waypoint deleted"}
             else:
                 return {"error": "Failed to delete waypoint"}
@@ -386,7 +690,7 @@ class Waypoint:
         
         try:
             pipeline = [
-                {"$match": {"user_id": user_id}},
+                {"$match": {"user_id": ref_match(user_id)}},
                 {"$sort": {"created_at": -1}},
                 {"$skip": skip},
                 {"$limit": limit},
@@ -424,11 +728,18 @@ class Waypoint:
         db = current_app.config["DB"]
         
         try:
-            # First cleanup expired waypoints
-            Waypoint.cleanup_expired_waypoints()
+            bookmarked_ids = [
+                ObjectId(interaction["waypoint_id"])
+                for interaction in db.waypoint_interactions.find(
+                    {"user_id": user_id, "type": "bookmark"},
+                    {"_id": 0, "waypoint_id": 1}
+                )
+            ]
+            if not bookmarked_ids:
+                return []
             
             pipeline = [
-                {"$match": {"bookmarked_users": user_id, "active": True}},
+                {"$match": {"_id": {"$in": bookmarked_ids}, "active": True}},
                 {
                     "$match": {
                         # Filter out expired waypoints
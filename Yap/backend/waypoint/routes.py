@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
 from waypoint.models import Waypoint
-from auth.service import token_required
+from auth.service import token_required, get_optional_user_id
 from datetime import datetime, timedelta
 
 waypoint_bp = Blueprint('waypoint', __name__)
@@ -112,7 +112,8 @@ def get_nearby_waypoints():
             center_lng=longitude,
             radius_km=radius,
             limit=limit,
-            skip=skip
+            skip=skip,
+            viewer_id=get_optional_user_id()
         )
         
         return jsonify({
@@ -126,11 +127,57 @@ def get_nearby_waypoints():
         print(f"Error getting nearby waypoints: {e}")
         return jsonify({"error": "Failed to get waypoints"}), 500
 
+@waypoint_bp.route('/viewport', methods=['GET'])
+def get_viewport_waypoints():
+    """Get waypoints inside a map viewport, clustered when zoomed out - PUBLIC route"""
+    try:
+        try:
+            south = float(request.args.get('south'))
+            west = float(request.args.get('west'))
+            north = float(request.args.get('north'))
+            east = float(request.args.get('east'))
+            zoom = int(request.args.get('zoom', 15))
+        except (ValueError, TypeError):
+            return jsonify({"error": "south, west, north and east are required"}), 400
+        
+        try:
+            limit = max(1, min(int(request.args.get('limit', 200)), 500))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        
+        # Basic bounds validation (rough world bounds, no antimeridian wrapping)
+        if not (-90 <= south < north <= 90):
+            return jsonify({"error": "Invalid latitude bounds"}), 400
+        if not (-180 <= west < east <= 180):
+            return jsonify({"error": "Invalid longitude bounds"}), 400
+        if not (0 <= zoom <= 22):
+            return jsonify({"error": "Zoom must be between 0 and 22"}), 400
+        
+        result = Waypoint.get_waypoints_in_bounds(
+            south=south,
+            west=west,
+            north=north,
+            east=east,
+            zoom=zoom,
+            limit=limit,
+            viewer_id=get_optional_user_id()
+        )
+        
+        return jsonify({
+            **result,
+            "bounds": {"south": south, "west": west, "north": north, "east": east},
+            "zoom": zoom
+        }), 200
+        
+    except Exception as e:
+        print(f"Error getting viewport waypoints: {e}")
+        return jsonify({"error": "Failed to get waypoints"}), 500
+
 @waypoint_bp.route('/<waypoint_id>', methods=['GET'])
 def get_waypoint(waypoint_id):
     """Get a single waypoint - PUBLIC route"""
     try:
-        waypoint = Waypoint.get_waypoint_by_id(waypoint_id)
+        waypoint = Waypoint.get_waypoint_by_id(waypoint_id, viewer_id=get_optional_user_id())
         
         if not waypoint:
             return jsonify({"error": "Waypoint not found"}), 404
@@ -259,30 +306,25 @@ def get_tmu_waypoints():
         limit = min(int(request.args.get('limit', 50)), 100)
         skip = int(request.args.get('skip', 0))
         
-        # Clean up expired waypoints before fetching (this will remove past event waypoints)
-        cleanup_count = Waypoint.cleanup_expired_waypoints()
-        if cleanup_count > 0:
-            print(f"Cleaned up {cleanup_count} expired/past waypoints before fetching TMU waypoints")
+        # Validate radius
+        if not (0.1 <= radius <= 50):  # Max 50km radius
+            return jsonify({"error": "Radius must be between 0.1 and 50 km"}), 400
         
         waypoints = Waypoint.get_waypoints_in_area(
             center_lat=TMU_LAT,
             center_lng=TMU_LNG,
             radius_km=radius,
             limit=limit,
-            skip=skip
+            skip=skip,
+            viewer_id=get_optional_user_id()  # Adds is_liked/is_bookmarked/is_joined for signed-in users
         )
         
-        # If user is authenticated, we already have liked_users and bookmarked_users
-        # The frontend will use these arrays to determine user interaction status
-        
         return jsonify({
             "waypoints": waypoints,
             "campus": "TMU",
             "center": {"latitude": TMU_LAT, "longitude": TMU_LNG},
             "radius_km": radius,
-            "count": len(waypoints),
-            "cleanup_performed": cleanup_count > 0,
-            "expired_removed": cleanup_count
+            "count": len(waypoints)
         }), 200
         
     except Exception as e:
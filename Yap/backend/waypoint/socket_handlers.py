@@ -0,0 +1,115 @@
+from flask_socketio import emit, join_room, leave_room
+from flask import request, current_app
+from waypoint.tile_cache import tiles_for_radius, tile_for_point, GEOHASH_BASE32, TILE_PRECISION, MAX_TILES_PER_QUERY
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# {session_id: set(tiles)} - tiles each socket is subscribed to
+tile_subscriptions = {}
+
+
+def _tile_room(tile):
+    return f"waypoint_tile_{tile}"
+
+
+def _is_valid_tile(tile):
+    return (
+        isinstance(tile, str)
+        and len(tile) == TILE_PRECISION
+        and all(char in GEOHASH_BASE32 for char in tile)
+    )
+
+
+def handle_subscribe_waypoint_tiles(data):
+    """Subscribe a socket to waypoint updates for a set of map tiles
+
+    Accepts either {"tiles": [...]} with geohash tiles, or
+    {"latitude", "longitude", "radius_km"} to subscribe to the tiles covering
+    that circle. Replaces the socket's previous subscription.
+    """
+    try:
+        data = data or {}
+
+        if data.get('tiles') is not None:
+            tiles = [tile for tile in data.get('tiles', []) if _is_valid_tile(tile)]
+        else:
+            try:
+                latitude = float(data.get('latitude'))
+                longitude = float(data.get('longitude'))
+                radius_km = min(max(float(data.get('radius_km', 5)), 0.1), 50)
+            except (TypeError, ValueError):
+                emit('error', {'message': 'tiles or latitude/longitude required'})
+                return
+            tiles = tiles_for_radius(latitude, longitude, radius_km, MAX_TILES_PER_QUERY)
+
+        if tiles is not None:
+            tiles = set(tiles)
+        if tiles is None or len(tiles) > MAX_TILES_PER_QUERY:
+            emit('error', {'message': f'Too many tiles (max {MAX_TILES_PER_QUERY})'})
+            return
+
+        previous = tile_subscriptions.get(request.sid, set())
+
+        for tile in previous - tiles:
+            leave_room(_tile_room(tile))
+        for tile in tiles - previous:
+            join_room(_tile_room(tile))
+
+        tile_subscriptions[request.sid] = tiles
+        emit('waypoint_tiles_subscribed', {'tiles': sorted(tiles)})
+
+    except Exception as e:
+        logger.error(f"❌ Error in handle_subscribe_waypoint_tiles: {str(e)}", exc_info=True)
+        emit('error', {'message': 'Failed to subscribe to waypoint updates'})
+
+
+def handle_unsubscribe_waypoint_tiles():
+    """Drop all of a socket's waypoint tile subscriptions"""
+    try:
+        for tile in tile_subscriptions.pop(request.sid, set()):
+            leave_room(_tile_room(tile))
+        emit('waypoint_tiles_subscribed', {'tiles': []})
+    except Exception as e:
+        logger.error(f"❌ Error in handle_unsubscribe_waypoint_tiles: {str(e)}", exc_info=True)
+
+
+def handle_waypoint_disconnect():
+    """Forget a disconnected socket's subscriptions (rooms are left automatically)"""
+    tile_subscriptions.pop(request.sid, None)
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def broadcast_waypoint_delta(action, waypoint):
+    """Push a compact waypoint change to sockets subscribed to its tile
+
+    action is "created", "updated" or "removed". Removed deltas carry just
+    the id and coordinates; updated deltas carry the fields that changed.
+    """
+    try:
+        latitude = waypoint.get("latitude")
+        longitude = waypoint.get("longitude")
+        if latitude is None or longitude is None:
+            return
+
+        socketio = current_app.extensions.get('socketio')
+        if not socketio:
+            return
+
+        tile = tile_for_point(latitude, longitude)
+        delta = {
+            "action": action,
+            "tile": tile,
+            "waypoint": {key: _serialize(value) for key, value in waypoint.items()}
+        }
+        delta["waypoint"]["_id"] = str(waypoint["_id"])
+
+        socketio.emit('waypoint_update', delta, room=_tile_room(tile))
+
+    except Exception as e:
+        # Live updates are best-effort; the write itself already succeeded
+        logger.error(f"Error broadcasting waypoint {action}: {e}")
@@ -0,0 +1,193 @@
+from collections import OrderedDict
+import math
+import threading
+import time
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precision 5 geohash cells are ~4.9km x 4.9km (~3.5km wide at Toronto's latitude)
+TILE_PRECISION = 5
+TILE_LAT_BITS = (TILE_PRECISION * 5) // 2
+TILE_LNG_BITS = TILE_PRECISION * 5 - TILE_LAT_BITS
+TILE_LAT_HEIGHT = 180.0 / (1 << TILE_LAT_BITS)
+TILE_LNG_WIDTH = 360.0 / (1 << TILE_LNG_BITS)
+
+# Radius queries touching more tiles than this skip the cache
+MAX_TILES_PER_QUERY = 25
+
+EARTH_RADIUS_METERS = 6378100  # Same radius MongoDB uses for spherical queries
+
+
+def encode_geohash(latitude, longitude, precision=TILE_PRECISION):
+    """Encode a coordinate as a geohash string"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even_bit = True  # Geohash starts with a longitude bit
+
+    while len(geohash) < precision:
+        if even_bit:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits = bits << 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+
+        even_bit = not even_bit
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def decode_geohash_bounds(geohash):
+    """Get (south, west, north, east) bounds of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even_bit = True
+
+    for char in geohash:
+        value = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lng_range if even_bit else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even_bit = not even_bit
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def tile_for_point(latitude, longitude):
+    """Get the cache tile containing a coordinate"""
+    return encode_geohash(latitude, longitude, TILE_PRECISION)
+
+
+def tiles_for_bounds(south, west, north, east, max_tiles=None):
+    """Get every tile overlapping a lat/lng bounding box
+
+    Returns None without encoding anything when the box covers more than
+    max_tiles tiles, so a huge box costs nothing to reject.
+    """
+    south = max(south, -90.0)
+    north = min(north, 90.0 - 1e-9)
+    west = max(west, -180.0)
+    east = min(east, 180.0 - 1e-9)
+
+    first_row = math.floor((south + 90.0) / TILE_LAT_HEIGHT)
+    last_row = math.floor((north + 90.0) / TILE_LAT_HEIGHT)
+    first_col = math.floor((west + 180.0) / TILE_LNG_WIDTH)
+    last_col = math.floor((east + 180.0) / TILE_LNG_WIDTH)
+
+    if max_tiles is not None and (last_row - first_row + 1) * (last_col - first_col + 1) > max_tiles:
+        return None
+
+    tiles = []
+    for row in range(first_row, last_row + 1):
+        for col in range(first_col, last_col + 1):
+            # Encode the centre of each grid cell to get its geohash
+            center_lat = -90.0 + (row + 0.5) * TILE_LAT_HEIGHT
+            center_lng = -180.0 + (col + 0.5) * TILE_LNG_WIDTH
+            tiles.append(encode_geohash(center_lat, center_lng, TILE_PRECISION))
+    return tiles
+
+
+def tiles_for_radius(latitude, longitude, radius_km, max_tiles=None):
+    """Get every tile overlapping a circle, or None if more than max_tiles"""
+    lat_delta = math.degrees(radius_km * 1000 / EARTH_RADIUS_METERS)
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    lng_delta = min(lat_delta / cos_lat, 180.0)
+    return tiles_for_bounds(
+        latitude - lat_delta, longitude - lng_delta,
+        latitude + lat_delta, longitude + lng_delta,
+        max_tiles
+    )
+
+
+def distance_meters(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two coordinates"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+class WaypointTileCache:
+    """In-memory cache of waypoint summaries keyed by geohash tile.
+
+    Each tile holds the active waypoints inside it for a short TTL. Writes
+    that change a waypoint (create, delete, join, like, bookmark) drop the
+    tile the waypoint sits in so the next read reloads it.
+    """
+
+    def __init__(self, ttl_seconds=30, max_tiles=2048):
+        self.ttl_seconds = ttl_seconds
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tile):
+        """Get cached waypoints for a tile, or None if missing/stale"""
+        with self._lock:
+            entry = self._tiles.get(tile)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(tile)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, tile, waypoints):
+        with self._lock:
+            self._tiles[tile] = (time.monotonic(), waypoints)
+            self._tiles.move_to_end(tile)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+    def invalidate_tile(self, tile):
+        with self._lock:
+            self._tiles.pop(tile, None)
+
+    def invalidate_point(self, latitude, longitude):
+        """Drop the tile containing a coordinate"""
+        if latitude is None or longitude is None:
+            return
+        self.invalidate_tile(tile_for_point(latitude, longitude))
+
+    def invalidate_all(self):
+        with self._lock:
+            self._tiles.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "cached_tiles": len(self._tiles),
+                "hits": self.hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+
+waypoint_tile_cache = WaypointTileCache()
@@ -225,8 +225,11 @@ function MessageChat({ conversation, onNewMessage }) {
             console.log('✅ Reconnected successfully, syncing quietly');
             setRetryCount(0);
             setShowOfflineMessage(false);
-            // Don't show loading screen on reconnection - just sync quietly
-            fetchMessagesQuietly();
+            // The message service syncs missed messages by seq; only reload
+            // history for conversations it has no seq for
+            if (!messageService.hasSyncCursor(conversation._id)) {
+                fetchMessagesQuietly();
+            }
         } else if (status === 'disconnected') {
             setRetryCount(prev => prev + 1);
             setShowOfflineMessage(true);
@@ -766,8 +769,11 @@ function MessageChat({ conversation, onNewMessage }) {
         
         try {
             await messageService.reconnect();
-            // Use quiet sync instead of full refresh - no loading screen
-            await fetchMessagesQuietly();
+            // Missed messages arrive through the service's sync; only reload
+            // history (quietly, no loading screen) when it can't catch up by seq
+            if (!messageService.hasSyncCursor(conversation._id)) {
+                await fetchMessagesQuietly();
+            }
         } catch (error) {
             console.error('❌ Manual retry failed:', error);
             setShowOfflineMessage(true);
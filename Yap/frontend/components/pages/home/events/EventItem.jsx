@@ -92,10 +92,6 @@ function EventItem() {
             
             if (data.events && Array.isArray(data.events)) {
                 setEvents(data.events);
-                
-                if (data.debug_info) {
-                    console.log('Database stats:', data.debug_info);
-                }
             } else {
                 console.error('Invalid data structure:', data);
                 setError('Invalid response format from server');
@@ -188,12 +188,10 @@ function Waypoint() {
                     active: true,
                     interactions: waypoint.interactions || { likes: 0, bookmarks: 0 },
                     distance_km: waypoint.distance_km,
-                    // Use backend data to determine user interaction status
-                    isLiked: currentUserId ? waypoint.liked_users?.includes(currentUserId) : false,
-                    isBookmarked: currentUserId ? waypoint.bookmarked_users?.includes(currentUserId) : false,
+                    // Interaction status is computed per user by the backend
+                    isLiked: currentUserId ? !!waypoint.is_liked : false,
+                    isBookmarked: currentUserId ? !!waypoint.is_bookmarked : false,
                     isOwner: currentUsername && waypoint.username === currentUsername,
-                    liked_users: waypoint.liked_users || [],
-                    bookmarked_users: waypoint.bookmarked_users || [],
                     // Event-specific fields
                     isAttending: isAttending,
                     attendeesCount: attendeesCount
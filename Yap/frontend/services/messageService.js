@@ -20,6 +20,11 @@ class MessageService {
         this.currentConversation = null;
         this.token = null;
         this.connectionPromise = null;
+        // Per conversation: the highest seq received with nothing missing
+        // below it, and any received seqs past a gap
+        this.deliveredSeqs = new Map();
+        this.pendingSeqs = new Map();
+        this.gapSyncTimeout = null;
     }
 
     // Initialize connection
@@ -147,9 +152,15 @@ class MessageService {
         this.socket.on('connection_status', (data) => {
             console.log('📡 Connection status update:', data);
             if (data.status === 'connected') {
+                this.userId = data.user_id;
                 this.connectionStatus = 'connected';
                 this.reconnectAttempts = 0;
                 this.notifyConnectionListeners('connected');
+
+                // Reconnecting: fetch only what was missed while offline
+                if (this.deliveredSeqs.size > 0) {
+                    this.syncMissedMessages();
+                }
             }
         });
 
@@ -164,6 +175,20 @@ class MessageService {
             this.handleIncomingMessage(data.message);
         });
 
+        // Messages missed while disconnected, oldest first per conversation.
+        // The server only sends runs with no gaps, so they move the cursor
+        // past any seq it has given up waiting for
+        this.socket.on('sync_messages', (data) => {
+            console.log('🔄 Synced', data.messages.length, 'missed messages');
+            data.messages.forEach(message => this.handleIncomingMessage(message, true));
+            // An empty page means the rest is waiting on an unfinished send
+            if (data.has_more && data.messages.length > 0) {
+                this.syncMissedMessages();
+            } else if (this.pendingSeqs.size > 0) {
+                this.scheduleGapSync();
+            }
+        });
+
         this.socket.on('message_sent', (data) => {
             console.log('✅ Message sent confirmation:', data);
         });
@@ -178,6 +203,13 @@ class MessageService {
             this.handleTypingEvent(data);
         });
 
+        // Typing changes batched per conversation by the server
+        this.socket.on('typing_batch', (data) => {
+            data.updates
+                .filter(update => update.user_id !== this.userId)
+                .forEach(update => this.handleTypingEvent(update));
+        });
+
         // User status events
         this.socket.on('user_status_change', (data) => {
             console.log('👤 User status change:', data);
@@ -204,8 +236,9 @@ class MessageService {
         });
     }
 
-    handleIncomingMessage(message) {
+    handleIncomingMessage(message, contiguous = false) {
         const conversationId = message.conversation_id;
+        this.recordDelivery(conversationId, message.seq, contiguous);
         const listeners = this.messageListeners.get(conversationId);
         
         if (listeners) {
@@ -219,6 +252,70 @@ class MessageService {
         }
     }
 
+    // Track received seqs and acknowledge the contiguous prefix. A seq past a
+    // gap is held back (the missing message may still be in flight) and a
+    // sync is requested if the gap doesn't close on its own. contiguous marks
+    // a seq known to have nothing missing below it (sync results, history)
+    recordDelivery(conversationId, seq, contiguous = false) {
+        if (typeof seq !== 'number') return;
+
+        const delivered = this.deliveredSeqs.get(conversationId);
+        if (delivered !== undefined && seq <= delivered) return;
+
+        const pending = this.pendingSeqs.get(conversationId) || new Set();
+        let next = delivered;
+        if (delivered === undefined || contiguous) {
+            next = seq;
+        } else {
+            pending.add(seq);
+        }
+
+        while (pending.has(next + 1)) {
+            next += 1;
+        }
+        [...pending].filter(pendingSeq => pendingSeq <= next).forEach(pendingSeq => pending.delete(pendingSeq));
+
+        if (pending.size > 0) {
+            this.pendingSeqs.set(conversationId, pending);
+            this.scheduleGapSync();
+        } else {
+            this.pendingSeqs.delete(conversationId);
+        }
+
+        if (delivered === undefined || next > delivered) {
+            this.deliveredSeqs.set(conversationId, next);
+            this.acknowledgeDelivery(conversationId, next);
+        }
+    }
+
+    acknowledgeDelivery(conversationId, seq) {
+        if (!this.socket || !this.socket.connected) return;
+        this.socket.emit('message_ack', { conversation_id: conversationId, seq });
+    }
+
+    scheduleGapSync() {
+        if (this.gapSyncTimeout) return;
+        this.gapSyncTimeout = setTimeout(() => {
+            this.gapSyncTimeout = null;
+            if (this.pendingSeqs.size > 0) {
+                this.syncMissedMessages();
+            }
+        }, 3000);
+    }
+
+    // Whether a reconnect will catch this conversation up by seq
+    hasSyncCursor(conversationId) {
+        return this.deliveredSeqs.has(conversationId);
+    }
+
+    // Ask for everything after the last contiguous seq of each conversation
+    syncMissedMessages() {
+        if (!this.socket || !this.socket.connected) return;
+        this.socket.emit('sync_since', {
+            cursors: Object.fromEntries(this.deliveredSeqs)
+        });
+    }
+
     handleTypingEvent(data) {
         const conversationId = data.conversation_id;
         const listeners = this.typingListeners.get(conversationId);
@@ -360,6 +457,7 @@ class MessageService {
             const handleSuccess = (data) => {
                 clearTimeout(timeout);
                 if (data.success) {
+                    this.recordDelivery(conversationId, data.seq);
                     resolve({
                         _id: data.message_id,
                         conversation_id: conversationId,
@@ -429,7 +527,12 @@ class MessageService {
             }
 
             const data = await response.json();
-            return data.messages || [];
+            const messages = data.messages || [];
+            // Loaded history counts as delivered, so a later sync starts after it
+            [...messages]
+                .sort((a, b) => (a.seq ?? 0) - (b.seq ?? 0))
+                .forEach(message => this.recordDelivery(conversationId, message.seq, true));
+            return messages;
         } catch (error) {
             console.error('❌ Error fetching messages:', error);
             throw error;
@@ -558,6 +661,8 @@ class MessageService {
         
         this.connectionStatus = 'disconnected';
         this.currentConversation = null;
+        this.deliveredSeqs.clear();
+        this.pendingSeqs.clear();
         this.messageListeners.clear();
         this.typingListeners.clear();
         this.connectionListeners.clear();
@@ -639,7 +744,7 @@ class MessageService {
             }
 
             const data = await response.json();
-            return data.results || [];
+            return data.messages || [];
         } catch (error) {
             console.error('❌ Error searching messages:', error);
             throw error;
@@ -142,11 +142,10 @@ export default function Waypoint() {
           active: true,
           interactions: waypoint.interactions || { likes: 0, bookmarks: 0 },
           distance_km: waypoint.distance_km,
-          isLiked: currentUserId ? waypoint.liked_users?.includes(currentUserId) : false,
-          isBookmarked: currentUserId ? waypoint.bookmarked_users?.includes(currentUserId) : false,
+          // Interaction status is computed per user by the backend
+          isLiked: currentUserId ? !!waypoint.is_liked : false,
+          isBookmarked: currentUserId ? !!waypoint.is_bookmarked : false,
           isOwner: currentUsername && waypoint.username === currentUsername,
-          liked_users: waypoint.liked_users || [],
-          bookmarked_users: waypoint.bookmarked_users || [],
           isAttending: isAttending,
           attendeesCount: attendeesCount
         };